@@ -10,14 +10,26 @@ class classproperty(object):
         return self.getter(owner)
 
 
+def input_getter(getter):
+    if issubclass(type(getter), basestring):
+        return lambda self: getattr(self.input, getter)
+    else:
+        return getter
+
+
 class argument(object):
 
-    def __init__(self, variable, getter):
-        if issubclass(type(getter), basestring):
-            self.getter = lambda self: getattr(self.input, getter)
-        else:
-            self.getter = getter
+    """
+    An attribute of a ``Container`` returning the value ``getter`` gets as a
+    ``variable``.  ``getter`` is a function of the container, or the name of
+    an attribute of its input.  For ``Boolean`` variables, ``hash_value`` is
+    a getter of a value identifying the input, such as its id, which the
+    variable is hashed and bucketed by.
+    """
 
+    def __init__(self, variable, getter, hash_value=None):
+        self.getter = input_getter(getter)
+        self.hash_value = None if hash_value is None else input_getter(hash_value)
         self.owner = None
         self.variable = variable
 
@@ -25,6 +37,12 @@ class argument(object):
         self.owner = owner
 
         if instance:
+            if self.hash_value is not None:
+                return self.variable(
+                    self.getter(instance),
+                    hash_value=self.hash_value(instance)
+                )
+
             return self.variable(self.getter(instance))
         else:
             return self
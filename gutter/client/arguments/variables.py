@@ -1,5 +1,7 @@
 import random
 
+from gutter.client import bucketing
+
 
 class Base(object):
 
@@ -20,6 +22,22 @@ class Base(object):
     __hash__ = __proxy_to_value_method('__hash__')
     __nonzero__ = __proxy_to_value_method('__nonzero__')
 
+    @property
+    def stable_hash(self):
+        """
+        The hash of the value which ``gutter.client.bucketing`` buckets the
+        variable by.  It is the same in every process, and computed once.
+        """
+        try:
+            return self.__stable_hash
+        except AttributeError:
+            self.__stable_hash = bucketing.stable_hash(self._hashed_value)
+            return self.__stable_hash
+
+    @property
+    def _hashed_value(self):
+        return self.value
+
     @staticmethod
     def to_python(value):
         return value
@@ -45,13 +63,40 @@ class Float(Base):
 
 class Boolean(Base):
 
+    """
+    A boolean which hashes, and is bucketed by, its ``hash_value`` rather than
+    its value, so percentage conditions spread inputs which are all ``True``
+    over every percentage.  Give it a ``hash_value`` identifying the input,
+    such as a user id, to bucket each input the same way every time.  Without
+    one it draws a random hash value the first time it is hashed, which
+    differs every time the input is checked.
+    """
+
     def __init__(self, value, hash_value=None):
         super(Boolean, self).__init__(value)
-        self.hash_value = hash_value or random.getrandbits(128)
+
+        if hash_value is not None:
+            self.hash_value = hash_value
+
+    @property
+    def hash_value(self):
+        try:
+            return self.__hash_value
+        except AttributeError:
+            self.__hash_value = random.getrandbits(128)
+            return self.__hash_value
+
+    @hash_value.setter
+    def hash_value(self, hash_value):
+        self.__hash_value = hash_value
 
     def __hash__(self, *args, **kwargs):
         return hash(self.hash_value)
 
+    @property
+    def _hashed_value(self):
+        return self.hash_value
+
     @staticmethod
     def to_python(value):
         return bool(value)
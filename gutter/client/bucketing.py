@@ -0,0 +1,92 @@
+"""
+gutter.bucketing
+~~~~~~~~~~~~~~~~
+
+Stable bucketing of inputs for percentage rollouts.  Unlike ``hash()``, which
+varies between processes when hash randomization is enabled, and which
+``Boolean`` variables draw at random, the hash of a value here is a CRC-32 of
+a canonical byte form of it, so the same input lands in the same bucket in
+every process, on every host, every time it is checked.
+
+An input's hash is salted separately for each rollout, so the inputs in one
+rollout's first 10% are unrelated to those in another's, unless the rollouts
+share a salt.  The hash of a value is computed once, and mixing in a salt is a
+handful of integer operations, so argument variables remember their hash and
+every rollout checked against a variable during an evaluation reuses it.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import zlib
+
+#: The number of buckets inputs are spread over, so rollouts have a
+#: resolution of a hundredth of a percent
+BUCKETS = 10000
+
+_MASK = 0xffffffff
+
+_CANONICAL_TYPES = frozenset((str, unicode, int, long, bool, float, type(None)))
+
+
+def canonical(value):
+    """
+    Returns the byte form of ``value`` its stable hash is computed from.
+    Values which are equal to each other have the same form: ``unicode`` is
+    encoded as UTF-8, and numbers, including bools and integral floats, are
+    written out in decimal.  A number therefore has the same form as the
+    string of its digits, so an id buckets alike whether it is an ``int`` or
+    a ``str``.
+
+    Raises ``TypeError`` for any other type, whose ``str`` may not be the same
+    in every process.
+    """
+    value_type = type(value)
+
+    if value_type is str:
+        return value
+    elif value_type is unicode:
+        return value.encode('utf-8')
+    elif value_type is int or value_type is long or value_type is bool:
+        return str(int(value))
+    elif value_type is float:
+        return str(int(value)) if value.is_integer() else repr(value)
+    elif value is None:
+        return ''
+
+    raise TypeError('%r can not be bucketed stably' % (value,))
+
+
+def stable_hash(value):
+    """
+    Returns the 32 bit stable hash of ``value``.  Argument variables are
+    hashed by their own ``stable_hash``, which they compute once.
+    """
+    if type(value) not in _CANONICAL_TYPES:
+        variable_hash = getattr(value, 'stable_hash', None)
+
+        if variable_hash is not None:
+            return variable_hash
+
+    return zlib.crc32(canonical(value)) & _MASK
+
+
+def bucket(value_hash, salt_hash):
+    """
+    Returns the bucket, from ``0`` up to ``BUCKETS``, of a value with the
+    stable hash ``value_hash`` for the salt with the stable hash ``salt_hash``.
+
+    CRC-32 is linear, so the salted hash goes through MurmurHash3's finalizer
+    to spread nearby values over every bucket.
+    """
+    mixed = value_hash ^ salt_hash
+    mixed ^= mixed >> 16
+    mixed = (mixed * 0x85ebca6b) & _MASK
+    mixed ^= mixed >> 13
+    mixed = (mixed * 0xc2b2ae35) & _MASK
+    mixed ^= mixed >> 16
+
+    return mixed % BUCKETS
@@ -0,0 +1,125 @@
+"""
+gutter.cache
+~~~~~~~~~~~~
+
+An in-process, read-through cache of switches, which a ``Manager`` can put in
+front of its storage so checking a switch does not go to the storage (and
+decode the switch) every time.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import threading
+import time
+from collections import OrderedDict
+
+
+class SwitchCache(object):
+
+    """
+    A least recently used cache of at most ``maxsize`` switches, keyed by their
+    storage key.  If ``ttl`` is set, entries are reloaded once they are older
+    than that many seconds.
+
+    Entries are also dropped when the manager registers, updates or unregisters
+    a switch, and all of them are dropped when the storage version passed to
+    ``get`` changes (``last_updated()`` for durabledict storages), so changes
+    made by other processes are seen too.  Reading the version may itself be a
+    round trip to the storage, so a version passed as a function is only
+    called once every ``check_interval`` seconds, and changes made by other
+    processes can take that long to be seen.  Set it to ``0`` to check the
+    version on every ``get``.
+
+    ``hits``, ``misses``, ``stale`` and ``evictions`` count lookups served from
+    the cache, lookups which loaded from storage, entries dropped because they
+    expired or the storage version changed, and entries dropped to stay within
+    ``maxsize``.  The cache can be shared between threads and managers.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.time, check_interval=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.__entries = OrderedDict()
+        self.__version = None
+        self.__checked = None
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def get(self, key, load, version=None):
+        """
+        Returns the switch for ``key``, calling ``load`` with ``key`` to get it
+        from storage if it is not cached or its entry is stale.  Exceptions
+        raised by ``load`` are not cached.
+
+        ``version`` is the storage's current version, or a function returning
+        it, which is called at most once every ``check_interval`` seconds.
+        """
+        if callable(version):
+            version = self.__current_version(version)
+
+        with self.__lock:
+            if version != self.__version:
+                self.stale += len(self.__entries)
+                self.__entries.clear()
+                self.__version = version
+
+            entry = self.__entries.pop(key, None)
+
+            if entry is not None:
+                if entry[1] is None or entry[1] > self.timer():
+                    self.hits += 1
+                    self.__entries[key] = entry
+                    return entry[0]
+
+                self.stale += 1
+
+            self.misses += 1
+
+        switch = load(key)
+        expires = None if self.ttl is None else self.timer() + self.ttl
+
+        with self.__lock:
+            # Don't store a switch loaded for a version which is now outdated
+            if version == self.__version:
+                self.__entries.pop(key, None)
+                self.__entries[key] = (switch, expires)
+
+                while len(self.__entries) > self.maxsize:
+                    self.__entries.popitem(last=False)
+                    self.evictions += 1
+
+        return switch
+
+    def __current_version(self, version):
+        now = self.timer()
+
+        if self.__checked is not None and now < self.__checked + self.check_interval:
+            return self.__version
+
+        self.__checked = now
+        return version()
+
+    def invalidate(self, key=None):
+        """
+        Drops the entry for ``key``, or every entry if no ``key`` is given.
+        """
+        with self.__lock:
+            if key is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop(key, None)
@@ -0,0 +1,273 @@
+"""
+gutter.compiler
+~~~~~~~~~~~~~~~
+
+Compiles a ``Switch`` into a single specialized Python function which returns
+the same result as ``Switch.enabled_for_all``, without walking the generator,
+``Condition.call`` and ``ConditionsDict`` machinery on every check.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import copy
+import weakref
+
+# External Libraries
+from gutter.client import signals
+from gutter.client.cache import SwitchCache
+
+SWITCH_TEMPLATE = '''
+def bind(switch):
+    def enabled_for_all(*inputs, **kwargs):
+        context = kwargs.get('context') or EvaluationContext()
+        switch_checked = signals.switch_checked
+        switch_active = signals.switch_active
+        for inpt in inputs:
+            if switch_checked.has_receivers:
+                switch_checked.call(switch)
+%(evaluate)s
+%(combine)s
+        return %(empty)s
+    return enabled_for_all
+'''
+
+EVALUATE_SELECTIVE = '''\
+            evaluator = evaluators.get(type(inpt))
+            if evaluator is None:
+                evaluator = build_evaluator(type(inpt))
+            result = evaluator(inpt, context)'''
+
+COMBINE_ANY = '''\
+            if result:
+                if switch_active.has_receivers:
+                    switch_active.call(switch, inpt)
+                return True'''
+
+COMBINE_ALL = '''\
+            if result:
+                if switch_active.has_receivers:
+                    switch_active.call(switch, inpt)
+            elif result is not None:
+                return False'''
+
+#: The compiled function of each switch object
+COMPILED_CACHE = weakref.WeakKeyDictionary()
+
+#: Compiled code shared by every switch with the same ``switch_key``, such as
+#: the copies of one switch a storage decodes each time it is read
+COMPILED_CODE = SwitchCache(maxsize=1024)
+
+
+def compiled(switch, cache=COMPILED_CACHE, code=COMPILED_CODE):
+    """
+    Returns the compiled function for ``switch``, compiling it only if no
+    switch with the same name, state, ``compounded`` flag, conditions and
+    ``optimize`` flag was compiled before.
+    """
+    version = switch_version(switch)
+
+    try:
+        cached_version, function = cache[switch]
+    except KeyError:
+        cached_version = function = None
+
+    if (
+        cached_version is None
+        or cached_version[:2] != version[:2]
+        or cached_version[2] is not version[2]
+        or cached_version[3] != version[3]
+    ):
+        bind = code.get(switch_key(switch), lambda key: compile_binding(switch))
+        function = bind(switch)
+        cache[switch] = (version, function)
+
+    return function
+
+
+def switch_version(switch):
+    """
+    Returns what changes when ``switch`` is changed in a way that changes its
+    compiled function.  Only ``SELECTIVE`` switches use their conditions, so
+    the deferred conditions of other switches are not decoded.
+    """
+    if switch.state is switch.states.SELECTIVE:
+        conditions = switch.conditions
+        return (switch.state, switch.compounded, conditions.index, conditions.optimize)
+
+    return (switch.state, switch.compounded, None, None)
+
+
+def switch_key(switch):
+    """
+    Returns a key identifying the compiled code of ``switch``, from its name,
+    state, ``compounded`` flag and, if it is ``SELECTIVE``, whether its
+    conditions are optimized and their arguments, attributes, operator types
+    and variables.
+    """
+    key = (type(switch), switch.name, switch.state, bool(switch.compounded))
+
+    if switch.state is not switch.states.SELECTIVE:
+        return key
+
+    return key + (switch.conditions.optimize,) + tuple(
+        (
+            type(condition),
+            condition.argument,
+            condition.attribute,
+            type(condition.operator),
+            repr(sorted(condition.operator.variables.items())),
+            bool(condition.negative),
+        )
+        for condition in switch.conditions
+    )
+
+
+def compile_switch(switch):
+    """
+    Compiles ``switch`` into a function accepting inputs as positional
+    arguments, equivalent to ``switch.enabled_for_all``.
+    """
+    return compile_binding(switch)(switch)
+
+
+def compile_binding(switch):
+    """
+    Compiles ``switch`` into a function which, given any switch with the same
+    ``switch_key``, returns its compiled function.
+    """
+    from gutter.client.models import EvaluationContext
+
+    states = switch.states
+    namespace = dict(
+        signals=signals,
+        EvaluationContext=EvaluationContext
+    )
+
+    if switch.state is states.GLOBAL:
+        evaluate = '            result = True'
+    elif switch.state is states.DISABLED:
+        evaluate = '            result = False'
+    else:
+        evaluate = EVALUATE_SELECTIVE
+        namespace.update(selective_namespace(switch))
+
+    source = SWITCH_TEMPLATE % dict(
+        evaluate=evaluate,
+        combine=COMBINE_ALL if switch.compounded else COMBINE_ANY,
+        empty=bool(switch.compounded)
+    )
+
+    return build_function(source, 'bind', namespace, switch)
+
+
+def selective_namespace(switch):
+    from gutter.client.models import ConditionsList
+
+    # The code is shared by every switch with the same key, so it is compiled
+    # from a copy of the conditions which changing them in place can't reach
+    conditions_list = ConditionsList(copy.deepcopy(list(switch.conditions)))
+    conditions_list.optimize = switch.conditions.optimize
+    compounded = switch.compounded
+    evaluators = {}
+
+    def build_evaluator(input_type):
+        conditions = conditions_list.optimized(input_type, compounded)
+
+        if conditions:
+            evaluator = compile_conditions(switch, conditions, compounded)
+        else:
+            evaluator = no_conditions
+
+        evaluators[input_type] = evaluator
+        return evaluator
+
+    return dict(evaluators=evaluators, build_evaluator=build_evaluator)
+
+
+def no_conditions(inpt, context):
+    return None
+
+
+def compile_conditions(switch, conditions, compounded):
+    """
+    Compiles an iterable of conditions into a function of a single input,
+    checking the conditions in iteration order and short circuiting the same
+    way ``any`` (or ``all`` if ``compounded``) would.
+    """
+    from gutter.client.models import Manager
+
+    namespace = dict(signals=signals, NONE_INPUT=Manager.NONE_INPUT)
+    arguments = []
+    variables = []
+    lines = ['def evaluate(inpt, context):', '    none = inpt is NONE_INPUT']
+
+    for number, condition in enumerate(conditions):
+        if condition.argument not in arguments:
+            arguments.append(condition.argument)
+            argument_number = len(arguments) - 1
+            lines.extend([
+                '    instance_%d = context.argument(argument_%d, inpt)' % (
+                    (argument_number,) * 2
+                ),
+                '    applies_%d = instance_%d.applies' % ((argument_number,) * 2),
+            ])
+        else:
+            argument_number = arguments.index(condition.argument)
+
+        namespace['argument_%d' % argument_number] = condition.argument
+        namespace['condition_%d' % number] = condition
+        namespace['applies_to_%d' % number] = condition.operator.applies_to
+
+        lines.extend([
+            '    if applies_%d:' % argument_number,
+            '        if none:',
+            '            result = False',
+            '        else:',
+        ])
+
+        # Conditions on the same argument attribute share its variable, which
+        # is extracted by the first of them to be checked
+        variable = (condition.argument, condition.attribute)
+        if variable not in variables:
+            variables.append(variable)
+            namespace['attribute_%d' % number] = condition.attribute
+            lines.append(
+                '            variable_%d = context.variable(argument_%d, inpt, attribute_%d)' % (
+                    len(variables) - 1,
+                    argument_number,
+                    number
+                )
+            )
+
+        lines.extend([
+            '            try:',
+            '                result = applies_to_%d(variable_%d)' % (
+                number,
+                variables.index(variable)
+            ),
+            '            except Exception as error:',
+            '                signals.condition_apply_error.call(condition_%d, inpt, error)' % number,
+            '                result = False',
+        ])
+
+        if condition.negative:
+            lines.append('            result = not result')
+
+        if compounded:
+            lines.extend(['        if not result:', '            return False'])
+        else:
+            lines.extend(['        if result:', '            return True'])
+
+    lines.append('    return %s' % bool(compounded))
+
+    return build_function('\n'.join(lines), 'evaluate', namespace, switch)
+
+
+def build_function(source, name, namespace, switch):
+    code = compile(source, '<gutter switch %r>' % switch.name, 'exec')
+    exec code in namespace
+    return namespace[name]
@@ -2,19 +2,304 @@
 
 from __future__ import absolute_import
 
+# Standard Library
+import copy
+import hashlib
+import json
+
 # External Libraries
-from durabledict.encoding import PickleEncoding
+from durabledict.encoding import DecodingError, PickleEncoding
 import jsonpickle as pickle
+from jsonpickle.pickler import Pickler
+from jsonpickle.unpickler import Unpickler
+
+from gutter.client import registry
+from gutter.client.cache import SwitchCache
+from gutter.client.models import Switch, Condition
+
+# Register the built in operators, which schema payloads refer to by name
+import gutter.client.operators.comparable  # noqa
+import gutter.client.operators.identity  # noqa
+import gutter.client.operators.misc  # noqa
+import gutter.client.operators.network  # noqa
+import gutter.client.operators.string  # noqa
+
+#: Leading characters of JSON documents which base64, and so the output of
+#: ``PickleEncoding``, can never start with
+JSON_PREFIXES = ('{', '[', '"')
+
+#: Leading characters of ``PickleEncoding`` output for pickle protocol 2
+PICKLE_PREFIX = 'gA'
+
+#: Leading character of ``SchemaEncoding`` output, which neither JSON nor
+#: base64 can start with.  It is followed by the schema version and a space.
+SCHEMA_PREFIX = '~'
+SCHEMA_VERSION = 2
+
+#: Attributes of a switch which the schema encodes, or which are never encoded
+SWITCH_FIELDS = frozenset((
+    '_name',
+    'state',
+    'compounded',
+    'concent',
+    'label',
+    'description',
+    'conditions',
+    'manager',
+    '_Switch__init_vars',
+    '_Switch__load_conditions',
+))
+
+#: Attributes of a condition which the schema encodes
+CONDITION_FIELDS = frozenset(('argument', 'attribute', 'operator', 'negative'))
+
+
+def digest(data):
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+
+    return hashlib.sha1(data).digest()
 
 
 class JsonPickleEncoding(PickleEncoding):
+
+    #: Objects already decoded, keyed by the digest of their payload, so each
+    #: distinct payload is only decoded once per process.  Set to ``None`` to
+    #: decode every payload.
+    decode_cache = SwitchCache(maxsize=1024)
+
     @staticmethod
     def encode(data):
         return pickle.dumps(data)
 
+    @classmethod
+    def decode(cls, data):
+        """
+        Decodes ``data``, handing out a deep copy of the object cached for it
+        so changes to one decoded object, down to its conditions' operators,
+        are never seen by the next.
+        """
+        if cls.decode_cache is None:
+            return cls.loads(data)
+
+        decoded = cls.decode_cache.get(digest(data), lambda key: cls.loads(data))
+        return copy.deepcopy(decoded)
+
     @staticmethod
-    def decode(data):
+    def loads(data):
+        # Payloads written by ``PickleEncoding`` are recognizable up front, so
+        # they don't have to fail to decode as JSON first
+        if data.startswith(JSON_PREFIXES):
+            return pickle.loads(data)
+        elif data.startswith(PICKLE_PREFIX):
+            return PickleEncoding.decode(data)
+
         try:
             return pickle.loads(data)
         except Exception:
             return PickleEncoding.decode(data)
+
+
+class SchemaEncoding(JsonPickleEncoding):
+
+    """
+    Encodes switches as compact JSON arrays following an explicit, versioned
+    schema.  Operators and arguments are referred to by their key in
+    ``gutter.client.registry``, falling back to their import path if they are
+    not registered.  Only a switch's persistent fields are encoded: its
+    manager and change tracking are not, and a decoded switch has no changes.
+
+    A switch's header fields and its conditions are written on separate
+    lines, and only the header is decoded up front.  Conditions are decoded
+    the first time they are used, which checking a ``GLOBAL`` or ``DISABLED``
+    switch never does.
+
+    Anything but a switch, and any switch the schema can not represent, such
+    as one with attributes of its own or conditions of a ``Condition``
+    subclass, is encoded with ``JsonPickleEncoding``.  Payloads written by
+    ``JsonPickleEncoding`` or ``PickleEncoding`` still decode.
+    """
+
+    @classmethod
+    def encode(cls, data):
+        if not isinstance(data, Switch) or not cls.representable(data):
+            return JsonPickleEncoding.encode(data)
+
+        header, conditions = cls.dump_switch(data)
+
+        return '%s%d %s\n%s' % (
+            SCHEMA_PREFIX,
+            SCHEMA_VERSION,
+            json.dumps(header, separators=(',', ':')),
+            json.dumps(conditions, separators=(',', ':'))
+        )
+
+    @classmethod
+    def loads(cls, data):
+        if not data.startswith(SCHEMA_PREFIX):
+            return JsonPickleEncoding.loads(data)
+
+        version, _, body = data[len(SCHEMA_PREFIX):].partition(' ')
+
+        if version != str(SCHEMA_VERSION):
+            raise DecodingError('Unknown switch schema version %r' % version)
+
+        header, _, conditions = body.partition('\n')
+        switch = cls.load_switch(json.loads(header))
+        switch.defer_conditions(DeferredConditions(conditions))
+        switch.reset()
+        return switch
+
+    @staticmethod
+    def representable(switch):
+        """
+        Returns if ``switch`` decodes from its schema payload with nothing
+        lost: it has no attributes besides ``SWITCH_FIELDS``, and its
+        conditions are plain ``Condition`` instances.
+        """
+        if not SWITCH_FIELDS.issuperset(vars(switch)):
+            return False
+
+        for value in (switch.label, switch.description):
+            if value is not None and not isinstance(value, basestring):
+                return False
+
+        try:
+            switch.name.decode('utf-8')
+        except UnicodeDecodeError:
+            return False
+
+        return all(
+            type(condition) is Condition and CONDITION_FIELDS.issuperset(vars(condition))
+            for condition in switch.conditions
+        )
+
+    @classmethod
+    def dump_switch(cls, switch):
+        """
+        Returns the header fields and the conditions of ``switch``.
+        """
+        switch_class = type(switch)
+        header = [
+            None if switch_class is Switch else dump_class(switch_class),
+            switch.name,
+            switch.state,
+            switch.compounded,
+            switch.concent,
+            switch.label,
+            switch.description,
+        ]
+
+        return header, map(cls.dump_condition, switch.conditions)
+
+    @classmethod
+    def load_switch(cls, header):
+        """
+        Returns a switch with the ``header`` fields, and no conditions.
+        """
+        switch_class, name, state, compounded, concent, label, description = header
+
+        switch_class = Switch if switch_class is None else load_class(switch_class)
+
+        # Switch names are UTF-8 encoded ``str``, which JSON decodes as unicode
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+
+        switch = switch_class(
+            name,
+            state=state,
+            compounded=compounded,
+            concent=concent,
+            label=label,
+            description=description
+        )
+
+        return switch
+
+    @classmethod
+    def load_conditions(cls, conditions):
+        return map(cls.load_condition, conditions)
+
+    @staticmethod
+    def dump_condition(condition):
+        operator = condition.operator
+
+        return [
+            dump_class(condition.argument, registry.arguments),
+            condition.attribute,
+            dump_class(type(operator), registry.operators),
+            dict(
+                (key, dump_value(value))
+                for key, value in operator.variables.items()
+            ),
+            condition.negative,
+        ]
+
+    @staticmethod
+    def load_condition(fields):
+        argument, attribute, operator, variables, negative = fields
+
+        operator_class = load_class(operator, registry.operators)
+
+        return Condition(
+            argument=load_class(argument, registry.arguments),
+            attribute=attribute,
+            operator=operator_class(**dict(
+                (str(key), load_value(value)) for key, value in variables.items()
+            )),
+            negative=negative
+        )
+
+
+class DeferredConditions(object):
+
+    """
+    Decodes the conditions of a switch decoded by ``SchemaEncoding`` from their
+    JSON ``payload`` when called.  Being picklable, it lets deferred switches
+    be copied and pickled without decoding their conditions.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __call__(self):
+        return SchemaEncoding.load_conditions(json.loads(self.payload))
+
+
+def dump_value(value):
+    """
+    Returns ``value`` if JSON can represent it as is, or else flattened by
+    jsonpickle.  Flattened values are always a dict or a list.
+    """
+    if value is None or isinstance(value, (basestring, bool, int, long, float)):
+        return value
+
+    return Pickler().flatten(value)
+
+
+def load_value(value):
+    if isinstance(value, (dict, list)):
+        return Unpickler().restore(value)
+
+    return value
+
+
+def dump_class(cls, class_registry=None):
+    """
+    Returns the key ``cls`` is registered under in ``class_registry``, or a
+    ``[module, name]`` list to import it by.
+    """
+    key = class_registry.key_for(cls) if class_registry is not None else None
+
+    if key is not None:
+        return key
+
+    return [cls.__module__, cls.__name__]
+
+
+def load_class(reference, class_registry=None):
+    if isinstance(reference, list):
+        module, name = reference
+        return getattr(__import__(module, fromlist=[name]), name)
+
+    return class_registry[reference]
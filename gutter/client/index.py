@@ -0,0 +1,124 @@
+"""
+gutter.index
+~~~~~~~~~~~~
+
+A sorted index of the keys in a storage, which a ``Manager`` can use to list
+a namespace or find the children of a switch in time proportional to the
+number of keys found, rather than to the number of keys in the storage.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import bisect
+import threading
+
+from gutter.client.snapshot import storage_version
+
+
+class KeyIndex(object):
+
+    """
+    A sorted list of the keys in a storage.  It is built from the storage the
+    first time it is used, updated as managers sharing it add and remove
+    switches, and rebuilt whenever the storage's ``last_updated()`` version
+    changes otherwise.  A manager's own change only moves the index to the
+    storage's new version if the index was current before the change.
+
+    Storages without a version, such as plain dicts, can not tell the index
+    about changes, so all their changes must be made through managers which
+    share the index.
+
+    ``rebuilds`` counts the times the index was built from the storage.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.rebuilds = 0
+        self.__keys = None
+        self.__lock = threading.Lock()
+
+    def prefixed(self, storage, prefix):
+        """
+        Returns the sorted keys of ``storage`` which start with ``prefix``.
+        """
+        with self.__lock:
+            keys = self.__keys_for(storage)
+            start = bisect.bisect_left(keys, prefix)
+            end = start
+
+            while end < len(keys) and keys[end].startswith(prefix):
+                end += 1
+
+            return keys[start:end]
+
+    def add(self, storage, key, previous=None):
+        """
+        Adds ``key``, just written to ``storage``, to the index.  ``previous``
+        is the storage's version from before the write.
+        """
+        self.update(storage, [key], previous)
+
+    def discard(self, storage, key, previous=None):
+        """
+        Removes ``key``, just deleted from ``storage``, from the index.
+        ``previous`` is the storage's version from before the delete.
+        """
+        self.update(storage, [key], previous, removed=True)
+
+    def update(self, storage, keys, previous=None, removed=False):
+        """
+        Adds ``keys``, just written to ``storage`` in one go, to the index, or
+        removes them if they were ``removed``.  ``previous`` is the storage's
+        version from before the change.
+        """
+        with self.__lock:
+            if not self.__current(previous):
+                return
+
+            for key in keys:
+                position = bisect.bisect_left(self.__keys, key)
+                found = position < len(self.__keys) and self.__keys[position] == key
+
+                if removed and found:
+                    del self.__keys[position]
+                elif not removed and not found:
+                    self.__keys.insert(position, key)
+
+            self.version = storage_version(storage)
+
+    def invalidate(self):
+        """
+        Drops the index, to be rebuilt from the storage when next used.
+        """
+        with self.__lock:
+            self.__keys = None
+
+    def __current(self, previous):
+        """
+        Returns if the index was up to date with the storage at version
+        ``previous``.  If it was not, the storage was changed by someone else
+        since it was built, so it is dropped rather than moved to the storage's
+        new version without their changes.
+        """
+        if self.__keys is None:
+            return False
+
+        if previous != self.version:
+            self.__keys = None
+            return False
+
+        return True
+
+    def __keys_for(self, storage):
+        version = storage_version(storage)
+
+        if self.__keys is None or version != self.version:
+            self.__keys = sorted(storage.keys())
+            self.version = version
+            self.rebuilds += 1
+
+        return self.__keys
@@ -0,0 +1,267 @@
+"""
+gutter.mapped
+~~~~~~~~~~~~~
+
+Snapshots shared between processes through a memory-mapped file.  A
+``SnapshotPublisher`` writes every switch in a storage to a snapshot file and
+swaps it in with an atomic rename.  Managers in any number of worker processes
+given a ``MappedSnapshotStore`` for the same path map the file instead of each
+loading every switch into memory, and pick up each new file as it is published.
+
+The file holds a header with the storage version, a sorted index of keys, and
+each switch encoded by ``SchemaEncoding``.  Its pages are shared by every
+process mapping it, and a process only decodes the switches it checks, the
+first time it checks them.
+
+Switches registered since the file was published are not in it, so a
+``Manager`` reads switches missing from the file from its storage.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from gutter.client.encoding import SchemaEncoding
+from gutter.client.snapshot import Snapshot, SnapshotStore, storage_version
+
+#: Leading bytes of every snapshot file, including the format version
+MAGIC = 'GUTTERS1'
+
+#: The storage version, or -1 if it has none, and the number of switches
+HEADER = struct.Struct('<qI')
+
+#: The offset and length of each key and of its encoded switch
+ENTRY = struct.Struct('<IIII')
+
+
+def write_snapshot(path, items, version=None, encoding=SchemaEncoding):
+    """
+    Writes the ``(key, switch)`` pairs in ``items`` to a snapshot file at
+    ``path``.  The file is written next to ``path`` and renamed over it, so
+    readers only ever see a whole file.
+    """
+    entries = sorted(
+        (key.encode('utf-8') if isinstance(key, unicode) else key, encoding.encode(switch))
+        for key, switch in items
+    )
+
+    offset = len(MAGIC) + HEADER.size + ENTRY.size * len(entries)
+    index = []
+
+    for key, payload in entries:
+        index.append(ENTRY.pack(offset, len(key), offset + len(key), len(payload)))
+        offset += len(key) + len(payload)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.gutter-snapshot-')
+
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(MAGIC)
+            output.write(HEADER.pack(-1 if version is None else version, len(entries)))
+            output.writelines(index)
+
+            for key, payload in entries:
+                output.write(key)
+                output.write(payload)
+
+            output.flush()
+            os.fsync(output.fileno())
+
+        os.rename(temporary, path)
+    except Exception:
+        os.unlink(temporary)
+        raise
+
+
+class MappedSnapshot(object):
+
+    """
+    A read-only mapping of storage keys to switches, read from the snapshot
+    file at ``path``.  Keys are found by binary search over the file's index,
+    and each switch is decoded the first time it is read.  Conditions of
+    switches decoded by ``SchemaEncoding`` stay encoded until they are used.
+
+    Like those of a ``Snapshot``, switches handed out are shared by every
+    thread reading the snapshot and should not be changed in place.
+    """
+
+    def __init__(self, path, encoding=SchemaEncoding):
+        start = time.time()
+
+        with open(path, 'rb') as snapshot_file:
+            stat = os.fstat(snapshot_file.fileno())
+            self.__map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.__map[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a gutter snapshot file' % path)
+
+        version, self.__count = HEADER.unpack_from(self.__map, len(MAGIC))
+
+        self.path = path
+        self.encoding = encoding
+        self.identity = (stat.st_ino, stat.st_mtime, stat.st_size)
+        self.version = None if version < 0 else version
+        self.created_at = time.time()
+        self.build_seconds = self.created_at - start
+        self.__switches = {}
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    def __getitem__(self, key):
+        try:
+            return self.__switches[key]
+        except KeyError:
+            pass
+
+        position = self.__find(key.encode('utf-8') if isinstance(key, unicode) else key)
+
+        if position is None:
+            raise KeyError(key)
+
+        switch = self.__decode(position)
+        self.__switches[key] = switch
+        return switch
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.__count
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [self.__key(position) for position in range(self.__count)]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def iteritems(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def __entry(self, position):
+        return ENTRY.unpack_from(self.__map, len(MAGIC) + HEADER.size + ENTRY.size * position)
+
+    def __key(self, position):
+        key_offset, key_length, _, _ = self.__entry(position)
+        return self.__map[key_offset:key_offset + key_length]
+
+    def __find(self, key):
+        low, high = 0, self.__count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.__key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < self.__count and self.__key(low) == key:
+            return low
+
+        return None
+
+    def __decode(self, position):
+        _, _, offset, length = self.__entry(position)
+        return self.encoding.loads(self.__map[offset:offset + length])
+
+
+class MappedSnapshotStore(SnapshotStore):
+
+    """
+    A ``SnapshotStore`` which maps the snapshot file at ``path`` published by
+    a ``SnapshotPublisher``.  At most every ``check_interval`` seconds, ``get``
+    checks whether a new file was published, and maps it if so.  ``refresh``
+    always maps the latest file.
+
+    Until a file is published, snapshots are built from the storage in
+    memory, as ``SnapshotStore`` does.  Once one is, changes made to the
+    storage are only seen after they are published.
+    """
+
+    def __init__(self, path, check_interval=1.0, encoding=SchemaEncoding):
+        super(MappedSnapshotStore, self).__init__()
+        self.path = path
+        self.check_interval = check_interval
+        self.encoding = encoding
+        self.checked_at = time.time()
+
+    def get(self, storage):
+        snapshot = super(MappedSnapshotStore, self).get(storage)
+        now = time.time()
+
+        if now - self.checked_at < self.check_interval:
+            return snapshot
+
+        self.checked_at = now
+
+        if self.__published() != getattr(snapshot, 'identity', None):
+            snapshot = self.refresh(storage)
+
+        return snapshot
+
+    def build(self, storage):
+        self.checked_at = time.time()
+
+        if not os.path.exists(self.path):
+            return Snapshot.from_storage(storage)
+
+        return MappedSnapshot(self.path, encoding=self.encoding)
+
+    def __published(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+
+        return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+
+class SnapshotPublisher(SnapshotStore):
+
+    """
+    A ``SnapshotStore`` whose ``refresh`` publishes every switch in the storage
+    to the snapshot file at ``path``, then maps the file as its ``current``
+    snapshot.  A ``SnapshotRefresher`` started for a publisher publishes a new
+    file whenever the storage changes:
+
+        publisher = SnapshotPublisher('/var/run/gutter.snapshot')
+        SnapshotRefresher(publisher, storage).start()
+    """
+
+    def __init__(self, path, encoding=SchemaEncoding):
+        super(SnapshotPublisher, self).__init__()
+        self.path = path
+        self.encoding = encoding
+
+    def build(self, storage):
+        start = time.time()
+
+        # Read the version first, so a change made while publishing is not
+        # missed
+        version = storage_version(storage)
+        write_snapshot(self.path, storage.items(), version, self.encoding)
+
+        snapshot = MappedSnapshot(self.path, encoding=self.encoding)
+        snapshot.build_seconds = time.time() - start
+        return snapshot
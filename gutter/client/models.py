@@ -9,13 +9,17 @@ gutter.models
 from __future__ import absolute_import
 
 # Standard Library
+import sys
 import threading
+import time
 from collections import defaultdict
-from functools import partial
+from contextlib import contextmanager
 from itertools import ifilter
 
 # External Libraries
-from gutter.client import signals
+from gutter.client import optimizer, signals
+from gutter.client.compiler import compiled
+from gutter.client.snapshot import storage_version
 
 DEFAULT_SEPARATOR = ':'
 
@@ -32,12 +36,21 @@ def all_false_if_empty(iterable):
 
 class ConditionsDict(defaultdict):
 
+    def __init__(self, *args, **kwargs):
+        super(ConditionsDict, self).__init__(*args, **kwargs)
+        self.__by_type = {}
+
     @classmethod
     def from_conditions_list(cls, conditions):
-        conditions_dict = cls(set)
+        conditions_dict = cls(list)
+        seen = set()
 
+        # Conditions are kept in the order they are listed, so copies of a
+        # list of conditions are checked in the same order
         for cond in conditions:
-            conditions_dict[cond.argument.COMPATIBLE_TYPE].add(cond)
+            if id(cond) not in seen:
+                seen.add(id(cond))
+                conditions_dict[cond.argument.COMPATIBLE_TYPE].append(cond)
 
         return conditions_dict
 
@@ -45,14 +58,268 @@ class ConditionsDict(defaultdict):
         return self.get_by_type(type(inpt))
 
     def get_by_type(self, to_get_key):
+        try:
+            return self.__by_type[to_get_key]
+        except KeyError:
+            conditions = self.__find_by_type(to_get_key)
+            self.__by_type[to_get_key] = conditions
+            return conditions
+
+    def __find_by_type(self, to_get_key):
         if to_get_key in self:
             return self[to_get_key]
         for key_type in self:
             if issubclass(to_get_key, key_type):
                 return self[key_type]
 
-        # raise the correct exception
-        return self[to_get_key]
+        # Don't store the miss, so later lookups scan the same keys
+        return self.default_factory()
+
+
+class ConditionsList(list):
+
+    """
+    A list of conditions which remembers its ``ConditionsDict`` index, and the
+    conditions ``gutter.client.optimizer`` rewrote it into, until it is
+    mutated.  Switches keep their conditions in one of these so checking a
+    switch does not rebuild the index or optimize it on every call.
+
+    Conditions are checked as they are unless ``optimize`` is set to
+    ``True``.  It is off by default since errors raised by the operators of
+    merged conditions do not send the ``condition_apply_error`` signal.
+    """
+
+    optimize = False
+
+    def __init__(self, *args, **kwargs):
+        super(ConditionsList, self).__init__(*args, **kwargs)
+        self.__stats = None
+        self.invalidate()
+
+    @property
+    def index(self):
+        if self.__index is None:
+            self.__index = ConditionsDict.from_conditions_list(self)
+            self.__optimized = {}
+
+        return self.__index
+
+    def optimized(self, input_type, compounded):
+        """
+        Returns the conditions to check inputs of ``input_type`` against, for
+        a switch which is ``compounded`` or not, optimized if ``optimize`` is
+        set.
+        """
+        index = self.index
+        key = (input_type, bool(compounded), bool(self.optimize))
+
+        try:
+            return self.__optimized[key]
+        except KeyError:
+            pass
+
+        conditions = index.get_by_type(input_type)
+
+        if self.optimize and len(conditions) > 1:
+            conditions = optimizer.optimize(conditions, compounded)
+
+        self.__optimized[key] = conditions
+        return conditions
+
+    @property
+    def stats(self):
+        """
+        The ``ConditionStats`` recorded for these conditions when they are
+        checked by a manager with ``adaptive`` enabled.
+        """
+        if self.__stats is None:
+            self.__stats = ConditionStats()
+
+        return self.__stats
+
+    def invalidate(self):
+        """
+        Drops the cached index and condition rankings.  Called on every
+        mutation of the list, and should be called if a condition in the list
+        is changed in place.
+        """
+        self.__index = None
+
+        if self.__stats is not None:
+            self.__stats.rerank()
+
+    def __invalidating(method):
+        def func(self, *args, **kwargs):
+            self.invalidate()
+            return getattr(super(ConditionsList, self), method)(*args, **kwargs)
+
+        return func
+
+    append = __invalidating('append')
+    extend = __invalidating('extend')
+    insert = __invalidating('insert')
+    pop = __invalidating('pop')
+    remove = __invalidating('remove')
+    reverse = __invalidating('reverse')
+    sort = __invalidating('sort')
+    __setitem__ = __invalidating('__setitem__')
+    __delitem__ = __invalidating('__delitem__')
+    __setslice__ = __invalidating('__setslice__')
+    __delslice__ = __invalidating('__delslice__')
+    __iadd__ = __invalidating('__iadd__')
+    __imul__ = __invalidating('__imul__')
+
+
+class ConditionStats(object):
+
+    """
+    Records how long each condition takes to check and how often it is true,
+    to rank conditions so the cheapest ones most likely to decide a switch are
+    checked first: those most likely to be true if the switch is not
+    ``compounded``, or most likely to be false if it is.
+
+    Rankings are recomputed every ``rerank_interval`` checks.  Counts are not
+    locked, so they may drift slightly when a switch is checked from several
+    threads at once.  That only affects the order conditions are checked in,
+    never the result of a check.
+    """
+
+    rerank_interval = 1000
+
+    def __init__(self):
+        self.checks = 0
+        self.__stats = {}
+        self.__ranked = {}
+
+    def call(self, condition, inpt, context):
+        """
+        Calls ``condition`` with ``inpt`` and ``context``, recording how long
+        it took and whether it was true.
+        """
+        start = time.time()
+        result = condition.call(inpt, context)
+        elapsed = time.time() - start
+
+        try:
+            stats = self.__stats[condition]
+        except KeyError:
+            stats = self.__stats[condition] = [0, 0, 0.0]
+
+        stats[0] += 1
+        stats[1] += bool(result)
+        stats[2] += elapsed
+
+        self.checks += 1
+        if not self.checks % self.rerank_interval:
+            self.rerank()
+
+        return result
+
+    def ranked(self, conditions, compounded):
+        """
+        Returns ``conditions`` as a list in the order they should be checked.
+        """
+        key = (id(conditions), bool(compounded))
+
+        try:
+            return self.__ranked[key][1]
+        except KeyError:
+            ranked = sorted(
+                conditions,
+                key=lambda condition: self.__cost(condition, compounded)
+            )
+            self.__ranked[key] = (conditions, ranked)
+            return ranked
+
+    def rerank(self):
+        self.__ranked.clear()
+
+    def __cost(self, condition, compounded):
+        """
+        The expected time spent checking ``condition`` for every time it
+        decides the switch.  Conditions never checked before cost nothing, so
+        they are tried early and get stats of their own.
+        """
+        checks, true, seconds = self.__stats.get(condition, (0, 0, 0.0))
+
+        if not checks:
+            return 0.0
+
+        deciding = checks - true if compounded else true
+        return (seconds / checks) * (checks + 2.0) / (deciding + 1.0)
+
+
+class EvaluationContext(object):
+
+    """
+    Memoizes argument instances and their variables while switches are checked
+    against inputs.  Within one context each ``Container`` class is constructed
+    at most once per input, and each argument attribute is extracted at most
+    once per input, no matter how many conditions or switches use them.
+
+    Inputs are keyed by identity, and a reference to each one is kept so that
+    identity can not be reused while the context is alive.
+    """
+
+    def __init__(self):
+        self.__arguments = {}
+        self.__variables = {}
+
+    def argument(self, argument, inpt):
+        key = (argument, id(inpt))
+
+        try:
+            return self.__arguments[key][1]
+        except KeyError:
+            instance = argument(inpt)
+            self.__arguments[key] = (inpt, instance)
+            return instance
+
+    def variable(self, argument, inpt, attribute):
+        key = (argument, id(inpt), attribute)
+
+        try:
+            return self.__variables[key]
+        except KeyError:
+            variable = getattr(self.argument(argument, inpt), attribute)
+            self.__variables[key] = variable
+            return variable
+
+
+class EvaluationCache(object):
+
+    """
+    Memoizes ``Manager.active`` results by switch name and the identity of the
+    inputs the switch was checked against.  A reference to each set of inputs
+    is kept so their identity can not be reused while the cache is alive.
+
+    ``hits`` and ``misses`` count how many switch lookups were served from
+    the cache, and how many had to be checked.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.__results = {}
+
+    def __len__(self):
+        return sum(len(results) for _, results in self.__results.values())
+
+    def results_for(self, inputs):
+        """
+        Returns the mutable dict of switch name to result for ``inputs``.
+        """
+        key = tuple(map(id, inputs))
+
+        try:
+            return self.__results[key][1]
+        except KeyError:
+            results = {}
+            self.__results[key] = (inputs, results)
+            return results
+
+    def clear(self):
+        self.__results.clear()
 
 
 class Switch(object):
@@ -100,9 +367,26 @@ class Switch(object):
     def name(self):
         return self._name
 
+    @property
+    def conditions(self):
+        try:
+            return self.__dict__['conditions']
+        except KeyError:
+            return self.__load_deferred_conditions()
+
+    @conditions.setter
+    def conditions(self, conditions):
+        if not isinstance(conditions, ConditionsList):
+            conditions = ConditionsList(conditions)
+
+        self.__dict__['conditions'] = conditions
+
     @property
     def parent(self):
         separator = getattr(self.manager, 'key_separator', DEFAULT_SEPARATOR)
+        if separator not in self._name:
+            return None
+
         parent = self.name.rsplit(separator, 1)[0]
         return parent if parent != self.name else None
 
@@ -133,6 +417,24 @@ class Switch(object):
     def __getstate__(self):
         inner_dict = vars(self).copy()
         inner_dict.pop('manager', False)
+
+        # Deferred conditions are kept deferred, along with their loader
+        if 'conditions' not in inner_dict:
+            return inner_dict
+
+        # Persist plain lists so stored switches don't depend on ConditionsList
+        conditions = list(self.conditions)
+        inner_dict['conditions'] = conditions
+
+        init_vars = inner_dict.get('_Switch__init_vars')
+        if init_vars and isinstance(init_vars.get('conditions'), ConditionsList):
+            init_vars = init_vars.copy()
+            if init_vars['conditions'] is self.conditions:
+                init_vars['conditions'] = conditions
+            else:
+                init_vars['conditions'] = list(init_vars['conditions'])
+            inner_dict['_Switch__init_vars'] = init_vars
+
         return inner_dict
 
     def __setstate__(self, state):
@@ -143,6 +445,19 @@ class Switch(object):
         ):
             state.pop(attr, '')
 
+        # Names are UTF-8 encoded ``str``, which JSON encodings decode as unicode
+        for names in (state, state.get('_Switch__init_vars') or {}):
+            if isinstance(names.get('_name'), unicode):
+                names['_name'] = names['_name'].encode('utf-8')
+
+        conditions = state.get('conditions')
+        if conditions is not None:
+            state['conditions'] = ConditionsList(conditions)
+
+            init_vars = state.get('_Switch__init_vars') or {}
+            if init_vars.get('conditions') is conditions:
+                init_vars['conditions'] = state['conditions']
+
         self.__dict__ = state
         if not hasattr(self, 'manager'):
             setattr(self, 'manager', None)
@@ -159,40 +474,71 @@ class Switch(object):
         ``DISABLED``.  If it is not, then the switch is ``SELECTIVE`` and each
         condition is checked.
 
+        Arguments and their variables are shared with the evaluation context of
+        the switch's manager when it is inside ``Manager.active``.
+
         Keyword Arguments:
         inpt -- An instance of the ``Input`` class.
         """
 
-        signals.switch_checked.call(self)
-        signal_decorated = partial(self.__signal_and_return, inpt)
+        if signals.switch_checked.has_receivers:
+            signals.switch_checked.call(self)
 
         if self.state is self.states.GLOBAL:
-            return signal_decorated(True)
+            result = True
         elif self.state is self.states.DISABLED:
-            return signal_decorated(False)
-
-        conditions_dict = ConditionsDict.from_conditions_list(self.conditions)
-        conditions = conditions_dict.get_by_input(inpt)
-
-        if conditions:
-            result = self.__enabled_func(
-                cond.call(inpt)
-                for cond
-                in conditions
-                if cond.argument(inpt).applies
-            )
+            result = False
         else:
-            result = None
+            result = self.__enabled_for_conditions(inpt)
+
+        if result and signals.switch_active.has_receivers:
+            signals.switch_active.call(self, inpt)
 
-        return signal_decorated(result)
+        return result
 
     def enabled_for_all(self, *inpts):
+        """
+        Checks to see if this switch is enabled for the provided inputs.
+
+        ``None`` results from ``enabled_for`` (inputs no condition applies to)
+        are ignored.  Otherwise, *any* input must be enabled, or *all* of them
+        if ``compounded``.
+
+        ``GLOBAL`` and ``DISABLED`` switches give the same results and signals
+        without calling ``enabled_for``, and without allocating per input.
+        """
+        if self.state is not self.states.SELECTIVE:
+            return self.__static_enabled_for_all(inpts)
+
         foo = ifilter(
             lambda x: x is not None,
             (self.enabled_for(inpt) for inpt in inpts)
         )
         return self.__enabled_func(foo)
 
+    def invalidate(self):
+        """
+        Drops any state cached from this switch's conditions, so that
+        conditions changed in place are picked up on the next check.
+        """
+        if 'conditions' in self.__dict__:
+            self.conditions.invalidate()
+
+    def defer_conditions(self, load):
+        """
+        Replaces the switch's conditions with the result of calling ``load``
+        the first time they are used, which ``GLOBAL`` and ``DISABLED``
+        switches never do when checked.  Encodings use this to decode a switch
+        without decoding its conditions.  ``load`` should be picklable if the
+        switch may be pickled before its conditions are used.
+        """
+        self.__dict__.pop('conditions', None)
+        self.__load_conditions = load
+
+    @property
+    def conditions_deferred(self):
+        return 'conditions' not in self.__dict__
+
     def save(self):
         """
         Saves this switch in its manager (if present).
@@ -252,18 +598,81 @@ class Switch(object):
         else:
             return any
 
+    def __load_deferred_conditions(self):
+        load = self.__dict__.pop('_Switch__load_conditions')
+        self.conditions = load()
+
+        # The loaded conditions are what the switch had when it was reset
+        init_vars = self.__dict__.get('_Switch__init_vars')
+        if init_vars is not None and init_vars.pop('_Switch__load_conditions', None):
+            init_vars['conditions'] = self.conditions
+
+        return self.conditions
+
     def __changes(self):
         for key, value in self.__init_vars.items():
-            if key is '_Switch__init_vars':
+            if key == '_Switch__init_vars':
                 continue
             elif key not in vars(self) or getattr(self, key) != value:
                 yield (key, dict(previous=value, current=getattr(self, key)))
 
-    def __signal_and_return(self, inpt, is_enabled):
-        if is_enabled:
-            signals.switch_active.call(self, inpt)
+    def __enabled_for_conditions(self, inpt):
+        conditions = self.conditions.optimized(type(inpt), self.compounded)
+
+        if not conditions:
+            return None
+
+        # Without a context from the manager, arguments are constructed for
+        # each condition, which is cheaper than memoizing them when the first
+        # condition decides the switch
+        context = getattr(self.manager, 'context', None)
+
+        if getattr(self.manager, 'adaptive', False):
+            stats = self.conditions.stats
+            conditions = stats.ranked(conditions, self.compounded)
+
+            def call(cond):
+                return stats.call(cond, inpt, context)
+        else:
+            def call(cond):
+                return cond.call(inpt, context)
 
-        return is_enabled
+        if context is None:
+            def applies(cond):
+                return cond.argument(inpt).applies
+        else:
+            def applies(cond):
+                return context.argument(cond.argument, inpt).applies
+
+        return self.__enabled_func(
+            call(cond)
+            for cond
+            in conditions
+            if applies(cond)
+        )
+
+    def __static_enabled_for_all(self, inpts):
+        enabled = self.state is self.states.GLOBAL
+        compounded = bool(self.compounded)
+        checked = signals.switch_checked
+        active = signals.switch_active
+
+        # Without receivers the result only depends on there being inputs
+        if not (checked.has_receivers or active.has_receivers):
+            return enabled if inpts else compounded
+
+        for inpt in inpts:
+            if checked.has_receivers:
+                checked.call(self)
+
+            if enabled and active.has_receivers:
+                active.call(self, inpt)
+
+            # Short circuit the same way any() or all() would
+            if enabled is not compounded:
+                return enabled
+
+        return compounded
 
 
 class Condition(object):
@@ -330,7 +739,7 @@ class Condition(object):
             self.negative is other.negative
         )
 
-    def call(self, inpt):
+    def call(self, inpt, context=None):
         """
         Returns if the condition applies to the ``inpt``.
 
@@ -344,17 +753,29 @@ class Condition(object):
 
         Keyword Arguments:
         inpt -- An instance of the ``Input`` class.
+        context -- An ``EvaluationContext`` to share argument instances and
+                   variables through.  A new one is used if not provided.
         """
         if inpt is Manager.NONE_INPUT:
             return False
 
-        # Call (construct) the argument with the input object
-        argument_instance = self.argument(inpt)
+        if context is None:
+            # Call (construct) the argument with the input object
+            argument_instance = self.argument(inpt)
 
-        if not argument_instance.applies:
-            return False
+            if not argument_instance.applies:
+                return False
 
-        application = self.__apply(argument_instance, inpt)
+            variable = getattr(argument_instance, self.attribute)
+        else:
+            argument_instance = context.argument(self.argument, inpt)
+
+            if not argument_instance.applies:
+                return False
+
+            variable = context.variable(self.argument, inpt, self.attribute)
+
+        application = self.__apply(variable, inpt)
 
         if self.negative:
             application = not application
@@ -366,9 +787,7 @@ class Condition(object):
         parts = [self.argument.__name__, self.attribute]
         return '.'.join(map(str, parts))
 
-    def __apply(self, argument_instance, inpt):
-        variable = getattr(argument_instance, self.attribute)
-
+    def __apply(self, variable, inpt):
         try:
             return self.operator.applies_to(variable)
         except Exception as error:
@@ -383,6 +802,45 @@ class Manager(threading.local):
     registered, and also what Input objects are currently being applied.  It
     also offers an ``active`` method to ask it if a given switch name is
     active, given its conditions and current inputs.
+
+    If ``compiled`` is ``True``, ``active`` checks switches with the functions
+    built by ``gutter.client.compiler`` instead of ``Switch.enabled_for_all``.
+
+    If ``request_cache`` is ``True``, calling ``input`` starts a new
+    ``EvaluationCache`` and ``flush`` discards it, so the results of ``active``
+    are memoized between the two.  See ``evaluation_cache`` for details.
+
+    If ``adaptive`` is ``True``, switches record how long their conditions take
+    to check and how often they are true, and check them in the order most
+    likely to short circuit cheaply.  See ``ConditionStats`` for details.  It
+    has no effect on ``compiled`` switches.
+
+    If a ``switch_cache`` is given, such as a ``gutter.client.cache.SwitchCache``,
+    ``switch`` reads switches through it instead of from ``storage`` every
+    time.  Entries are invalidated when this manager changes a switch and when
+    the storage's ``last_updated()`` version changes, which the cache checks
+    at most once every ``SwitchCache.check_interval`` seconds.
+
+    If a ``gutter.client.snapshot.SnapshotStore`` is given as ``snapshots``,
+    switches are read from its current snapshot instead of from ``storage``,
+    and each call to ``active`` or ``active_many`` reads from one snapshot
+    throughout.  The snapshot is marked stale whenever this manager changes a
+    switch, and rebuilt by the store's ``SnapshotRefresher`` if it has one, or
+    else the next time it is read.  ``refresh`` rebuilds it straight away.
+    Switches missing from the snapshot are read from ``storage``, as they
+    may have been registered since it was built, and only autocreated if
+    they are not there either.
+
+    If a ``gutter.client.index.KeyIndex`` is given as ``key_index``, listing
+    ``switches`` and finding children look keys up in the index instead of
+    scanning every key in ``storage``.
+
+    Storages implementing any of the extended storage protocol described in
+    ``gutter.client.storage`` are used through it: ``switches``,
+    ``get_children`` and unregistering read and scan keys in bulk, bulk
+    registering and unregistering write in bulk, and ``active`` and
+    ``active_many`` fetch every switch they check, with its ancestors, in one
+    ``get_many`` call unless ``switch_cache`` or ``snapshots`` are in use.
     """
 
     key_separator = DEFAULT_SEPARATOR
@@ -392,6 +850,7 @@ class Manager(threading.local):
     #: Special singleton used to represent a "no input" which arguments can look
     #: for and ignore
     NONE_INPUT = object()
+    NONE_INPUTS = (NONE_INPUT,)
 
     def __init__(
         self,
@@ -399,7 +858,13 @@ class Manager(threading.local):
         autocreate=False,
         switch_class=Switch,
         inputs=None,
-        namespace=None
+        namespace=None,
+        compiled=False,
+        request_cache=False,
+        adaptive=False,
+        switch_cache=None,
+        snapshots=None,
+        key_index=None
     ):
         if storage is None:
             # todo: make a better check
@@ -418,11 +883,28 @@ class Manager(threading.local):
         self.inputs = inputs
         self.switch_class = switch_class
         self.namespace = namespace
+        self.compiled = compiled
+        self.request_cache = request_cache
+        self.adaptive = adaptive
+        self.switch_cache = switch_cache
+        self.snapshots = snapshots
+        self.key_index = key_index
+        self.snapshot = None
+        self.prefetched = None
+        self.context = None
+        self.cache = None
 
     def __getstate__(self):
         inner_dict = vars(self).copy()
         inner_dict.pop('inputs', False)
         inner_dict.pop('storage', False)
+        inner_dict.pop('context', False)
+        inner_dict.pop('cache', False)
+        inner_dict.pop('switch_cache', False)
+        inner_dict.pop('snapshots', False)
+        inner_dict.pop('snapshot', False)
+        inner_dict.pop('prefetched', False)
+        inner_dict.pop('key_index', False)
         return inner_dict
 
     def __getitem__(self, key):
@@ -432,19 +914,35 @@ class Manager(threading.local):
         return self.__namespaced(key) in self.storage
 
     def __delitem__(self, key):
+        previous = self.__index_version()
         del self.storage[self.__namespaced(key)]
+        self.__stored([self.__namespaced(key)], previous, removed=True)
+
+    def refresh(self):
+        """
+        Builds a new snapshot of ``storage`` for ``snapshots`` to serve
+        switches from.  Does nothing if this manager has no ``snapshots``.
+        """
+        if self.snapshots is not None:
+            self.snapshots.refresh(self.storage)
 
     @property
     def switches(self):
         """
         List of all switches currently registered.
         """
-        results = [
-            switch for name, switch in self.storage.iteritems()
-            if name.startswith(self.__joined_namespace)
-        ]
+        prefix = self.__joined_namespace
 
-        return results
+        if self.key_index is None and not hasattr(self.storage, 'scan_prefix'):
+            return [
+                switch for name, switch in self.storage.iteritems()
+                if name.startswith(prefix)
+            ]
+
+        keys = self.__keys_with_prefix(prefix)
+        switches = self.__get_many(keys)
+
+        return [switches[key] for key in keys if key in switches]
 
     def switch(self, name):
         """
@@ -457,7 +955,7 @@ class Manager(threading.local):
         name -- A name of a switch.
         """
         try:
-            switch = self.storage[self.__namespaced(name)]
+            switch = self.__load(self.__namespaced(name))
         except KeyError:
             if not self.autocreate:
                 raise ValueError("No switch named '%s' registered in '%s'" % (name, self.namespace))
@@ -469,12 +967,9 @@ class Manager(threading.local):
 
     def get_children(self, parent):
         namespaced_parent = self.__namespaced(parent) + ':'
-        return [
-            self.__denamespaced(child)
-            for child
-            in self.storage.keys()
-            if child.startswith(namespaced_parent)
-        ]
+        children = self.__keys_with_prefix(namespaced_parent)
+
+        return map(self.__denamespaced, children)
 
     def register(self, switch, signal=signals.switch_registered):
         '''
@@ -485,47 +980,310 @@ class Manager(threading.local):
 
         switch.manager = self
         self.__persist(switch)
+        self.__clear_cache()
 
         signal.call(switch)
 
-    def unregister(self, switch_or_name):
-        switch = getattr(switch_or_name, 'name', switch_or_name)
+    def register_many(
+        self,
+        switches,
+        signal=signals.switch_registered,
+        batch_signal=signals.switches_registered
+    ):
+        """
+        Registers each of ``switches``, writing them to the storage with its
+        ``set_many`` method if it has one, or one at a time if not.
+
+        If any write fails, the switches already written are rolled back
+        before the error is raised, by the manager or, when the storage has
+        ``set_many``, by ``set_many`` itself.  Otherwise ``signal`` is called for each
+        switch, and ``batch_signal`` once with the list of switches.
+        """
+        switches = list(switches)
 
-        map(self.unregister, self.get_children(switch))
+        for switch in switches:
+            if not switch.name:
+                raise ValueError('Switch name cannot be blank')
 
-        if switch in self:
-            signals.switch_unregistered.call(self.switch(switch))
-            del self.storage[self.__namespaced(switch)]
+        for switch in switches:
+            switch.manager = self
+            switch.invalidate()
+
+        self.__set_many(
+            dict((self.__namespaced(switch.name), switch) for switch in switches)
+        )
+
+        if signal.has_receivers:
+            for switch in switches:
+                signal.call(switch)
+
+        batch_signal.call(switches)
+
+    def update_many(self, switches):
+        """
+        Updates each of ``switches`` like ``update``, writing them in one batch
+        like ``register_many``.
+        """
+        switches = list(switches)
+
+        self.register_many(
+            switches,
+            signal=signals.switch_updated,
+            batch_signal=signals.switches_updated
+        )
+
+        for switch in switches:
+            switch.reset()
+
+    def unregister_many(self, switches_or_names):
+        """
+        Unregisters each of ``switches_or_names`` along with all their
+        children, deleting them from the storage with its ``delete_many``
+        method if it has one, or one at a time if not.
+
+        ``switch_unregistered`` is called for each switch before any of them
+        are deleted.  If any delete fails, the switches already deleted are
+        restored before the error is raised.  Otherwise
+        ``switches_unregistered`` is called once with the list of them.
+        """
+        names = set()
+
+        for switch_or_name in switches_or_names:
+            name = getattr(switch_or_name, 'name', switch_or_name)
+            names.add(name)
+            names.update(self.get_children(name))
+
+        # Children come before their parents
+        keys = map(self.__namespaced, sorted(names, reverse=True))
+        found = self.__get_many(keys)
+        switches = [found[key] for key in keys if key in found]
+
+        for switch in switches:
+            switch.manager = self
+
+            # Sent while the switch can still be read from storage, as
+            # ``unregister`` always has
+            signals.switch_unregistered.call(switch)
+
+        self.__delete_many(
+            [(self.__namespaced(switch.name), switch) for switch in switches]
+        )
+
+        signals.switches_unregistered.call(switches)
+
+    def unregister(self, switch_or_name):
+        """
+        Unregisters a switch and all its children, as ``unregister_many``.
+        """
+        self.unregister_many([switch_or_name])
 
     def input(self, *inputs):
         self.inputs = list(inputs)
 
+        if self.request_cache:
+            self.cache = EvaluationCache()
+
     def flush(self):
         self.inputs = []
 
+        if self.request_cache:
+            self.cache = None
+
+    @contextmanager
+    def evaluation_cache(self):
+        """
+        Memoizes the results of ``active`` and ``active_many`` by switch name
+        and input identity inside the ``with`` block, yielding the
+        ``EvaluationCache`` used.
+
+        The cache is local to the current thread, and is cleared whenever this
+        manager registers, updates or unregisters a switch.  Changes made to
+        the storage by anything else are not seen until the block is exited.
+        """
+        previous = self.cache
+        self.cache = EvaluationCache()
+
+        try:
+            yield self.cache
+        finally:
+            self.cache = previous
+
     def active(self, name, *inputs, **kwargs):
-        switch = self.switch(name)
+        inputs = self.__inputs_for(inputs, kwargs)
+        results = None
 
-        if not kwargs.get('exclusive', False):
-            inputs = tuple(self.inputs) + inputs
+        if self.cache is not None:
+            results = self.__results_for(inputs, (name,))
 
-        # Also check the switches against "NONE" input. This ensures there will
-        # be at least one input checked.
-        if not inputs:
-            inputs = (self.NONE_INPUT,)
+            if name in results:
+                return results[name]
+
+        # Everything checked during the outermost call, including parent
+        # switches, shares one evaluation context and snapshot
+        owns_context = self.context is None
+        owns_snapshot = self.__pin_snapshot()
+        owns_prefetched = self.__prefetch((name,))
+
+        try:
+            return self.__active(name, self.switch(name), inputs, results)
+        finally:
+            if owns_context:
+                self.context = None
+            if owns_snapshot:
+                self.snapshot = None
+            if owns_prefetched:
+                self.prefetched = None
+
+    def active_many(self, names, *inputs, **kwargs):
+        """
+        Returns a dict of each switch name in ``names`` to whether that switch
+        is active, as ``active`` would return for it.
+
+        Each switch and ancestor switch is fetched from storage and checked at
+        most once, and all checks share one evaluation context.  Accepts the
+        same inputs and ``exclusive`` keyword argument as ``active``.
+        """
+        inputs = self.__inputs_for(inputs, kwargs)
+
+        if self.cache is not None:
+            results = self.__results_for(inputs, names)
+        else:
+            results = {}
+
+        owns_context = self.context is None
+        owns_snapshot = self.__pin_snapshot()
+        owns_prefetched = self.__prefetch(
+            [name for name in names if name not in results]
+        )
+
+        if owns_context and len(names) > 1:
+            self.context = EvaluationContext()
+
+        try:
+            for name in names:
+                if name not in results:
+                    self.__active(name, self.switch(name), inputs, results)
+        finally:
+            if owns_context:
+                self.context = None
+            if owns_snapshot:
+                self.snapshot = None
+            if owns_prefetched:
+                self.prefetched = None
+
+        return dict((name, results[name]) for name in names)
+
+    def __active(self, name, switch, inputs, results):
+        """
+        Checks ``switch`` against ``inputs``, storing the result for it and
+        each of its checked ancestors in ``results`` unless it is ``None``.
+        Ancestors already in ``results`` are neither fetched nor checked again.
+        """
+        result = True
+
+        # If necessary, the switch first consents with its parent and is not
+        # active if the parent is not enabled for ``inputs``.
+        if switch.concent:
+            parent_name = switch.parent
+
+            if results is not None and parent_name in results:
+                result = results[parent_name]
+            else:
+                parent = switch.get_parent()
+
+                if parent is not None:
+                    # The parent and the switch share arguments through it
+                    if self.context is None:
+                        self.context = EvaluationContext()
 
-        # If necessary, the switch first consents with its parent and returns
-        # false if the switch is consenting and the parent is not enabled for
-        # ``inputs``.
+                    result = self.__active(parent_name, parent, inputs, results)
+
+        if result:
+            result = self.__enabled_for(switch, inputs)
+
+        if results is not None:
+            results[name] = result
+
+        return result
+
+    def __enabled_for(self, switch, inputs):
+        # GLOBAL and DISABLED switches never look at their conditions, so they
+        # need neither an evaluation context nor a compiled function
+        if switch.state is not switch.states.SELECTIVE:
+            return switch.enabled_for_all(*inputs)
+
+        if self.compiled:
+            if self.context is None:
+                self.context = EvaluationContext()
+
+            return compiled(switch)(*inputs, context=self.context)
+
+        # Checking one switch against one input has nothing to share through
+        # a context, and is faster without one
+        if self.context is None and len(inputs) > 1:
+            self.context = EvaluationContext()
+
+        return switch.enabled_for_all(*inputs)
+
+    def __pin_snapshot(self):
+        if self.snapshots is None or self.snapshot is not None:
+            return False
+
+        self.snapshot = self.snapshots.get(self.storage)
+        return True
+
+    def __prefetch(self, names):
+        """
+        Fetches the switches ``names`` and all their ancestors from storage
+        with one ``get_many`` call, for ``switch`` to read them from until the
+        outermost check is done.
+        """
+        get_many = getattr(self.storage, 'get_many', None)
 
         if (
-            switch.concent
-            and switch.get_parent()
-            and not self.active(switch.parent, *inputs, **kwargs)
+            get_many is None
+            or self.prefetched is not None
+            or self.snapshots is not None
+            or self.switch_cache is not None
         ):
             return False
 
-        return switch.enabled_for_all(*inputs)
+        keys = set()
+
+        for name in names:
+            parts = name.split(self.key_separator)
+
+            for end in range(1, len(parts) + 1):
+                keys.add(self.__namespaced(self.key_separator.join(parts[:end])))
+
+        self.prefetched = get_many(keys)
+        return True
+
+    def __results_for(self, inputs, names):
+        results = self.cache.results_for(inputs)
+
+        for name in set(names):
+            if name in results:
+                self.cache.hits += 1
+            else:
+                self.cache.misses += 1
+
+        return results
+
+    def __clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+    def __inputs_for(self, inputs, kwargs):
+        if self.inputs and not kwargs.get('exclusive', False):
+            inputs = tuple(self.inputs) + inputs
+
+        # Also check the switches against "NONE" input. This ensures there will
+        # be at least one input checked.
+        if not inputs:
+            inputs = self.NONE_INPUTS
+
+        return inputs
 
     def update(self, switch):
 
@@ -548,12 +1306,170 @@ class Manager(threading.local):
             inputs=self.inputs,
             switch_class=self.switch_class,
             namespace=new_namespace,
+            compiled=self.compiled,
+            request_cache=self.request_cache,
+            adaptive=self.adaptive,
+            switch_cache=self.switch_cache,
+            snapshots=self.snapshots,
+            key_index=self.key_index,
         )
 
     def __persist(self, switch):
+        switch.invalidate()
+        previous = self.__index_version()
         self.storage[self.__namespaced(switch.name)] = switch
+        self.__stored([self.__namespaced(switch.name)], previous)
         return switch
 
+    def __set_many(self, items):
+        set_many = getattr(self.storage, 'set_many', None)
+        previous = self.__index_version()
+
+        try:
+            if set_many is not None:
+                set_many(items)
+            else:
+                self.__set_each(items.items())
+        except Exception:
+            self.__stored(None)
+            raise
+
+        self.__stored(items.keys(), previous)
+
+    def __delete_many(self, items):
+        delete_many = getattr(self.storage, 'delete_many', None)
+        previous = self.__index_version()
+
+        try:
+            if delete_many is not None:
+                delete_many([key for key, _ in items])
+            else:
+                self.__delete_each(items)
+        except Exception:
+            self.__stored(None)
+            raise
+
+        self.__stored([key for key, _ in items], previous, removed=True)
+
+    def __set_each(self, items):
+        written = []
+
+        try:
+            for key, switch in items:
+                previous = self.storage.get(key, self.__MISSING)
+                self.storage[key] = switch
+                written.append((key, previous))
+        except Exception:
+            error = sys.exc_info()
+            self.__restore(written)
+            raise error[0], error[1], error[2]
+
+    def __delete_each(self, items):
+        deleted = []
+
+        try:
+            for key, switch in items:
+                del self.storage[key]
+                deleted.append((key, switch))
+        except Exception:
+            error = sys.exc_info()
+            self.__restore(deleted)
+            raise error[0], error[1], error[2]
+
+    def __restore(self, items):
+        """
+        Puts back the ``(key, previous value)`` pairs in ``items``, most recent
+        first, deleting keys which were not in the storage before.
+        """
+        for key, previous in reversed(items):
+            if previous is self.__MISSING:
+                self.storage.pop(key, None)
+            else:
+                self.storage[key] = previous
+
+    __MISSING = object()
+
+    def __index_version(self):
+        """
+        Returns the storage version to give the key index with the keys of the
+        write about to be made.
+        """
+        if self.key_index is None:
+            return None
+
+        return storage_version(self.storage)
+
+    def __stored(self, keys, previous=None, removed=False):
+        """
+        Brings the switch cache and key index up to date, and marks the
+        snapshot stale, after ``keys`` were written to, or ``removed`` from,
+        the storage at version ``previous``.  If ``keys`` is ``None``, which
+        keys changed is unknown.
+        """
+        if keys is None:
+            if self.switch_cache is not None:
+                self.switch_cache.invalidate()
+            if self.key_index is not None:
+                self.key_index.invalidate()
+        else:
+            if self.switch_cache is not None:
+                for key in keys:
+                    self.switch_cache.invalidate(key)
+            if self.key_index is not None:
+                self.key_index.update(self.storage, keys, previous, removed)
+
+        self.__clear_cache()
+
+        if self.snapshots is not None:
+            self.snapshots.invalidate()
+
+    def __load(self, key):
+        if self.prefetched is not None and key in self.prefetched:
+            return self.prefetched[key]
+
+        if self.snapshots is not None:
+            snapshot = self.snapshot
+
+            if snapshot is None:
+                snapshot = self.snapshots.get(self.storage)
+
+            try:
+                return snapshot[key]
+            except KeyError:
+                # Registered since the snapshot was built, or really missing
+                return self.storage[key]
+
+        if self.switch_cache is None:
+            return self.storage[key]
+
+        return self.switch_cache.get(
+            key,
+            self.storage.__getitem__,
+            self.__storage_version
+        )
+
+    def __storage_version(self):
+        return storage_version(self.storage)
+
+    def __keys_with_prefix(self, prefix):
+        if self.key_index is not None:
+            return self.key_index.prefixed(self.storage, prefix)
+
+        scan_prefix = getattr(self.storage, 'scan_prefix', None)
+
+        if scan_prefix is not None:
+            return scan_prefix(prefix)
+
+        return [key for key in self.storage.keys() if key.startswith(prefix)]
+
+    def __get_many(self, keys):
+        get_many = getattr(self.storage, 'get_many', None)
+
+        if get_many is not None:
+            return get_many(keys)
+
+        return dict((key, self.storage[key]) for key in keys if key in self.storage)
+
     def __create_and_register_disabled_switch(self, name):
         switch = self.switch_class(name)
         switch.state = self.switch_class.states.DISABLED
@@ -1,3 +1,4 @@
+from gutter.client.arguments.variables import Base as VariableBase
 from gutter.client.operators import Base
 from gutter.client.registry import operators
 
@@ -84,9 +85,70 @@ class MoreThanOrEqualTo(MoreThan):
         return 'more than or equal to "%s"' % self.lower_limit
 
 
+class In(Base):
+
+    """
+    Applies to arguments equal to any of ``values``, which are kept in a
+    ``frozenset`` so checking an argument takes the same time however many
+    values there are.  Values must be hashable, and arguments which are not
+    are in no set.  A single string is one value, not a set of characters.
+    """
+
+    name = 'in'
+    group = 'comparable'
+    preposition = 'in'
+    arguments = ('values',)
+
+    def __init__(self, values):
+        if isinstance(values, basestring):
+            values = [values]
+
+        self.values = frozenset(values)
+
+    def __getstate__(self):
+        # Pickled and encoded with values as the sorted list of ``variables``
+        return dict(vars(self), **self.variables)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.values = frozenset(state['values'])
+
+    @property
+    def variables(self):
+        # A sorted list encodes compactly, and the same way every time
+        return dict(values=sorted(self.values))
+
+    def applies_to(self, argument):
+        if isinstance(argument, VariableBase):
+            argument = argument.value
+
+        try:
+            return argument in self.values
+        except TypeError:
+            return False
+
+    def __str__(self):
+        return '%s %s' % (
+            self.preposition,
+            ', '.join('"%s"' % value for value in sorted(self.values))
+        )
+
+
+class NotIn(In):
+
+    name = 'not_in'
+    group = 'comparable'
+    preposition = 'not in'
+
+    def applies_to(self, argument):
+        return not super(NotIn, self).applies_to(argument)
+
+
 operators.register(Equals)
 operators.register(Between)
 operators.register(LessThan)
 operators.register(LessThanOrEqualTo)
 operators.register(MoreThan)
 operators.register(MoreThanOrEqualTo)
+operators.register(In)
+operators.register(NotIn)
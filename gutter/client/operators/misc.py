@@ -1,8 +1,61 @@
-from decimal import Context as decimal_Context, Decimal, DecimalException
+import re
+from decimal import Context as decimal_Context, Decimal, DecimalException, ROUND_CEILING
 
+from gutter.client import bucketing
+from gutter.client.arguments.variables import Base as VariableBase
 from gutter.client.operators import Base
 from gutter.client.registry import operators
 
+#: The grammar ``Decimal`` parses strings with, copied from the decimal module
+_decimal_parser = re.compile(r"""
+    (?P<sign>[-+])?
+    (
+        (?=\d|\.\d)
+        (?P<int>\d*)
+        (\.(?P<frac>\d*))?
+        (E(?P<exp>[-+]?\d+))?
+    |
+        Inf(inity)?
+    |
+        (?P<signal>s)?
+        NaN
+        (?P<diag>\d*)
+    )
+    \Z
+""", re.VERBOSE | re.IGNORECASE | re.UNICODE).match
+
+#: Decimal raises when the integer quotient of a division needs more digits
+#: than this, and rounds remainders to this many digits
+_PRECISION = 28
+
+#: The largest number of decimal places a fixed point argument may have
+_MAX_PLACES = 60
+
+_POWERS_OF_TEN = [10 ** power for power in range(_PRECISION + _MAX_PLACES + 3)]
+
+
+def _fixed_point(limit):
+    """
+    Returns ``limit`` as an integer and a number of decimal places, so its
+    value is exactly ``integer / 10 ** places``, or ``None`` if it is not a
+    finite number.
+    """
+    if isinstance(limit, float):
+        limit = Decimal.from_float(limit)
+    elif not isinstance(limit, Decimal):
+        limit = Decimal(limit)
+
+    if not limit.is_finite():
+        return None
+
+    sign, digits, exponent = limit.as_tuple()
+    integer = int(''.join(map(str, digits)) or '0') * (-1 if sign else 1)
+
+    if exponent >= 0:
+        return integer * 10 ** exponent, 0
+
+    return integer, -exponent
+
 
 class PercentRange(Base):
 
@@ -11,6 +64,10 @@ class PercentRange(Base):
     preposition = 'in the percentage range of'
     arguments = ('lower_limit', 'upper_limit')
 
+    # The fixed point limits are kept in a slot, out of the operator's vars(),
+    # so they are not part of its variables, equality or encoded form
+    __slots__ = ('_bounds',)
+
     _context = decimal_Context()
 
     def _modulo(self, decimal_argument):
@@ -32,7 +89,82 @@ class PercentRange(Base):
         self.upper_limit = self._context.create_decimal(str(upper_limit))
         self.lower_limit = self._context.create_decimal(str(lower_limit))
 
+    def __setattr__(self, name, value):
+        if name in ('lower_limit', 'upper_limit'):
+            try:
+                del self._bounds
+            except AttributeError:
+                pass
+
+        super(PercentRange, self).__setattr__(name, value)
+
+    def __getstate__(self):
+        # Pickling a class with slots needs this, and leaves out the bounds
+        return self.__dict__
+
     def applies_to(self, argument):
+        """
+        Checks ``argument`` with integer fixed point arithmetic when it is an
+        int, a float, a string, a bool or a variable, which decides exactly as
+        converting it to a ``Decimal`` would.  Any other argument, or one too
+        large or too precise for ``Decimal`` to represent exactly, is
+        converted to a ``Decimal``.
+        """
+        try:
+            bounds = self._bounds
+        except AttributeError:
+            bounds = self._bounds = self.__fixed_point_bounds()
+
+        if bounds is None:
+            return self._decimal_applies_to(argument)
+
+        argument_type = type(argument)
+
+        if argument_type is int or argument_type is long:
+            integer, places = argument, 0
+        elif argument_type is bool:
+            integer, places = hash(argument), 0
+        elif argument_type is str or argument_type is unicode or argument_type is float:
+            fixed_point = self.__parse(argument)
+
+            if fixed_point is None:
+                return self._decimal_applies_to(argument)
+
+            integer, places = fixed_point
+        elif isinstance(argument, VariableBase) and argument_type.__str__ is object.__str__:
+            # Variables don't define __str__, so Decimal falls back to their hash
+            integer, places = hash(argument), 0
+        else:
+            return self._decimal_applies_to(argument)
+
+        if places == 0:
+            # Decimal refuses quotients of more than _PRECISION digits
+            if not -_POWERS_OF_TEN[_PRECISION + 2] < integer < _POWERS_OF_TEN[_PRECISION + 2]:
+                return self._decimal_applies_to(argument)
+
+            lower, upper = bounds[0]
+            return lower <= integer % 100 < upper
+
+        if not -_POWERS_OF_TEN[_PRECISION + 2 + places] < integer < _POWERS_OF_TEN[_PRECISION + 2 + places]:
+            return self._decimal_applies_to(argument)
+
+        (lower, lower_places), (upper, upper_places) = bounds[1]
+        remainder = integer % (100 * _POWERS_OF_TEN[places])
+
+        if integer < 0:
+            remainder = self.__round(remainder)
+
+        # Compare the remainder and limits at the same number of places
+        scale = max(places, lower_places, upper_places)
+        remainder *= _POWERS_OF_TEN[scale - places]
+
+        return (
+            lower * _POWERS_OF_TEN[scale - lower_places]
+            <= remainder
+            < upper * _POWERS_OF_TEN[scale - upper_places]
+        )
+
+    def _decimal_applies_to(self, argument):
         try:
             decimal_argument = Decimal(str(argument))
         except DecimalException:
@@ -40,6 +172,83 @@ class PercentRange(Base):
 
         return self.lower_limit <= self._modulo(decimal_argument) < self.upper_limit
 
+    def __fixed_point_bounds(self):
+        """
+        Returns the limits rounded up to integers, to compare integer
+        arguments with, and as fixed point numbers, or ``None`` if either
+        limit is not a finite number.
+        """
+        limits = map(_fixed_point, (self.lower_limit, self.upper_limit))
+
+        if None in limits or max(places for _, places in limits) > _MAX_PLACES:
+            return None
+
+        # An integer is at least, or less than, a limit exactly when it is at
+        # least, or less than, the limit rounded up
+        ceilings = tuple(-(-integer // 10 ** places) for integer, places in limits)
+
+        return ceilings, tuple(limits)
+
+    @staticmethod
+    def __round(remainder):
+        """
+        Rounds ``remainder`` half to even to ``_PRECISION`` digits, as adding
+        100 to a negative ``Decimal`` remainder does.
+        """
+        digits = len(str(remainder))
+
+        if digits <= _PRECISION:
+            return remainder
+
+        scale = _POWERS_OF_TEN[digits - _PRECISION]
+        quotient, dropped = divmod(remainder, scale)
+
+        if dropped * 2 > scale or (dropped * 2 == scale and quotient % 2):
+            quotient += 1
+
+        return quotient * scale
+
+    @staticmethod
+    def __parse(argument):
+        """
+        Returns the integer and number of decimal places of the number
+        ``Decimal(str(argument))`` would be, the hash of ``argument`` if that
+        would fail, or ``None`` if it is too large or too precise to check
+        with fixed point arithmetic.
+        """
+        match = _decimal_parser(str(argument).strip())
+
+        if match is None:
+            return hash(argument), 0
+
+        digits = match.group('int')
+
+        if digits is None:
+            # Infinity or NaN
+            return None
+
+        fraction = match.group('frac') or ''
+        digits += fraction
+
+        # Decimal rounds remainders with more digits than its precision
+        if len(digits.lstrip('0')) > _PRECISION:
+            return None
+
+        places = len(fraction) - int(match.group('exp') or '0')
+
+        if not -_PRECISION - 2 <= places <= _MAX_PLACES:
+            return None
+
+        integer = int(digits)
+
+        if match.group('sign') == '-':
+            integer = -integer
+
+        if places < 0:
+            return integer * _POWERS_OF_TEN[-places], 0
+
+        return integer, places
+
     def __str__(self):
         return 'in %0.1f - %0.1f%% of values' % (self.lower_limit, self.upper_limit)
 
@@ -51,6 +260,8 @@ class Percent(PercentRange):
     preposition = 'within the percentage of'
     arguments = ('percentage',)
 
+    __slots__ = ()
+
     def __init__(self, percentage):
         self.upper_limit = float(percentage)
         self.lower_limit = 0.0
@@ -63,5 +274,114 @@ class Percent(PercentRange):
         return 'in %s%% of values' % self.upper_limit
 
 
+class StablePercentRange(Base):
+
+    """
+    Like ``PercentRange``, but buckets arguments with
+    ``gutter.client.bucketing``, so an argument is in the range in every
+    process, every time it is checked.  Arguments are bucketed by a hash
+    salted with ``salt``: give each rollout its own salt, such as the name of
+    its switch, so inputs in the range for one are unrelated to those in the
+    range for another, or the same salt to roll features out to the same
+    inputs.
+
+    Arguments whose hash is not stable, such as arbitrary objects, are never
+    in the range.
+    """
+
+    name = 'stable_percent_range'
+    group = 'misc'
+    preposition = 'in the stable percentage range of'
+    arguments = ('lower_limit', 'upper_limit', 'salt')
+
+    # The bucket bounds and salt hash are kept in slots, out of the operator's
+    # vars(), so they are not part of its variables, equality or encoded form
+    __slots__ = ('_bounds', '_salt_hash')
+
+    _context = PercentRange._context
+
+    def __init__(self, lower_limit, upper_limit, salt=''):
+        self.upper_limit = self._context.create_decimal(str(upper_limit))
+        self.lower_limit = self._context.create_decimal(str(lower_limit))
+        self.salt = salt
+
+    def __setattr__(self, name, value):
+        if name in ('lower_limit', 'upper_limit', 'salt'):
+            for cached in ('_bounds', '_salt_hash'):
+                try:
+                    delattr(self, cached)
+                except AttributeError:
+                    pass
+
+        super(StablePercentRange, self).__setattr__(name, value)
+
+    def __getstate__(self):
+        # Pickling a class with slots needs this, and leaves out the caches
+        return self.__dict__
+
+    def applies_to(self, argument):
+        try:
+            lower, upper = self._bounds
+            salt_hash = self._salt_hash
+        except AttributeError:
+            lower, upper = self._bounds = tuple(map(self.__bucket_bound, (
+                self.lower_limit,
+                self.upper_limit
+            )))
+            salt_hash = self._salt_hash = bucketing.stable_hash(self.salt)
+
+        try:
+            value_hash = bucketing.stable_hash(argument)
+        except TypeError:
+            return False
+
+        return lower <= bucketing.bucket(value_hash, salt_hash) < upper
+
+    @staticmethod
+    def __bucket_bound(limit):
+        """
+        Returns the lowest bucket at or above ``limit`` percent.  A bucket is
+        at least, or less than, ``limit`` exactly when it is at least, or less
+        than, this bound.
+        """
+        bound = Decimal(str(limit)) * bucketing.BUCKETS / 100
+
+        if not bound.is_finite():
+            return bound
+
+        return int(bound.to_integral_value(rounding=ROUND_CEILING))
+
+    def __str__(self):
+        return 'in %0.1f - %0.1f%% of values by %r' % (
+            self.lower_limit,
+            self.upper_limit,
+            self.salt
+        )
+
+
+class StablePercent(StablePercentRange):
+
+    name = 'stable_percent'
+    group = 'misc'
+    preposition = 'within the stable percentage of'
+    arguments = ('percentage', 'salt')
+
+    __slots__ = ()
+
+    def __init__(self, percentage, salt=''):
+        self.upper_limit = float(percentage)
+        self.lower_limit = 0.0
+        self.salt = salt
+
+    @property
+    def variables(self):
+        return dict(percentage=self.upper_limit, salt=self.salt)
+
+    def __str__(self):
+        return 'in %s%% of values by %r' % (self.upper_limit, self.salt)
+
+
 operators.register(PercentRange)
 operators.register(Percent)
+operators.register(StablePercentRange)
+operators.register(StablePercent)
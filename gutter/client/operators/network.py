@@ -0,0 +1,205 @@
+import bisect
+import socket
+
+from gutter.client.arguments.variables import Base as VariableBase
+from gutter.client.operators import Base
+from gutter.client.registry import operators
+
+#: The address family, and the number of bits in an address, of each version
+VERSIONS = {4: (socket.AF_INET, 32), 6: (socket.AF_INET6, 128)}
+
+#: Addresses in ``::ffff:0:0/96`` are IPv4 addresses mapped into IPv6
+_MAPPED_PREFIX = 0xffff << 32
+
+
+def parse_address(address):
+    """
+    Returns the IP version and integer value of the IPv4 or IPv6 ``address``
+    string, or ``None`` if it is not one.  IPv4 addresses mapped into IPv6
+    are returned as IPv4 addresses.
+    """
+    if isinstance(address, unicode):
+        try:
+            address = address.encode('ascii')
+        except UnicodeError:
+            return None
+    elif not isinstance(address, str):
+        return None
+
+    version = 6 if ':' in address else 4
+    family, bits = VERSIONS[version]
+
+    try:
+        packed = socket.inet_pton(family, address.strip())
+    except (socket.error, ValueError):
+        return None
+
+    value = int(packed.encode('hex'), 16)
+
+    if version == 6 and value >> 32 == _MAPPED_PREFIX >> 32:
+        return 4, value & 0xffffffff
+
+    return version, value
+
+
+def parse_network(network):
+    """
+    Returns the IP version, first address and last address of the ``network``
+    written in CIDR notation, such as ``10.0.0.0/8`` or ``2001:db8::/32``.  An
+    address without a prefix length is a network of just that address, and
+    bits of the address past the prefix are ignored.
+
+    Raises ``ValueError`` if ``network`` is not a network.
+    """
+    if not isinstance(network, basestring):
+        raise ValueError('%r is not an IPv4 or IPv6 network' % (network,))
+
+    address, _, prefix = network.partition('/')
+    parsed = parse_address(address)
+
+    if parsed is None:
+        raise ValueError('%r is not an IPv4 or IPv6 network' % (network,))
+
+    version, value = parsed
+    bits = VERSIONS[version][1]
+    mapped = version == 4 and ':' in address
+
+    try:
+        prefix = int(prefix) if prefix.strip() else bits + 96 * mapped
+    except ValueError:
+        raise ValueError('%r has an invalid prefix length' % (network,))
+
+    # Mapped IPv4 networks are the IPv4 network they map to
+    if mapped:
+        prefix -= 96
+
+    if not 0 <= prefix <= bits:
+        raise ValueError('%r has an invalid prefix length' % (network,))
+
+    host_mask = (1 << (bits - prefix)) - 1
+    first = value & ~host_mask
+
+    return version, first, first | host_mask
+
+
+def format_network(version, first, prefix):
+    family, bits = VERSIONS[version]
+    packed = ('%0*x' % (bits // 4, first)).decode('hex')
+
+    return '%s/%d' % (socket.inet_ntop(family, packed), prefix)
+
+
+class InNetwork(Base):
+
+    """
+    Applies to IPv4 and IPv6 address strings in any of ``networks``, written
+    in CIDR notation.  The networks are compiled once into a sorted list of
+    disjoint address ranges for each IP version, which an address is found in
+    by bisection, so checking an address takes about the same time however
+    many networks there are.
+
+    IPv4 addresses mapped into IPv6, like ``::ffff:10.0.0.1``, are in the
+    IPv4 networks they map to.  Anything but an address is in no network.
+    """
+
+    name = 'in_network'
+    group = 'network'
+    preposition = 'in network'
+    arguments = ('networks',)
+
+    # The compiled ranges are kept in a slot, out of the operator's vars(), so
+    # they are not part of its variables, equality or encoded form
+    __slots__ = ('_ranges',)
+
+    def __init__(self, networks):
+        if isinstance(networks, basestring):
+            networks = [networks]
+
+        self.networks = tuple(sorted(set(map(parse_network, networks))))
+
+    def __setattr__(self, name, value):
+        if name == 'networks':
+            try:
+                del self._ranges
+            except AttributeError:
+                pass
+
+        super(InNetwork, self).__setattr__(name, value)
+
+    def __getstate__(self):
+        # Pickling a class with slots needs this.  It leaves out the ranges,
+        # and writes networks in CIDR notation, as ``variables`` has them.
+        return dict(vars(self), **self.variables)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        # Networks pickled before were already parsed
+        self.networks = tuple(sorted(set(
+            parse_network(network) if isinstance(network, basestring) else tuple(network)
+            for network in state['networks']
+        )))
+
+    @property
+    def variables(self):
+        return dict(networks=[
+            format_network(version, first, VERSIONS[version][1] - (last - first).bit_length())
+            for version, first, last in self.networks
+        ])
+
+    @property
+    def ranges(self):
+        """
+        A dict of each IP version to a sorted list of the first addresses of
+        the disjoint ranges the networks cover, and a list of their last.
+        """
+        try:
+            return self._ranges
+        except AttributeError:
+            pass
+
+        ranges = dict((version, ([], [])) for version in VERSIONS)
+
+        for version, first, last in self.networks:
+            firsts, lasts = ranges[version]
+
+            if lasts and first <= lasts[-1] + 1:
+                lasts[-1] = max(lasts[-1], last)
+            else:
+                firsts.append(first)
+                lasts.append(last)
+
+        self._ranges = ranges
+        return ranges
+
+    def applies_to(self, argument):
+        if isinstance(argument, VariableBase):
+            argument = argument.value
+
+        parsed = parse_address(argument)
+
+        if parsed is None:
+            return False
+
+        version, value = parsed
+        firsts, lasts = self.ranges[version]
+        position = bisect.bisect_right(firsts, value) - 1
+
+        return position >= 0 and value <= lasts[position]
+
+    def __str__(self):
+        return '%s %s' % (self.preposition, ', '.join(self.variables['networks']))
+
+
+class NotInNetwork(InNetwork):
+
+    name = 'not_in_network'
+    group = 'network'
+    preposition = 'not in network'
+
+    def applies_to(self, argument):
+        return not super(NotInNetwork, self).applies_to(argument)
+
+
+operators.register(InNetwork)
+operators.register(NotInNetwork)
@@ -1,8 +1,22 @@
 from gutter.client.arguments.variables import Base as VariableBase
 from gutter.client.operators import Base
+from gutter.client.operators.comparable import In
 from gutter.client.registry import operators
 
 
+def normalize(argument):
+    """
+    Returns ``argument``, or the value of an argument variable, as a stripped,
+    lower case string.
+    """
+    if isinstance(argument, VariableBase):
+        argument = str(argument.value)
+    else:
+        argument = str(argument)
+
+    return argument.lower().strip()
+
+
 class EqualsStripIgnoreCase(Base):
 
     name = 'strip_ignorecase_equals'
@@ -11,14 +25,46 @@ class EqualsStripIgnoreCase(Base):
     arguments = ('value',)
 
     def applies_to(self, argument):
-        if isinstance(argument, VariableBase):
-            argument = str(argument.value)
-        else:
-            argument = str(argument)
-
-        return argument.lower().strip() == self.value.lower().strip()
+        return normalize(argument) == self.value.lower().strip()
 
     def __str__(self):
         return '%s "%s"' % (self.preposition, self.value.lower())
 
+
+class InStripIgnoreCase(In):
+
+    """
+    Applies to arguments which are equal to any of ``values`` when both are
+    stripped and lower cased, as ``EqualsStripIgnoreCase`` compares them.
+    Values are kept stripped and lower cased.
+    """
+
+    name = 'strip_ignorecase_in'
+    group = 'string'
+    preposition = 'strip ignore case in'
+
+    def __init__(self, values):
+        if isinstance(values, basestring):
+            values = [values]
+
+        super(InStripIgnoreCase, self).__init__(
+            value.lower().strip() for value in values
+        )
+
+    def applies_to(self, argument):
+        return normalize(argument) in self.values
+
+
+class NotInStripIgnoreCase(InStripIgnoreCase):
+
+    name = 'strip_ignorecase_not_in'
+    group = 'string'
+    preposition = 'strip ignore case not in'
+
+    def applies_to(self, argument):
+        return not super(NotInStripIgnoreCase, self).applies_to(argument)
+
+
 operators.register(EqualsStripIgnoreCase)
+operators.register(InStripIgnoreCase)
+operators.register(NotInStripIgnoreCase)
@@ -0,0 +1,355 @@
+"""
+gutter.optimizer
+~~~~~~~~~~~~~~~~
+
+Rewrites the conditions a switch checks against one type of input into fewer,
+faster conditions deciding the switch exactly as the originals do:
+
+* Duplicate conditions are dropped.
+
+* ``Equals`` conditions on the same argument attribute are merged into one
+  condition looking the argument up in a dict of their values.
+
+* ``Between``, ``LessThan``, ``LessThanOrEqualTo``, ``MoreThan`` and
+  ``MoreThanOrEqualTo`` conditions on the same argument attribute are merged
+  into one condition finding the argument in their union, a sorted list of
+  disjoint intervals, by bisection.
+
+A switch which is not ``compounded`` is active when any condition is true, so
+only conditions which are not ``negative`` are merged: any of them being true
+is the merged condition being true.  A ``compounded`` switch needs every
+condition to be true, so only ``negative`` conditions are merged, as a
+``negative`` condition which is true when none of them are.
+
+Merged conditions only take their shortcuts for arguments which compare
+predictably: ``str``, ``unicode``, numbers, ``None``, and the built in argument
+variables of those other than NaN.  They check any other argument with each of the original
+operators in turn.  Operators which raise an error count as not applying, as
+they do in ``Condition.call``, but the ``condition_apply_error`` signal is
+only sent for errors raised checking conditions which were not merged.
+
+Switches whose ``conditions.optimize`` is set only ever check the optimized
+conditions; their ``conditions`` are left as they were, and are what is
+encoded and saved.  ``ConditionsList.optimize`` is off by default, because of
+the signals merged conditions don't send.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import bisect
+from collections import OrderedDict
+
+from gutter.client.arguments import variables
+from gutter.client.operators import Base
+from gutter.client.operators.comparable import (
+    Between,
+    Equals,
+    LessThan,
+    LessThanOrEqualTo,
+    MoreThan,
+    MoreThanOrEqualTo,
+)
+
+#: Types whose values compare and hash consistently with each other
+EXACT_TYPES = frozenset((str, unicode, int, long, bool, float, type(None)))
+
+NUMBER_TYPES = frozenset((int, long, bool, float))
+
+#: Argument variables which compare by their value.  Comparing one is either
+#: the same as comparing its value, or raises an error.
+VARIABLE_TYPES = frozenset((
+    variables.Value,
+    variables.Boolean,
+    variables.String,
+    variables.Integer,
+    variables.Float,
+))
+
+_NEGATIVE_INFINITY = float('-inf')
+_INFINITY = float('inf')
+
+
+def optimize(conditions, compounded):
+    """
+    Returns a list of conditions which, checked against any input, decide
+    ``any`` (or ``all`` if ``compounded``) of their results exactly as
+    ``conditions`` do.
+    """
+    merged = OrderedDict()
+    optimized = []
+
+    for condition in unique(conditions):
+        kind = mergeable(condition, compounded)
+
+        if kind is None:
+            optimized.append(condition)
+        else:
+            key = (condition.argument, condition.attribute, condition.negative, kind)
+            merged.setdefault(key, []).append(condition)
+
+    for (argument, attribute, negative, kind), group in merged.items():
+        if len(group) == 1:
+            optimized.extend(group)
+            continue
+
+        operator = kind([condition.operator for condition in group])
+        optimized.append(type(group[0])(argument, attribute, operator, negative))
+
+    return optimized
+
+
+def unique(conditions):
+    """
+    Returns ``conditions`` without duplicates: conditions equal to an earlier
+    one, with an operator of the same type and variables of the same types.
+    """
+    seen = {}
+    kept = []
+
+    for condition in conditions:
+        key = (condition.argument, condition.attribute, condition.negative, type(condition.operator))
+        key += (repr(sorted(condition.operator.variables.items())),)
+
+        candidates = seen.setdefault(key, [])
+
+        if not any(condition == other for other in candidates):
+            candidates.append(condition)
+            kept.append(condition)
+
+    return kept
+
+
+def mergeable(condition, compounded):
+    """
+    Returns the operator ``condition`` can be merged into when checked by a
+    switch which is ``compounded`` or not, or ``None`` if it can not be.
+    """
+    if bool(condition.negative) is not bool(compounded):
+        return None
+
+    operator = condition.operator
+    operator_type = type(operator)
+
+    if operator_type is Equals:
+        if exact(operator.value) and operator.value == operator.value:
+            return EqualsAny
+    elif operator_type in INTERVALS:
+        if all(number(limit) for _, limit, _ in bounds(operator)):
+            return InIntervals
+
+    return None
+
+
+def exact(value):
+    return type(value) in EXACT_TYPES
+
+
+def number(value):
+    # NaN is not equal to itself, nor less or more than anything
+    return type(value) in NUMBER_TYPES and value == value
+
+
+def unwrap(argument):
+    """
+    Returns the value of ``argument`` if it is a built in argument variable,
+    or else ``argument`` itself.
+    """
+    if type(argument) in VARIABLE_TYPES:
+        return argument.value
+
+    return argument
+
+
+def any_applies(operators, argument):
+    """
+    Returns if any of ``operators`` applies to ``argument``, counting those
+    which raise an error as not applying.
+    """
+    for operator in operators:
+        try:
+            if operator.applies_to(argument):
+                return True
+        except Exception:
+            pass
+
+    return False
+
+
+#: The lower and upper bounds of each interval operator, as a side, a limit
+#: and whether the limit itself is in the interval
+INTERVALS = {
+    Between: lambda operator: (
+        ('lower', operator.lower_limit, False),
+        ('upper', operator.upper_limit, False),
+    ),
+    LessThan: lambda operator: (('upper', operator.upper_limit, False),),
+    LessThanOrEqualTo: lambda operator: (('upper', operator.upper_limit, True),),
+    MoreThan: lambda operator: (('lower', operator.lower_limit, False),),
+    MoreThanOrEqualTo: lambda operator: (('lower', operator.lower_limit, True),),
+}
+
+
+def bounds(operator):
+    return INTERVALS[type(operator)](operator)
+
+
+def interval(operator):
+    """
+    Returns the interval of numbers ``operator`` applies to, as its lower
+    limit, whether that is in the interval, and the same for its upper limit.
+    Unbounded sides are infinite, and include infinity.
+    """
+    lower, upper = (_NEGATIVE_INFINITY, True), (_INFINITY, True)
+
+    for side, limit, closed in bounds(operator):
+        if side == 'lower':
+            lower = (limit, closed)
+        else:
+            upper = (limit, closed)
+
+    return lower + upper
+
+
+def contains(interval, number):
+    lower, lower_closed, upper, upper_closed = interval
+
+    return (
+        (lower < number or lower_closed and lower == number) and
+        (number < upper or upper_closed and number == upper)
+    )
+
+
+def union(intervals):
+    """
+    Returns the union of ``intervals`` as a sorted list of disjoint intervals.
+    """
+    merged = []
+
+    for lower, lower_closed, upper, upper_closed in sorted(
+        intervals,
+        key=lambda interval: (interval[0], not interval[1])
+    ):
+        # Drop empty intervals
+        if upper < lower or upper == lower and not (lower_closed and upper_closed):
+            continue
+
+        if merged:
+            last_lower, last_lower_closed, last_upper, last_upper_closed = merged[-1]
+
+            if lower < last_upper or lower == last_upper and (lower_closed or last_upper_closed):
+                if upper > last_upper:
+                    merged[-1] = (last_lower, last_lower_closed, upper, upper_closed)
+                elif upper == last_upper:
+                    merged[-1] = (last_lower, last_lower_closed, upper, upper_closed or last_upper_closed)
+
+                continue
+
+        merged.append((lower, lower_closed, upper, upper_closed))
+
+    return merged
+
+
+class EqualsAny(Base):
+
+    """
+    Applies to arguments any of the ``Equals`` ``operators`` applies to.  Each
+    operator's value must be of an ``EXACT_TYPES`` type, and not NaN.
+
+    An argument of those types is in the dict of values exactly when it is
+    equal to one of them.  Comparing a variable of one either raises an error
+    or compares its value, so the variable can only be equal to the values
+    equal to its own value, and is only checked against operators with those
+    values.
+    """
+
+    name = 'equals_any'
+    group = 'optimizer'
+    preposition = 'equal to any of'
+    arguments = ('operators',)
+
+    def __init__(self, operators):
+        self.operators = operators
+        self.by_value = {}
+
+        for operator in operators:
+            self.by_value.setdefault(operator.value, []).append(operator)
+
+    def applies_to(self, argument):
+        value = unwrap(argument)
+
+        if type(value) not in EXACT_TYPES:
+            return any_applies(self.operators, argument)
+
+        if value is argument:
+            return value in self.by_value
+
+        # String variables compare with cmp(), which orders NaN
+        if value != value:
+            return any_applies(self.operators, argument)
+
+        return any_applies(self.by_value.get(value, ()), argument)
+
+    def __str__(self):
+        return '%s %s' % (
+            self.preposition,
+            ', '.join('"%s"' % operator.value for operator in self.operators)
+        )
+
+
+class InIntervals(Base):
+
+    """
+    Applies to arguments any of the interval ``operators`` applies to.  Each
+    operator's limits must be numbers, and not NaN.
+
+    A number is found in the union of their intervals by bisection.  Comparing
+    a variable of a number other than NaN either raises an error or compares
+    the number, so the variable is only checked against operators whose
+    interval has its number in it, and only if the union does.
+    """
+
+    name = 'in_intervals'
+    group = 'optimizer'
+    preposition = 'in any of'
+    arguments = ('operators',)
+
+    def __init__(self, operators):
+        self.operators = operators
+        self.intervals = [(interval(operator), operator) for operator in operators]
+        self.union = union(span for span, _ in self.intervals)
+        self.lowers = [span[0] for span in self.union]
+
+    def applies_to(self, argument):
+        value = unwrap(argument)
+
+        if type(value) not in NUMBER_TYPES:
+            return any_applies(self.operators, argument)
+
+        if value is argument:
+            return value == value and self.__in_union(value)
+
+        # String variables compare with cmp(), which orders NaN
+        if value != value:
+            return any_applies(self.operators, argument)
+
+        if not self.__in_union(value):
+            return False
+
+        return any_applies(
+            [operator for span, operator in self.intervals if contains(span, value)],
+            argument
+        )
+
+    def __in_union(self, value):
+        position = bisect.bisect_right(self.lowers, value) - 1
+        return position >= 0 and contains(self.union[position], value)
+
+    def __str__(self):
+        return '%s %s' % (
+            self.preposition,
+            ', '.join(str(operator) for operator in self.operators)
+        )
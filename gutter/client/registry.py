@@ -6,6 +6,7 @@ class Registry(object):
 
     def __init__(self, cls):
         self.__items = {}
+        self.__keys = {}
         self.__cls = cls
 
     items = property(lambda self: self.__items)
@@ -24,6 +25,15 @@ class Registry(object):
             raise ValueError("%s is not a %s" % (obj, self.__cls))
 
         self.__items[key] = obj
+        self.__keys[obj] = key
+
+    def key_for(self, obj):
+        """
+        Returns the key ``obj`` was last registered under, or ``None`` if it is
+        not registered.
+        """
+        key = self.__keys.get(obj)
+        return key if self.__items.get(key) is obj else None
 
 
 def extract_key_from_name(func):
@@ -1,20 +1,42 @@
 class Signal(object):
 
     def __init__(self):
-        self.__callbacks = []
+        self.reset()
+
+    def connect(self, callback, switch_name=None):
+        """
+        Connects ``callback`` to this signal.
 
-    def connect(self, callback):
+        If ``switch_name`` is provided, ``callback`` is only called when the
+        first argument the signal is called with is a switch with that name.
+        """
         if not callable(callback):
             raise ValueError("Callback argument must be callable")
 
-        self.__callbacks.append(callback)
+        if switch_name is None:
+            self.__callbacks.append(callback)
+        else:
+            self.__by_switch_name.setdefault(switch_name, []).append(callback)
+
+        self.has_receivers = True
 
     def call(self, *args, **kwargs):
         for callback in self.__callbacks:
             callback(*args, **kwargs)
 
+        if self.__by_switch_name and args:
+            name = getattr(args[0], 'name', None)
+
+            for callback in self.__by_switch_name.get(name, ()):
+                callback(*args, **kwargs)
+
     def reset(self):
         self.__callbacks = []
+        self.__by_switch_name = {}
+
+        #: ``True`` once any callback is connected.  Callers on hot paths check
+        #: it to avoid building arguments for a signal nobody listens to.
+        self.has_receivers = False
 
 
 switch_registered = Signal()
@@ -23,3 +45,6 @@ switch_updated = Signal()
 condition_apply_error = Signal()
 switch_checked = Signal()
 switch_active = Signal()
+switches_registered = Signal()
+switches_updated = Signal()
+switches_unregistered = Signal()
@@ -0,0 +1,322 @@
+"""
+gutter.snapshot
+~~~~~~~~~~~~~~~
+
+Immutable, in-memory snapshots of every switch in a storage.  A ``Manager``
+given a ``SnapshotStore`` checks switches against its current snapshot only,
+so checks do no storage I/O or decoding, and a new snapshot is built and
+swapped in whole when refreshed, either by the manager or in the background
+by a ``SnapshotRefresher``.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import copy
+import os
+import threading
+import time
+
+
+def storage_version(storage):
+    """
+    Returns the storage's ``version()``, or failing that its ``last_updated()``,
+    or ``None`` if it has neither.
+    """
+    for name in ('version', 'last_updated'):
+        version = getattr(storage, name, None)
+
+        if callable(version):
+            return version()
+
+    return None
+
+
+class Snapshot(object):
+
+    """
+    A read-only mapping of storage keys to copies of the switches stored under
+    them, with the conditions of ``SELECTIVE`` switches indexed up front.
+
+    Switches handed out by a snapshot are shared by every thread reading it and
+    should not be changed in place.  Changes saved through a manager reach
+    the storage, and the manager's next snapshot.
+    """
+
+    def __init__(self, switches, version=None):
+        start = time.time()
+
+        self.__switches = {}
+
+        for key, switch in switches:
+            switch = copy.copy(switch)
+
+            # Conditions of other switches are never used, so they can stay
+            # deferred if they have not been decoded yet
+            if switch.state is switch.states.SELECTIVE:
+                switch.conditions.index
+
+            self.__switches[key] = switch
+
+        self.version = version
+        self.created_at = time.time()
+        self.build_seconds = self.created_at - start
+
+    @classmethod
+    def from_storage(cls, storage):
+        # Read the version first, so a change made while loading is not missed
+        version = storage_version(storage)
+        return cls(storage.items(), version=version)
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    def __getitem__(self, key):
+        return self.__switches[key]
+
+    def __contains__(self, key):
+        return key in self.__switches
+
+    def __iter__(self):
+        return iter(self.__switches)
+
+    def __len__(self):
+        return len(self.__switches)
+
+    def get(self, key, default=None):
+        return self.__switches.get(key, default)
+
+    def keys(self):
+        return self.__switches.keys()
+
+    def items(self):
+        return self.__switches.items()
+
+    def iteritems(self):
+        return self.__switches.iteritems()
+
+
+class SnapshotStore(object):
+
+    """
+    Holds the current ``Snapshot`` of a storage.  Reading ``current`` never
+    blocks: ``refresh`` builds the new snapshot before swapping it in, and only
+    concurrent refreshes wait for each other.
+
+    ``refreshes`` counts the snapshots built, ``refresh_seconds`` is how long
+    the last one took to build and ``age`` is how old the current one is.
+
+    ``invalidate`` marks the current snapshot ``stale``.  While a
+    ``SnapshotRefresher`` is started for the store, the refresher rebuilds it
+    in the background, and ``get`` makes sure the refresher is running in the
+    current process.  Otherwise ``get`` rebuilds a stale snapshot itself.
+    """
+
+    snapshot_class = Snapshot
+
+    def __init__(self):
+        self.current = None
+        self.stale = False
+        self.refresher = None
+        self.refreshes = 0
+        self.refresh_seconds = None
+        self.__lock = threading.Lock()
+
+    @property
+    def age(self):
+        return self.current.age if self.current is not None else None
+
+    def get(self, storage):
+        """
+        Returns the current snapshot, building the first one from ``storage``,
+        and rebuilding a stale one if no refresher will.
+        """
+        refresher = self.refresher
+
+        if refresher is not None:
+            refresher.ensure_running()
+
+        current = self.current
+
+        if current is None or self.stale and refresher is None:
+            return self.refresh(storage)
+
+        return current
+
+    def invalidate(self):
+        """
+        Marks the current snapshot stale, waking the refresher to rebuild it.
+        """
+        self.stale = True
+        refresher = self.refresher
+
+        if refresher is not None:
+            refresher.wake()
+
+    def refresh(self, storage):
+        """
+        Builds a new snapshot of ``storage``, makes it current and returns it.
+        """
+        with self.__lock:
+            # Cleared before reading the storage, so changes made while
+            # building mark the new snapshot stale
+            self.stale = False
+            snapshot = self.build(storage)
+
+            self.current = snapshot
+            self.refreshes += 1
+            self.refresh_seconds = snapshot.build_seconds
+
+        return snapshot
+
+    def build(self, storage):
+        """
+        Returns a new snapshot of ``storage``.
+        """
+        return self.snapshot_class.from_storage(storage)
+
+    def after_fork(self):
+        """
+        Replaces the refresh lock, which a thread that does not exist in a
+        forked child process may have been holding.
+        """
+        self.__lock = threading.Lock()
+
+
+class SnapshotRefresher(object):
+
+    """
+    A daemon thread which polls ``storage`` every ``interval`` seconds, and
+    refreshes ``store`` when the storage's ``last_updated()`` version differs
+    from the current snapshot's or the store is ``stale``.  Storages without a
+    version are refreshed on every poll.  Invalidating the store wakes the
+    thread to poll straight away.
+
+    The refresher is restarted in a forked child process the first time the
+    store is used there, so it can be started before a prefork server forks
+    its workers.
+
+    ``polls``, ``refreshes`` and ``errors`` count the polls made, the snapshots
+    they built and the polls which raised an exception, the last of which is
+    kept in ``last_error``.  ``last_success`` is the time of the last poll
+    which did not raise, and ``refresh_seconds`` is how long the last refresh
+    took.
+    """
+
+    def __init__(self, store, storage, interval=5.0):
+        self.store = store
+        self.storage = storage
+        self.interval = interval
+        self.polls = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_success = None
+        self.refresh_seconds = None
+        self.__thread = None
+        self.__pid = None
+        self.__stopped = threading.Event()
+        self.__woken = threading.Event()
+
+    @property
+    def running(self):
+        return (
+            self.__thread is not None
+            and self.__thread.is_alive()
+            and self.__pid == os.getpid()
+        )
+
+    def start(self):
+        """
+        Starts polling in a daemon thread, if not already running.
+        """
+        self.store.refresher = self
+
+        if self.__pid is not None and self.__pid != os.getpid():
+            self.__stopped = threading.Event()
+            self.__woken = threading.Event()
+            self.store.after_fork()
+        elif self.running:
+            return
+
+        self.__stopped.clear()
+        self.__pid = os.getpid()
+        self.__thread = threading.Thread(
+            target=self.__run,
+            name='gutter-snapshot-refresher'
+        )
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops polling, waiting up to ``timeout`` seconds for the thread to
+        finish.
+        """
+        if self.store.refresher is self:
+            self.store.refresher = None
+
+        self.__stopped.set()
+        self.__woken.set()
+
+        if self.running and self.__thread is not threading.current_thread():
+            self.__thread.join(timeout)
+
+    def wake(self):
+        """
+        Makes the thread poll now rather than at the end of its interval.
+        """
+        self.__woken.set()
+
+    def ensure_running(self):
+        """
+        Restarts the thread if the refresher was started in another process.
+        """
+        if self.__pid != os.getpid():
+            self.start()
+
+    def poll(self):
+        """
+        Refreshes the store if the storage changed.  Returns if it was
+        refreshed, or ``None`` if polling raised an exception.
+        """
+        self.polls += 1
+
+        try:
+            current = self.store.current
+            version = storage_version(self.storage)
+            changed = (
+                current is None
+                or self.store.stale
+                or version is None
+                or version != current.version
+            )
+
+            if changed:
+                start = time.time()
+                self.store.refresh(self.storage)
+                self.refresh_seconds = time.time() - start
+                self.refreshes += 1
+        except Exception as error:
+            self.errors += 1
+            self.last_error = error
+            return None
+
+        self.last_success = time.time()
+        return changed
+
+    def __run(self):
+        stopped, woken = self.__stopped, self.__woken
+
+        while True:
+            woken.wait(self.interval)
+            woken.clear()
+
+            if stopped.is_set():
+                return
+
+            self.poll()
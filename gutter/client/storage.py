@@ -0,0 +1,465 @@
+"""
+gutter.storage
+~~~~~~~~~~~~~~
+
+Storage adapters implementing the optional extended storage protocol, which a
+``Manager`` uses in place of key by key reads, writes and scans whenever its
+``storage`` has the methods for them:
+
+``get_many(keys)``
+    Returns a dict of each of ``keys`` in the storage to its value.  Keys not
+    in the storage are left out.
+
+``set_many(items)``
+    Writes every key and value in the ``items`` dict, or none of them if any
+    write fails.
+
+``delete_many(keys)``
+    Deletes each of ``keys``, or none of them if any delete fails.  Keys not
+    in the storage are ignored.
+
+``scan_prefix(prefix)``
+    Returns a sorted list of the keys in the storage which start with
+    ``prefix``.
+
+``version()``
+    Returns a number which increases every time the storage changes.  It is
+    used in place of durabledict's ``last_updated()``.
+
+Storages may implement any of these, and a ``Manager`` falls back to the plain
+mapping methods for the rest.  A ``Manager`` leaves rolling back failed batches
+to ``set_many`` and ``delete_many``, so they must undo any writes they made
+before raising.
+
+``SQLiteStorage`` is a storage engine implementing the whole protocol on top
+of a local SQLite database, for sharing switches between processes on one
+host without running a separate service.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+from __future__ import absolute_import
+
+# Standard Library
+import collections
+from contextlib import contextmanager
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+
+# External Libraries
+from durabledict import MemoryDict
+
+from gutter.client.encoding import SchemaEncoding
+from gutter.client.index import KeyIndex
+
+
+#: Stands in for the previous value of keys which were not in a storage
+MISSING = object()
+
+
+class DictStorage(dict):
+
+    """
+    A ``dict`` implementing the extended storage protocol.  Its ``version``
+    increases on every change, and ``scan_prefix`` looks keys up in a sorted
+    index kept up to date as keys are set and deleted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__versions = itertools.count(1)
+        self.__version = next(self.__versions)
+        self.__index = KeyIndex()
+        super(DictStorage, self).__init__(*args, **kwargs)
+
+    def version(self):
+        return self.__version
+
+    def get_many(self, keys):
+        missing = object()
+        values = ((key, self.get(key, missing)) for key in keys)
+
+        return dict((key, value) for key, value in values if value is not missing)
+
+    def set_many(self, items):
+        written = []
+
+        try:
+            for key, value in items.items():
+                previous = self.get(key, MISSING)
+                self[key] = value
+                written.append((key, previous))
+        except Exception:
+            error = sys.exc_info()
+            self.__restore(written)
+            raise error[0], error[1], error[2]
+
+    def delete_many(self, keys):
+        deleted = []
+
+        try:
+            for key in keys:
+                if key in self:
+                    previous = self[key]
+                    del self[key]
+                    deleted.append((key, previous))
+        except Exception:
+            error = sys.exc_info()
+            self.__restore(deleted)
+            raise error[0], error[1], error[2]
+
+    def scan_prefix(self, prefix):
+        return self.__index.prefixed(self, prefix)
+
+    def __setitem__(self, key, value):
+        previous = self.__version
+        super(DictStorage, self).__setitem__(key, value)
+        self.__changed()
+        self.__index.add(self, key, previous)
+
+    def __delitem__(self, key):
+        previous = self.__version
+        super(DictStorage, self).__delitem__(key)
+        self.__changed()
+        self.__index.discard(self, key, previous)
+
+    # Other changes only bump the version, which rebuilds the index when next
+    # used
+
+    def clear(self):
+        super(DictStorage, self).clear()
+        self.__changed()
+
+    def pop(self, *args):
+        value = super(DictStorage, self).pop(*args)
+        self.__changed()
+        return value
+
+    def popitem(self):
+        item = super(DictStorage, self).popitem()
+        self.__changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super(DictStorage, self).setdefault(key, default)
+        self.__changed()
+        return value
+
+    def update(self, *args, **kwargs):
+        super(DictStorage, self).update(*args, **kwargs)
+        self.__changed()
+
+    def __changed(self):
+        self.__version = next(self.__versions)
+
+    def __restore(self, items):
+        """
+        Puts back the ``(key, previous value)`` pairs in ``items``, most recent
+        first, deleting keys which were not in the dict before.
+        """
+        for key, previous in reversed(items):
+            if previous is MISSING:
+                self.pop(key, None)
+            else:
+                self[key] = previous
+
+
+class MemoryDictStorage(MemoryDict):
+
+    """
+    A durabledict ``MemoryDict`` implementing the extended storage protocol.
+
+    ``MemoryDict`` reloads everything it holds after every write, so
+    ``set_many`` and ``delete_many`` write every key before reloading once.
+    If a write fails, the keys already written are put back first.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__index = KeyIndex()
+        super(MemoryDictStorage, self).__init__(*args, **kwargs)
+
+    def version(self):
+        return self.last_updated()
+
+    def get_many(self, keys):
+        missing = object()
+        values = ((key, self.get(key, missing)) for key in keys)
+
+        return dict((key, value) for key, value in values if value is not missing)
+
+    def set_many(self, items):
+        # Reading a key reloads after any write, so read them all first
+        previous = dict((key, self.get(key, MISSING)) for key in items)
+        written = []
+
+        try:
+            for key, value in items.items():
+                self.persist(key, value)
+                written.append((key, previous[key]))
+        except Exception:
+            error = sys.exc_info()
+            self.__restore(written)
+            raise error[0], error[1], error[2]
+
+        self.sync()
+
+    def delete_many(self, keys):
+        # Checking for a key reloads after any write, so check them all first
+        previous = [(key, self[key]) for key in keys if key in self]
+        deleted = []
+
+        try:
+            for key, value in previous:
+                self.depersist(key)
+                deleted.append((key, value))
+        except Exception:
+            error = sys.exc_info()
+            self.__restore(deleted)
+            raise error[0], error[1], error[2]
+
+        self.sync()
+
+    def scan_prefix(self, prefix):
+        return self.__index.prefixed(self, prefix)
+
+    def persist(self, key, val):
+        previous = self.last_updated()
+        super(MemoryDictStorage, self).persist(key, val)
+        self.__index.add(self, key, previous)
+
+    def depersist(self, key):
+        previous = self.last_updated()
+        super(MemoryDictStorage, self).depersist(key)
+        self.__index.discard(self, key, previous)
+
+    def __restore(self, items):
+        """
+        Puts back the ``(key, previous value)`` pairs in ``items``, most recent
+        first, and reloads the dict.
+        """
+        try:
+            for key, previous in reversed(items):
+                if previous is MISSING:
+                    self.depersist(key)
+                else:
+                    self.persist(key, previous)
+        finally:
+            self.sync()
+
+
+class SQLiteStorage(collections.MutableMapping):
+
+    """
+    Stores switches in the SQLite database at ``path``, encoded with
+    ``encoding``, implementing the whole extended storage protocol.
+
+    The database runs in WAL mode, so any number of processes can read from
+    it while one writes.  Each thread, and each process after a fork, opens
+    its own connection, and writers wait up to ``timeout`` seconds for each
+    other.
+
+    Every write is one transaction, which bumps the database's ``version()``
+    and stamps the rows it wrote with the new version.  Keys are the primary
+    key, so ``scan_prefix``, and with it listing a namespace and finding the
+    children of a switch, is a range query on its index, and the version
+    column is indexed for ``changed_since``.  Deleted keys are kept, without a
+    value, so ``changed_since`` can report them.
+    """
+
+    def __init__(self, path, encoding=SchemaEncoding, timeout=30.0):
+        self.path = path
+        self.encoding = encoding
+        self.timeout = timeout
+        self.__local = threading.local()
+
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS gutter_switches (
+                key TEXT PRIMARY KEY NOT NULL,
+                value TEXT,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS gutter_switches_version
+                ON gutter_switches (version);
+            CREATE TABLE IF NOT EXISTS gutter_version (
+                version INTEGER NOT NULL
+            );
+            INSERT INTO gutter_version (version)
+                SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM gutter_version);
+        ''')
+
+    @property
+    def connection(self):
+        """
+        The connection for the current thread, opened when first used by the
+        thread or by the current process.
+        """
+        local = self.__local
+
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None
+            )
+            connection.text_factory = sqlite3.OptimizedUnicode
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+
+            local.connection = connection
+            local.pid = os.getpid()
+
+        return local.connection
+
+    def version(self):
+        return self.__query('SELECT version FROM gutter_version')[0][0]
+
+    def changed_since(self, version):
+        """
+        Returns a dict of every key written or deleted after ``version`` to its
+        current value, or to ``None`` if it was deleted.
+        """
+        rows = self.__query(
+            'SELECT key, value FROM gutter_switches WHERE version > ?',
+            (version,)
+        )
+
+        return dict((decode_key(key), self.__decode(value)) for key, value in rows)
+
+    def get_many(self, keys):
+        # Found keys are returned as they were asked for
+        keys = dict((encode_key(key), key) for key in keys)
+        encoded = keys.keys()
+        found = {}
+
+        # SQLite allows at most 999 parameters per statement
+        for start in range(0, len(encoded), 500):
+            chunk = encoded[start:start + 500]
+            found.update(self.__query(
+                'SELECT key, value FROM gutter_switches '
+                'WHERE value IS NOT NULL AND key IN (%s)' % ','.join('?' * len(chunk)),
+                chunk
+            ))
+
+        return dict((keys[key], self.encoding.decode(value)) for key, value in found.items())
+
+    def set_many(self, items):
+        rows = [(encode_key(key), self.encoding.encode(value)) for key, value in items.items()]
+
+        with self.__writing() as (connection, version):
+            connection.executemany(
+                'INSERT OR REPLACE INTO gutter_switches (key, value, version) '
+                'VALUES (?, ?, %d)' % version,
+                rows
+            )
+
+    def delete_many(self, keys):
+        with self.__writing() as (connection, version):
+            return connection.executemany(
+                'UPDATE gutter_switches SET value = NULL, version = %d '
+                'WHERE key = ? AND value IS NOT NULL' % version,
+                [(encode_key(key),) for key in keys]
+            ).rowcount
+
+    def scan_prefix(self, prefix):
+        prefix = encode_key(prefix)
+
+        # SQLite compares text as UTF-8 bytes, so every key starting with
+        # ``prefix`` sorts before it followed by the highest code point
+        rows = self.__query(
+            'SELECT key FROM gutter_switches '
+            'WHERE key >= ? AND key < ? AND value IS NOT NULL ORDER BY key',
+            (prefix, prefix + u'\U0010ffff')
+        )
+
+        return [decode_key(key) for key, in rows]
+
+    def keys(self):
+        return self.scan_prefix('')
+
+    def iteritems(self):
+        rows = self.__query(
+            'SELECT key, value FROM gutter_switches '
+            'WHERE value IS NOT NULL ORDER BY key'
+        )
+
+        for key, value in rows:
+            yield decode_key(key), self.encoding.decode(value)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def __getitem__(self, key):
+        rows = self.__query(
+            'SELECT value FROM gutter_switches WHERE key = ? AND value IS NOT NULL',
+            (encode_key(key),)
+        )
+
+        if not rows:
+            raise KeyError(key)
+
+        return self.encoding.decode(rows[0][0])
+
+    def __setitem__(self, key, value):
+        self.set_many({key: value})
+
+    def __delitem__(self, key):
+        if not self.delete_many([key]):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return bool(self.__query(
+            'SELECT 1 FROM gutter_switches WHERE key = ? AND value IS NOT NULL',
+            (encode_key(key),)
+        ))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.__query(
+            'SELECT COUNT(*) FROM gutter_switches WHERE value IS NOT NULL'
+        )[0][0]
+
+    def __query(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def __decode(self, value):
+        return None if value is None else self.encoding.decode(value)
+
+    @contextmanager
+    def __writing(self):
+        """
+        Runs the ``with`` block in a write transaction, yielding the connection
+        and the version the transaction bumps the database to.
+        """
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+
+        try:
+            connection.execute('UPDATE gutter_version SET version = version + 1')
+            version = connection.execute('SELECT version FROM gutter_version').fetchone()[0]
+            yield connection, version
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        connection.execute('COMMIT')
+
+
+def encode_key(key):
+    """
+    Returns ``key`` as ``unicode`` if it is a UTF-8 encoded ``str``.
+    """
+    return key.decode('utf-8') if isinstance(key, str) else key
+
+
+def decode_key(key):
+    """
+    Returns a key read back from the database as a UTF-8 encoded ``str``, as
+    a ``Manager`` builds its keys.  ``sqlite3.OptimizedUnicode`` reads
+    non-ASCII text as ``unicode``.
+    """
+    return key.encode('utf-8') if isinstance(key, unicode) else key
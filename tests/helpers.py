@@ -0,0 +1,27 @@
+"""
+tests.helpers
+~~~~~~~~~~~~~
+
+Storages and other helpers shared by the tests.
+
+:copyright: (c) 2010-2012 DISQUS.
+:license: Apache License 2.0, see LICENSE for more details.
+"""
+
+
+class CountingDict(dict):
+
+    """
+    A dict storage which counts its item ``reads``, and records the keys
+    read in ``gets``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(CountingDict, self).__init__(*args, **kwargs)
+        self.reads = 0
+        self.gets = []
+
+    def __getitem__(self, key):
+        self.reads += 1
+        self.gets.append(key)
+        return super(CountingDict, self).__getitem__(key)
@@ -13,6 +13,7 @@ class MyArguments(Container):
     variable1 = arguments.Value(lambda self: self.input)
     opposite_variable1 = arguments.Value(lambda self: not self.input)
     str_variable = arguments.String('prop')
+    bool_variable = arguments.Boolean('prop', hash_value='id')
 
 
 class TestBase(unittest2.TestCase):
@@ -42,7 +43,8 @@ class TestBase(unittest2.TestCase):
             dict(
                 variable1=MyArguments.variable1,
                 opposite_variable1=MyArguments.opposite_variable1,
-                str_variable=MyArguments.str_variable
+                str_variable=MyArguments.str_variable,
+                bool_variable=MyArguments.bool_variable
             )
         )
 
@@ -52,6 +54,11 @@ class TestBase(unittest2.TestCase):
     def test_can_use_string_as_argument(self):
         eq_(self.subclass_str_arg.str_variable, 45)
 
+    def test_hash_value_getter_is_passed_to_variable(self):
+        variable = self.subclass_str_arg.bool_variable
+        eq_(variable.hash_value, self.subclass_str_arg.input.id)
+        eq_(variable.value, 45)
+
     def test_str_is_argument_container_plus_argument_name(self):
         eq_(str(MyArguments.variable1), 'MyArguments.variable1')
 
@@ -109,6 +116,13 @@ class ValueTest(BaseVariableTest, DelegateToValue, unittest2.TestCase):
         variable = 'hello'
         eq_(Value.to_python(variable), variable)
 
+    def test_stable_hash_is_of_its_value_and_computed_once(self):
+        variable = Value('marv')
+        eq_(variable.stable_hash, String('marv').stable_hash)
+
+        variable.value = 'jeff'
+        eq_(variable.stable_hash, String('marv').stable_hash)
+
 
 class BooleanTest(BaseVariableTest, DelegateToValue, unittest2.TestCase):
 
@@ -128,6 +142,14 @@ class BooleanTest(BaseVariableTest, DelegateToValue, unittest2.TestCase):
 
         assert_not_equals(hash(boolean), hash(Boolean(True)))
 
+    def test_random_hash_value_is_kept(self):
+        boolean = Boolean(True)
+        eq_(hash(boolean), hash(boolean))
+
+    def test_stable_hash_is_of_its_hash_value(self):
+        eq_(Boolean(True, hash_value=42).stable_hash, Value(42).stable_hash)
+        eq_(Boolean(True, hash_value=42).stable_hash, Boolean(False, hash_value='42').stable_hash)
+
     def test_hash(self):
         # skip this test for boolean
         pass
@@ -0,0 +1,94 @@
+import os
+import subprocess
+import sys
+import unittest2
+from collections import Counter
+
+from nose.tools import *  # noqa
+
+import gutter
+from gutter.client import bucketing
+from gutter.client.arguments.variables import Boolean, String, Value
+
+
+class TestCanonical(unittest2.TestCase):
+
+    def test_equal_values_have_the_same_form(self):
+        eq_(bucketing.canonical('caf'), bucketing.canonical(u'caf'))
+        eq_(bucketing.canonical(u'caf\xe9'), 'caf\xc3\xa9')
+        eq_(bucketing.canonical(True), bucketing.canonical(1))
+        eq_(bucketing.canonical(5.0), bucketing.canonical(5))
+        eq_(bucketing.canonical(10 ** 20), bucketing.canonical(10L ** 20))
+
+    def test_numbers_have_the_form_of_their_digits(self):
+        eq_(bucketing.canonical(1234), '1234')
+        eq_(bucketing.canonical(-2.5), '-2.5')
+
+    def test_raises_type_error_for_other_types(self):
+        assert_raises(TypeError, bucketing.canonical, object())
+        assert_raises(TypeError, bucketing.canonical, (1, 2))
+
+
+class TestStableHash(unittest2.TestCase):
+
+    def test_is_the_crc32_of_the_canonical_form(self):
+        eq_(bucketing.stable_hash('gutter'), 0x8425894b)
+        eq_(bucketing.stable_hash(u'gutter'), 0x8425894b)
+
+    def test_is_the_same_in_every_process(self):
+        script = 'from gutter.client import bucketing; print bucketing.stable_hash("jeff")'
+        root = os.path.dirname(os.path.dirname(os.path.abspath(gutter.__file__)))
+
+        # -R randomizes hash() in each process
+        hashes = set(
+            subprocess.check_output([sys.executable, '-R', '-c', script], cwd=root).strip()
+            for _ in range(3)
+        )
+
+        eq_(hashes, set([str(bucketing.stable_hash('jeff'))]))
+
+    def test_hashes_variables_by_their_stable_hash(self):
+        eq_(bucketing.stable_hash(Value(42)), bucketing.stable_hash(42))
+        eq_(bucketing.stable_hash(String('42')), bucketing.stable_hash(42))
+        eq_(
+            bucketing.stable_hash(Boolean(True, hash_value='user:1')),
+            bucketing.stable_hash('user:1')
+        )
+
+    def test_raises_type_error_for_values_without_a_stable_form(self):
+        assert_raises(TypeError, bucketing.stable_hash, object())
+        assert_raises(TypeError, bucketing.stable_hash, Value(object()))
+
+
+class TestBucket(unittest2.TestCase):
+
+    def buckets(self, salt, number=100000):
+        salt_hash = bucketing.stable_hash(salt)
+
+        return [
+            bucketing.bucket(bucketing.stable_hash(value), salt_hash)
+            for value in range(number)
+        ]
+
+    def test_is_between_zero_and_the_number_of_buckets(self):
+        buckets = self.buckets('switch')
+
+        ok_(min(buckets) >= 0)
+        ok_(max(buckets) < bucketing.BUCKETS)
+
+    def test_spreads_sequential_values_evenly(self):
+        tenths = Counter(bucket * 10 // bucketing.BUCKETS for bucket in self.buckets('switch'))
+
+        eq_(len(tenths), 10)
+
+        for count in tenths.values():
+            self.assertAlmostEqual(count, 10000, delta=500)
+
+    def test_salts_bucket_values_independently(self):
+        first = self.buckets('first switch')
+        second = self.buckets('second switch')
+        tenth = bucketing.BUCKETS // 10
+
+        in_both = sum(1 for a, b in zip(first, second) if a < tenth and b < tenth)
+
+        self.assertAlmostEqual(in_both, 1000, delta=200)
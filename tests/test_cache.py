@@ -0,0 +1,197 @@
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from durabledict import MemoryDict
+from exam.decorators import fixture
+from exam.cases import Exam
+
+from gutter.client.cache import SwitchCache
+from gutter.client.models import Switch, Manager
+
+from tests.helpers import CountingDict
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSwitchCache(Exam, unittest2.TestCase):
+
+    @fixture
+    def clock(self):
+        return Clock()
+
+    @fixture
+    def cache(self):
+        return SwitchCache(maxsize=2, ttl=10, timer=self.clock)
+
+    @fixture
+    def load(self):
+        return mock.Mock(side_effect=lambda key: 'switch %s' % key)
+
+    def test_loads_missing_keys_then_serves_them_from_cache(self):
+        eq_(self.cache.get('a', self.load), 'switch a')
+        eq_(self.cache.get('a', self.load), 'switch a')
+
+        self.load.assert_called_once_with('a')
+        eq_((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used_entries(self):
+        self.cache.get('a', self.load)
+        self.cache.get('b', self.load)
+        self.cache.get('a', self.load)
+        self.cache.get('c', self.load)
+
+        ok_('a' in self.cache)
+        ok_('b' not in self.cache)
+        eq_(len(self.cache), 2)
+        eq_(self.cache.evictions, 1)
+
+    def test_reloads_entries_older_than_ttl(self):
+        self.cache.get('a', self.load)
+        self.clock.now = 9
+        self.cache.get('a', self.load)
+        eq_(self.load.call_count, 1)
+
+        self.clock.now = 10
+        self.cache.get('a', self.load)
+        eq_(self.load.call_count, 2)
+        eq_(self.cache.stale, 1)
+
+    def test_entries_never_expire_without_ttl(self):
+        cache = SwitchCache(timer=self.clock)
+        cache.get('a', self.load)
+        self.clock.now = 10 ** 9
+        cache.get('a', self.load)
+        eq_(self.load.call_count, 1)
+
+    def test_version_change_drops_every_entry(self):
+        self.cache.get('a', self.load, version=1)
+        self.cache.get('b', self.load, version=1)
+        self.cache.get('a', self.load, version=2)
+
+        eq_(self.load.call_count, 3)
+        eq_(self.cache.stale, 2)
+        ok_('b' not in self.cache)
+
+    def test_version_function_is_called_once_per_check_interval(self):
+        version = mock.Mock(return_value=1)
+
+        for _ in range(3):
+            self.cache.get('a', self.load, version=version)
+
+        eq_(version.call_count, 1)
+
+        version.return_value = 2
+        self.clock.now = 0.5
+        self.cache.get('a', self.load, version=version)
+        eq_(self.load.call_count, 1)
+
+        self.clock.now = 1
+        self.cache.get('a', self.load, version=version)
+        eq_(version.call_count, 2)
+        eq_(self.load.call_count, 2)
+
+    def test_version_function_is_called_every_time_without_check_interval(self):
+        cache = SwitchCache(check_interval=0, timer=self.clock)
+        version = mock.Mock(return_value=1)
+
+        for _ in range(3):
+            cache.get('a', self.load, version=version)
+
+        eq_(version.call_count, 3)
+
+    def test_invalidate_drops_one_or_all_entries(self):
+        self.cache.get('a', self.load)
+        self.cache.get('b', self.load)
+
+        self.cache.invalidate('a')
+        ok_('a' not in self.cache)
+        ok_('b' in self.cache)
+
+        self.cache.invalidate()
+        eq_(len(self.cache), 0)
+
+    def test_errors_from_load_are_not_cached(self):
+        load = mock.Mock(side_effect=[KeyError('a'), 'switch a'])
+
+        assert_raises(KeyError, self.cache.get, 'a', load)
+        eq_(self.cache.get('a', load), 'switch a')
+
+
+class TestManagerWithSwitchCache(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        return CountingDict()
+
+    @fixture
+    def manager(self):
+        return Manager(storage=self.storage, switch_cache=SwitchCache())
+
+    def test_switch_cache_defaults_to_none(self):
+        ok_(Manager(storage=dict()).switch_cache is None)
+
+    def test_namespaced_managers_share_switch_cache(self):
+        ok_(self.manager.namespaced('ns').switch_cache is self.manager.switch_cache)
+
+    def test_active_reads_storage_once_per_switch(self):
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+
+        for _ in range(3):
+            ok_(self.manager.active('foo') is True)
+
+        eq_(self.storage.reads, 1)
+
+    def test_updates_are_seen_immediately(self):
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+        ok_(self.manager.active('foo') is True)
+
+        self.manager.update(Switch('foo', state=Switch.states.DISABLED))
+        ok_(self.manager.active('foo') is False)
+
+    def test_unregistered_switches_are_dropped(self):
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+        self.manager.active('foo')
+
+        self.manager.unregister('foo')
+        assert_raises(ValueError, self.manager.active, 'foo')
+
+    def test_storage_changes_by_others_are_seen_through_last_updated(self):
+        clock = Clock()
+        storage = MemoryDict()
+        manager = Manager(storage=storage, switch_cache=SwitchCache(timer=clock))
+        manager.register(Switch('foo', state=Switch.states.GLOBAL))
+        ok_(manager.active('foo') is True)
+
+        Manager(storage=storage).update(Switch('foo', state=Switch.states.DISABLED))
+        ok_(manager.active('foo') is True)
+
+        clock.now = manager.switch_cache.check_interval
+        ok_(manager.active('foo') is False)
+        eq_(manager.switch_cache.stale, 1)
+
+    def test_storage_version_is_read_once_per_check_interval(self):
+        self.storage.version = mock.Mock(return_value=1)
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+
+        for _ in range(10):
+            ok_(self.manager.active('foo') is True)
+
+        eq_(self.storage.version.call_count, 1)
+
+    def test_autocreated_switches_are_cached(self):
+        self.manager.autocreate = True
+
+        for _ in range(3):
+            ok_(self.manager.active('foo') is False)
+
+        eq_(self.storage.reads, 2)
+        eq_(self.manager.switch_cache.hits, 1)
@@ -0,0 +1,258 @@
+import copy
+import itertools
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from exam.decorators import around, fixture
+from exam.cases import Exam
+
+from gutter.client import arguments
+from gutter.client import compiler
+from gutter.client.compiler import compiled, compile_switch
+from gutter.client.encoding import JsonPickleEncoding, SchemaEncoding
+from gutter.client.models import Switch, Condition, Manager
+from gutter.client.operators import Base
+from gutter.client.operators.comparable import Equals, MoreThan, LessThan
+from gutter.client.operators.identity import Truthy
+from gutter.client.storage import SQLiteStorage
+
+
+class User(object):
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+
+class Admin(User):
+    pass
+
+
+class UserArguments(arguments.Container):
+    COMPATIBLE_TYPE = User
+
+    name = arguments.String(lambda self: self.input.name)
+    age = arguments.Value(lambda self: self.input.age)
+
+
+class IntegerArguments(arguments.Container):
+    COMPATIBLE_TYPE = int
+
+    value = arguments.Value(lambda self: self.input)
+
+
+class Explodes(Base):
+    name = 'explodes'
+
+    def applies_to(self, argument):
+        raise ValueError('boom')
+
+
+CONDITIONS = [
+    Condition(UserArguments, 'age', MoreThan(lower_limit=20)),
+    Condition(UserArguments, 'age', LessThan(upper_limit=15), negative=True),
+    Condition(UserArguments, 'name', Equals(value='jeff')),
+    Condition(UserArguments, 'name', Truthy(), negative=True),
+    Condition(UserArguments, 'age', Explodes()),
+    Condition(UserArguments, 'age', Explodes(), negative=True),
+    Condition(IntegerArguments, 'value', Equals(value=42)),
+]
+
+INPUTS = [
+    User('jeff', 21),
+    User('frank', 10),
+    User('', 16),
+    Admin('bill', 70),
+    42,
+    7,
+    'a string',
+    Manager.NONE_INPUT,
+]
+
+
+class TestCompiledSwitchEquivalence(Exam, unittest2.TestCase):
+
+    def switches(self):
+        states = (
+            Switch.states.DISABLED,
+            Switch.states.SELECTIVE,
+            Switch.states.GLOBAL
+        )
+
+        for state, compounded in itertools.product(states, (True, False)):
+            for size in range(0, 3):
+                for conditions in itertools.combinations(CONDITIONS, size):
+                    switch = Switch('switch', state=state, compounded=compounded)
+                    switch.conditions.extend(conditions)
+                    yield switch
+
+    def input_sets(self):
+        for size in range(0, 3):
+            for inputs in itertools.permutations(INPUTS, size):
+                yield inputs
+
+    @around
+    def patch_signals(self):
+        with mock.patch('gutter.client.signals.switch_checked') as checked:
+            with mock.patch('gutter.client.signals.switch_active') as active:
+                with mock.patch('gutter.client.signals.condition_apply_error') as error:
+                    self.signals = (checked, active, error)
+                    yield
+
+    def signal_calls(self, function, *inputs):
+        for signal in self.signals:
+            signal.reset_mock()
+
+        result = function(*inputs)
+        checked, active, error = self.signals
+
+        return result, (
+            checked.call.call_args_list,
+            active.call.call_args_list,
+            error.call.call_count
+        )
+
+    def test_compiled_switch_matches_enabled_for_all(self):
+        for switch in self.switches():
+            function = compile_switch(switch)
+
+            for inputs in self.input_sets():
+                expected = self.signal_calls(switch.enabled_for_all, *inputs)
+                actual = self.signal_calls(function, *inputs)
+
+                eq_(actual, expected, '%r with %r' % (switch, inputs))
+
+
+class TestCompiledCache(unittest2.TestCase):
+
+    def setUp(self):
+        compiler.COMPILED_CODE.invalidate()
+
+    @fixture
+    def switch(self):
+        switch = Switch('foo', state=Switch.states.SELECTIVE)
+        switch.conditions.append(copy.deepcopy(CONDITIONS[0]))
+        return switch
+
+    def test_compiled_function_is_cached(self):
+        ok_(compiled(self.switch) is compiled(self.switch))
+
+    def test_recompiles_when_state_changes(self):
+        function = compiled(self.switch)
+        self.switch.state = Switch.states.GLOBAL
+        ok_(compiled(self.switch) is not function)
+        ok_(compiled(self.switch)(INPUTS[1]) is True)
+
+    def test_recompiles_when_compounded_changes(self):
+        function = compiled(self.switch)
+        self.switch.compounded = True
+        ok_(compiled(self.switch) is not function)
+
+    def test_recompiles_when_conditions_change(self):
+        function = compiled(self.switch)
+        ok_(function(INPUTS[1]) is False)
+
+        self.switch.conditions.append(CONDITIONS[1])
+        ok_(compiled(self.switch) is not function)
+        ok_(compiled(self.switch)(INPUTS[1]) is False)
+
+        self.switch.conditions.append(CONDITIONS[3])
+        ok_(compiled(self.switch)(INPUTS[2]) is True)
+
+    def test_recompiles_conditions_changed_in_place_after_invalidate(self):
+        function = compiled(self.switch)
+        ok_(function(INPUTS[0]) is True)
+
+        self.switch.conditions[0].operator.lower_limit = 30
+        self.switch.invalidate()
+
+        ok_(compiled(self.switch) is not function)
+        ok_(compiled(self.switch)(INPUTS[0]) is False)
+
+    def test_copies_of_a_switch_share_compiled_code(self):
+        copies = [copy.deepcopy(self.switch) for _ in range(3)]
+
+        with mock.patch(
+            'gutter.client.compiler.compile_binding',
+            wraps=compiler.compile_binding
+        ) as compile_binding:
+            functions = [compiled(switch) for switch in copies]
+
+        eq_(compile_binding.call_count, 1)
+        ok_(all(function(INPUTS[0]) is True for function in functions))
+
+    def test_copies_of_a_switch_send_signals_for_themselves(self):
+        copies = [copy.deepcopy(self.switch) for _ in range(2)]
+
+        with mock.patch('gutter.client.signals.switch_checked') as checked:
+            for switch in copies:
+                compiled(switch)(INPUTS[0])
+
+        eq_(checked.call.call_args_list, [mock.call(switch) for switch in copies])
+        ok_(checked.call.call_args_list[0][0][0] is copies[0])
+        ok_(checked.call.call_args_list[1][0][0] is copies[1])
+
+    def test_changing_a_switch_in_place_does_not_change_its_copies(self):
+        original = copy.deepcopy(self.switch)
+        ok_(compiled(self.switch)(INPUTS[0]) is True)
+
+        self.switch.conditions[0].operator.lower_limit = 30
+        self.switch.invalidate()
+
+        ok_(compiled(self.switch)(INPUTS[0]) is False)
+        ok_(compiled(original)(INPUTS[0]) is True)
+
+    def test_decoded_switches_are_compiled_once(self):
+        storage = SQLiteStorage(':memory:', encoding=JsonPickleEncoding)
+        manager = Manager(storage=storage, compiled=True)
+        manager.register(self.switch)
+
+        with mock.patch(
+            'gutter.client.compiler.compile_binding',
+            wraps=compiler.compile_binding
+        ) as compile_binding:
+            for _ in range(20):
+                ok_(manager.active('foo', INPUTS[0]) is True)
+
+        eq_(compile_binding.call_count, 1)
+
+    def test_static_switches_do_not_decode_deferred_conditions(self):
+        self.switch.state = Switch.states.GLOBAL
+        decoded = SchemaEncoding.decode(SchemaEncoding.encode(self.switch))
+
+        ok_(compiled(decoded)(INPUTS[1]) is True)
+        ok_(decoded.conditions_deferred)
+
+    def test_handles_attributes_which_are_not_identifiers(self):
+        class Odd(arguments.Container):
+            COMPATIBLE_TYPE = User
+
+        setattr(Odd, 'the age', arguments.Value(lambda self: self.input.age))
+
+        self.switch.conditions = [Condition(Odd, 'the age', MoreThan(lower_limit=20))]
+        ok_(compiled(self.switch)(INPUTS[0]) is True)
+        ok_(compiled(self.switch)(INPUTS[1]) is False)
+
+
+class TestCompiledManager(unittest2.TestCase):
+
+    @fixture
+    def manager(self):
+        return Manager(storage=dict(), compiled=True)
+
+    def test_compiled_defaults_to_false(self):
+        eq_(Manager(storage=dict()).compiled, False)
+
+    def test_namespaced_managers_inherit_compiled(self):
+        ok_(self.manager.namespaced('ns').compiled is True)
+
+    def test_active_uses_compiled_function(self):
+        switch = Switch('foo', state=Switch.states.SELECTIVE)
+        switch.conditions.append(CONDITIONS[0])
+        self.manager.register(switch)
+
+        with mock.patch.object(Switch, 'enabled_for_all') as enabled_for_all:
+            ok_(self.manager.active('foo', INPUTS[0]) is True)
+            ok_(self.manager.active('foo', INPUTS[1]) is False)
+            eq_(enabled_for_all.called, False)
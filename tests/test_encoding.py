@@ -0,0 +1,336 @@
+import copy
+import pickle
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from durabledict import MemoryDict
+from durabledict.encoding import PickleEncoding
+from exam.decorators import around, fixture
+from exam.cases import Exam
+
+from gutter.client.cache import SwitchCache
+from gutter.client.encoding import JsonPickleEncoding, SchemaEncoding
+from gutter.client.models import Switch, Condition, Manager
+from gutter.client.arguments import Container as BaseArgument
+from gutter.client import arguments
+from gutter.client.operators.comparable import Equals, In
+from gutter.client.operators.misc import PercentRange, StablePercent, StablePercentRange
+from gutter.client.operators.network import InNetwork
+from gutter.client.operators.string import NotInStripIgnoreCase
+from gutter.client import registry
+from durabledict.encoding import DecodingError
+
+
+class IntegerArgument(BaseArgument):
+    COMPATIBLE_TYPE = int
+
+    value = arguments.Value(lambda self: self.input)
+
+
+class TestJsonPickleEncoding(Exam, unittest2.TestCase):
+
+    @fixture
+    def switch(self):
+        switch = Switch('foo', state=Switch.states.SELECTIVE)
+        switch.conditions.append(Condition(IntegerArgument, 'value', Equals(value=1)))
+        return switch
+
+    @fixture
+    def encoded(self):
+        return JsonPickleEncoding.encode(self.switch)
+
+    @around
+    def fresh_decode_cache(self):
+        with mock.patch.object(JsonPickleEncoding, 'decode_cache', SwitchCache()):
+            yield
+
+    def test_round_trips_switches(self):
+        decoded = JsonPickleEncoding.decode(self.encoded)
+
+        eq_(decoded, self.switch)
+        eq_(decoded.conditions, self.switch.conditions)
+
+    def test_decodes_each_payload_once(self):
+        with mock.patch('gutter.client.encoding.pickle.loads') as loads:
+            loads.return_value = self.switch
+
+            JsonPickleEncoding.decode(self.encoded)
+            JsonPickleEncoding.decode(self.encoded)
+            eq_(loads.call_count, 1)
+
+            JsonPickleEncoding.decode(JsonPickleEncoding.encode(Switch('bar')))
+            eq_(loads.call_count, 2)
+
+        eq_(JsonPickleEncoding.decode_cache.hits, 1)
+
+    def test_hands_out_copies_of_decoded_objects(self):
+        first = JsonPickleEncoding.decode(self.encoded)
+        first.state = Switch.states.GLOBAL
+        first.conditions.append(Condition(IntegerArgument, 'value', Equals(value=2)))
+
+        second = JsonPickleEncoding.decode(self.encoded)
+        ok_(second is not first)
+        eq_(second.state, Switch.states.SELECTIVE)
+        eq_(len(second.conditions), 1)
+
+    def test_changing_decoded_conditions_does_not_change_the_next_decoded(self):
+        first = JsonPickleEncoding.decode(self.encoded)
+        first.conditions[0].operator.value = 2
+        first.conditions[0].negative = True
+
+        second = JsonPickleEncoding.decode(self.encoded)
+        eq_(second.conditions[0].operator.value, 1)
+        eq_(second.conditions[0].negative, False)
+        eq_(second.conditions, self.switch.conditions)
+
+    def test_changing_schema_decoded_conditions_does_not_change_the_next_decoded(self):
+        encoded = SchemaEncoding.encode(self.switch)
+
+        first = SchemaEncoding.decode(encoded)
+        first.conditions[0].operator.value = 2
+
+        eq_(SchemaEncoding.decode(encoded).conditions[0].operator.value, 1)
+
+    def test_decodes_every_payload_without_cache(self):
+        with mock.patch.object(JsonPickleEncoding, 'decode_cache', None):
+            with mock.patch('gutter.client.encoding.pickle.loads') as loads:
+                JsonPickleEncoding.decode(self.encoded)
+                JsonPickleEncoding.decode(self.encoded)
+
+        eq_(loads.call_count, 2)
+
+    def test_pickle_payloads_skip_json_decoding(self):
+        pickled = PickleEncoding.encode(self.switch)
+
+        with mock.patch('gutter.client.encoding.pickle.loads') as loads:
+            eq_(JsonPickleEncoding.decode(pickled), self.switch)
+
+        eq_(loads.called, False)
+
+    def test_falls_back_to_pickle_for_unrecognized_payloads(self):
+        eq_(JsonPickleEncoding.decode(JsonPickleEncoding.encode(42)), 42)
+
+        with mock.patch.object(PickleEncoding, 'decode', return_value='legacy') as decode:
+            eq_(JsonPickleEncoding.decode('not json'), 'legacy')
+
+        decode.assert_called_once_with('not json')
+
+    def test_decodes_non_ascii_names_as_utf8(self):
+        switch = Switch('caf\xc3\xa9')
+        decoded = JsonPickleEncoding.decode(JsonPickleEncoding.encode(switch))
+
+        eq_(decoded.name, 'caf\xc3\xa9')
+        eq_(type(decoded.name), str)
+        eq_(decoded.changes, {})
+
+    def test_works_as_storage_encoding(self):
+        manager = Manager(storage=MemoryDict(encoding=JsonPickleEncoding))
+        manager.register(self.switch)
+
+        ok_(manager.active('foo', 1) is True)
+        ok_(manager.active('foo', 2) is False)
+
+
+class CustomSwitch(Switch):
+    pass
+
+
+class CustomCondition(Condition):
+    pass
+
+
+class TestSchemaEncoding(Exam, unittest2.TestCase):
+
+    @fixture
+    def switch(self):
+        switch = Switch(
+            'foo',
+            state=Switch.states.SELECTIVE,
+            compounded=True,
+            concent=False,
+            label='Foo',
+            description='The foo switch'
+        )
+        switch.conditions = [
+            Condition(IntegerArgument, 'value', Equals(value=1)),
+            Condition(IntegerArgument, 'value', PercentRange(10, 20.5), negative=True),
+        ]
+        return switch
+
+    @around
+    def without_decode_cache(self):
+        with mock.patch.object(JsonPickleEncoding, 'decode_cache', None):
+            yield
+
+    def round_trip(self, data):
+        return SchemaEncoding.decode(SchemaEncoding.encode(data))
+
+    def test_round_trips_switches(self):
+        decoded = self.round_trip(self.switch)
+
+        eq_(decoded, self.switch)
+        eq_(type(decoded), Switch)
+        eq_((decoded.label, decoded.description), ('Foo', 'The foo switch'))
+        eq_(decoded.conditions, self.switch.conditions)
+        eq_(decoded.conditions[1].negative, True)
+
+    def test_decoded_switches_have_no_changes_or_manager(self):
+        self.switch.state = Switch.states.GLOBAL
+        self.switch.manager = mock.Mock()
+
+        decoded = self.round_trip(self.switch)
+        eq_(decoded.changes, {})
+        eq_(decoded.manager, None)
+
+    def test_round_trips_stable_percentages(self):
+        self.switch.conditions = [
+            Condition(IntegerArgument, 'value', StablePercent(25, salt='foo')),
+            Condition(IntegerArgument, 'value', StablePercentRange(10, 20.5, salt=u'f\xf6o')),
+        ]
+
+        decoded = self.round_trip(self.switch)
+        eq_(decoded.conditions, self.switch.conditions)
+
+        for condition, original in zip(decoded.conditions, self.switch.conditions):
+            eq_(
+                map(condition.operator.applies_to, range(100)),
+                map(original.operator.applies_to, range(100))
+            )
+
+    def test_encodes_set_membership_as_a_sorted_list(self):
+        self.switch.conditions = [
+            Condition(IntegerArgument, 'value', In(range(100, 0, -1))),
+            Condition(IntegerArgument, 'value', NotInStripIgnoreCase(['B ', 'a'])),
+        ]
+
+        encoded = SchemaEncoding.encode(self.switch)
+        ok_('[1,2,3,' in encoded)
+        ok_('["a","b"]' in encoded)
+        ok_('py/' not in encoded)
+        ok_('frozenset' not in JsonPickleEncoding.encode(self.switch))
+
+        for encoding in (SchemaEncoding, JsonPickleEncoding, PickleEncoding):
+            decoded = encoding.decode(encoding.encode(self.switch))
+            eq_(decoded.conditions, self.switch.conditions)
+            eq_(type(decoded.conditions[0].operator.values), frozenset)
+
+    def test_encodes_networks_in_cidr_notation(self):
+        self.switch.conditions = [
+            Condition(IntegerArgument, 'value', InNetwork(['10.1.2.3/8', '2001:db8::/32'])),
+        ]
+
+        encoded = SchemaEncoding.encode(self.switch)
+        ok_('["10.0.0.0/8","2001:db8::/32"]' in encoded)
+        ok_('"in_network"' in encoded)
+        ok_('["10.0.0.0/8", "2001:db8::/32"]' in JsonPickleEncoding.encode(self.switch))
+
+        for encoding in (SchemaEncoding, JsonPickleEncoding, PickleEncoding):
+            decoded = encoding.decode(encoding.encode(self.switch))
+            eq_(decoded.conditions, self.switch.conditions)
+            ok_(decoded.conditions[0].operator.applies_to('10.9.9.9'))
+
+    def test_refers_to_registered_classes_by_key(self):
+        encoded = SchemaEncoding.encode(self.switch)
+
+        ok_('"equals"' in encoded)
+        ok_('"percent_range"' in encoded)
+        ok_('py/object' not in encoded)
+
+    def test_refers_to_registered_arguments_by_key(self):
+        arguments_registry = registry.Registry(BaseArgument)
+        arguments_registry.register('integer', IntegerArgument)
+
+        with mock.patch.object(registry, 'arguments', arguments_registry):
+            encoded = SchemaEncoding.encode(self.switch)
+            conditions = SchemaEncoding.decode(encoded).conditions
+
+        ok_('"integer"' in encoded)
+        ok_('IntegerArgument' not in encoded)
+        eq_(conditions, self.switch.conditions)
+
+    def test_keeps_switch_subclasses(self):
+        eq_(type(self.round_trip(CustomSwitch('foo'))), CustomSwitch)
+
+    def test_round_trips_non_ascii_names(self):
+        decoded = self.round_trip(Switch('caf\xc3\xa9', state=Switch.states.GLOBAL))
+
+        eq_(decoded.name, 'caf\xc3\xa9')
+        eq_(type(decoded.name), str)
+
+        ok_(SchemaEncoding.encode(Switch('caf\xc3\xa9')).startswith('~'))
+
+    def test_keeps_attributes_of_switches_and_their_subclasses(self):
+        for switch in (self.switch, CustomSwitch('bar')):
+            switch.owner = 'team-x'
+
+            decoded = self.round_trip(switch)
+            eq_(type(decoded), type(switch))
+            eq_(decoded.owner, 'team-x')
+            eq_(decoded.conditions, switch.conditions)
+
+    def test_keeps_condition_subclasses(self):
+        self.switch.conditions.append(
+            CustomCondition(IntegerArgument, 'value', Equals(value=3), negative=True)
+        )
+
+        decoded = self.round_trip(self.switch)
+        eq_(map(type, decoded.conditions), [Condition, Condition, CustomCondition])
+        eq_(decoded.conditions, self.switch.conditions)
+
+    def test_falls_back_to_jsonpickle_only_for_switches_it_can_not_represent(self):
+        ok_(SchemaEncoding.encode(self.switch).startswith('~'))
+
+        self.switch.owner = 'team-x'
+        eq_(SchemaEncoding.encode(self.switch), JsonPickleEncoding.encode(self.switch))
+
+    def test_is_much_smaller_than_jsonpickle(self):
+        ok_(len(SchemaEncoding.encode(self.switch)) * 2 < len(JsonPickleEncoding.encode(self.switch)))
+
+    def test_encodes_other_data_with_jsonpickle(self):
+        eq_(SchemaEncoding.encode({'a': 1}), JsonPickleEncoding.encode({'a': 1}))
+        eq_(self.round_trip({'a': 1}), {'a': 1})
+
+    def test_decodes_older_payloads(self):
+        for encoding in (JsonPickleEncoding, PickleEncoding):
+            eq_(SchemaEncoding.decode(encoding.encode(self.switch)), self.switch)
+
+    def test_rejects_unknown_schema_versions(self):
+        encoded = SchemaEncoding.encode(self.switch).replace('~2 ', '~99 ', 1)
+        assert_raises(DecodingError, SchemaEncoding.decode, encoded)
+
+    def test_conditions_are_decoded_when_first_used(self):
+        decoded = SchemaEncoding.decode(SchemaEncoding.encode(self.switch))
+        eq_(decoded.conditions_deferred, True)
+
+        load = SchemaEncoding.load_condition
+
+        with mock.patch.object(SchemaEncoding, 'load_condition', wraps=load) as load_condition:
+            ok_(decoded.enabled_for_all(1) is not None)
+            eq_(load_condition.call_count, 2)
+
+        eq_(decoded.conditions_deferred, False)
+
+    def test_checking_static_switches_never_decodes_conditions(self):
+        manager = Manager(storage=MemoryDict(encoding=SchemaEncoding))
+
+        for state in (Switch.states.GLOBAL, Switch.states.DISABLED):
+            self.switch.state = state
+            manager.register(self.switch)
+
+            with mock.patch.object(SchemaEncoding, 'load_condition') as load_condition:
+                manager.active('foo', 1)
+                ok_(manager.switch('foo').conditions_deferred)
+
+            eq_(load_condition.called, False)
+
+    def test_deferred_switches_can_be_copied_and_pickled(self):
+        decoded = SchemaEncoding.decode(SchemaEncoding.encode(self.switch))
+
+        for copied in (copy.copy(decoded), pickle.loads(pickle.dumps(decoded))):
+            eq_(copied.conditions_deferred, True)
+            eq_(copied.conditions, self.switch.conditions)
+            eq_(copied.changes, {})
+
+        eq_(decoded.conditions_deferred, True)
@@ -0,0 +1,223 @@
+import os
+import shutil
+import tempfile
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from durabledict import MemoryDict
+from exam.decorators import after, fixture
+from exam.cases import Exam
+
+from gutter.client import signals
+from gutter.client.index import KeyIndex
+from gutter.client.models import Switch, Manager
+from gutter.client.storage import SQLiteStorage
+
+
+class TestKeyIndex(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        return dict.fromkeys(['a', 'a:b', 'a:b:c', 'ab', 'b'])
+
+    @fixture
+    def index(self):
+        return KeyIndex()
+
+    def test_finds_sorted_keys_with_prefix(self):
+        eq_(self.index.prefixed(self.storage, 'a'), ['a', 'a:b', 'a:b:c', 'ab'])
+        eq_(self.index.prefixed(self.storage, 'a:'), ['a:b', 'a:b:c'])
+        eq_(self.index.prefixed(self.storage, 'c'), [])
+        eq_(self.index.prefixed(self.storage, ''), sorted(self.storage))
+
+    def test_is_built_once_for_storage_without_version(self):
+        self.index.prefixed(self.storage, 'a')
+        self.storage['a:d'] = None
+        eq_(self.index.prefixed(self.storage, 'a:'), ['a:b', 'a:b:c'])
+        eq_(self.index.rebuilds, 1)
+
+    def test_add_and_discard_keep_index_sorted(self):
+        self.index.prefixed(self.storage, '')
+
+        self.index.add(self.storage, 'a:a')
+        self.index.add(self.storage, 'a:a')
+        self.index.discard(self.storage, 'a:b')
+        self.index.discard(self.storage, 'missing')
+
+        eq_(self.index.prefixed(self.storage, 'a:'), ['a:a', 'a:b:c'])
+
+    def test_add_and_discard_before_first_use_do_nothing(self):
+        self.index.add(self.storage, 'z')
+        eq_(self.index.prefixed(self.storage, 'z'), [])
+
+    def test_is_rebuilt_when_storage_version_changes(self):
+        storage = MemoryDict()
+        storage['a'] = 1
+        eq_(self.index.prefixed(storage, ''), ['a'])
+
+        storage['b'] = 2
+        eq_(self.index.prefixed(storage, ''), ['a', 'b'])
+        eq_(self.index.rebuilds, 2)
+
+    def test_own_changes_do_not_cause_rebuilds(self):
+        storage = MemoryDict()
+        self.index.prefixed(storage, '')
+
+        previous = storage.last_updated()
+        storage['a'] = 1
+        self.index.add(storage, 'a', previous)
+        eq_(self.index.prefixed(storage, ''), ['a'])
+        eq_(self.index.rebuilds, 1)
+
+    def test_own_changes_after_others_changes_cause_rebuild(self):
+        storage = MemoryDict()
+        self.index.prefixed(storage, '')
+        storage['b'] = 2
+
+        previous = storage.last_updated()
+        storage['a'] = 1
+        self.index.add(storage, 'a', previous)
+
+        eq_(self.index.prefixed(storage, ''), ['a', 'b'])
+        eq_(self.index.rebuilds, 2)
+
+    def test_own_deletes_after_others_changes_cause_rebuild(self):
+        storage = MemoryDict()
+        storage['a'] = 1
+        self.index.prefixed(storage, '')
+        storage['b'] = 2
+
+        previous = storage.last_updated()
+        del storage['a']
+        self.index.discard(storage, 'a', previous)
+
+        eq_(self.index.prefixed(storage, ''), ['b'])
+        eq_(self.index.rebuilds, 2)
+
+    def test_update_adds_or_removes_many_keys(self):
+        storage = MemoryDict()
+        self.index.prefixed(storage, '')
+
+        previous = storage.last_updated()
+        storage['a'] = storage['b'] = 1
+        self.index.update(storage, ['b', 'a'], previous)
+        eq_(self.index.prefixed(storage, ''), ['a', 'b'])
+
+        previous = storage.last_updated()
+        del storage['a']
+        del storage['b']
+        self.index.update(storage, ['a', 'b'], previous, removed=True)
+        eq_(self.index.prefixed(storage, ''), [])
+        eq_(self.index.rebuilds, 1)
+
+
+class KeysCountingDict(dict):
+
+    def __init__(self, *args, **kwargs):
+        super(KeysCountingDict, self).__init__(*args, **kwargs)
+        self.scans = 0
+
+    def keys(self):
+        self.scans += 1
+        return super(KeysCountingDict, self).keys()
+
+    def iteritems(self):
+        self.scans += 1
+        return super(KeysCountingDict, self).iteritems()
+
+
+class TestManagerWithKeyIndex(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        return KeysCountingDict()
+
+    @fixture
+    def manager(self):
+        return Manager(storage=self.storage, key_index=KeyIndex())
+
+    def register(self, *names):
+        for name in names:
+            self.manager.register(Switch(name))
+
+    def test_key_index_defaults_to_none(self):
+        ok_(Manager(storage=dict()).key_index is None)
+
+    def test_namespaced_managers_share_key_index(self):
+        ok_(self.manager.namespaced('ns').key_index is self.manager.key_index)
+
+    def test_lists_namespace_switches_without_scanning(self):
+        self.register('a', 'b')
+        self.manager.namespaced('other').register(Switch('c'))
+
+        eq_(sorted(s.name for s in self.manager.switches), ['a', 'b'])
+        eq_([s.name for s in self.manager.namespaced('other').switches], ['c'])
+        eq_(self.storage.scans, 1)
+
+    def test_finds_children_without_scanning(self):
+        self.register('a', 'a:b', 'a:b:c', 'ab')
+
+        eq_(self.manager.get_children('a'), ['a:b', 'a:b:c'])
+        eq_(self.manager.get_children('a:b:c'), [])
+        eq_(self.storage.scans, 1)
+
+    def test_sees_switches_written_by_others_before_own_writes(self):
+        storage = MemoryDict()
+        manager = Manager(storage=storage, key_index=KeyIndex())
+        manager.register(Switch('a'))
+        eq_([s.name for s in manager.switches], ['a'])
+
+        storage['default.b'] = Switch('b')
+        manager.register(Switch('c'))
+
+        eq_(sorted(s.name for s in manager.switches), ['a', 'b', 'c'])
+
+    def test_register_many_updates_index_without_rebuilding(self):
+        storage = MemoryDict()
+        manager = Manager(storage=storage, key_index=KeyIndex())
+        eq_(manager.switches, [])
+
+        manager.register_many([Switch('a'), Switch('b')])
+
+        eq_(sorted(s.name for s in manager.switches), ['a', 'b'])
+        eq_(manager.key_index.rebuilds, 1)
+
+    def test_unregister_removes_subtree_children_first(self):
+        self.register('a', 'a:b', 'a:b:c', 'a:d', 'ab')
+        unregistered = []
+
+        with mock.patch.object(signals, 'switch_unregistered') as signal:
+            signal.call.side_effect = lambda switch: unregistered.append(switch.name)
+            self.manager.unregister('a')
+
+        eq_(unregistered, ['a:d', 'a:b:c', 'a:b', 'a'])
+        eq_(self.manager.get_children('a'), [])
+        eq_([s.name for s in self.manager.switches], ['ab'])
+
+
+class TestManagerWithKeyIndexAndSQLiteStorage(Exam, unittest2.TestCase):
+
+    @fixture
+    def directory(self):
+        return tempfile.mkdtemp()
+
+    @after
+    def remove_directory(self):
+        shutil.rmtree(self.directory)
+
+    @fixture
+    def manager(self):
+        storage = SQLiteStorage(os.path.join(self.directory, 'gutter.db'))
+        return Manager(storage=storage, key_index=KeyIndex())
+
+    def test_finds_and_unregisters_non_ascii_children(self):
+        for name in ('caf\xc3\xa9', 'caf\xc3\xa9:th\xc3\xa9', 'cafe'):
+            self.manager.register(Switch(name))
+
+        eq_(self.manager.get_children('caf\xc3\xa9'), ['caf\xc3\xa9:th\xc3\xa9'])
+
+        self.manager.unregister('caf\xc3\xa9')
+        eq_(self.manager.get_children('caf\xc3\xa9'), [])
+        eq_([switch.name for switch in self.manager.switches], ['cafe'])
@@ -1,16 +1,25 @@
 import unittest2
 from nose.tools import *
 
+import os
+import shutil
+import tempfile
 import zlib
 
 from redis import Redis
+from durabledict import MemoryDict
 from durabledict.redis import RedisDict
-from gutter.client.encoding import JsonPickleEncoding
+from gutter.client.encoding import JsonPickleEncoding, SchemaEncoding
 
 from gutter.client.operators.comparable import *
 from gutter.client.operators.identity import *
 from gutter.client.operators.misc import *
+from gutter.client.cache import SwitchCache
 from gutter.client.models import Switch, Condition, Manager
+from gutter.client.index import KeyIndex
+from gutter.client.mapped import SnapshotPublisher
+from gutter.client.snapshot import SnapshotStore
+from gutter.client.storage import DictStorage, MemoryDictStorage, SQLiteStorage
 from gutter.client import arguments
 from gutter.client import signals
 
@@ -407,6 +416,27 @@ class TestIntegration(Exam, unittest2.TestCase):
             Switch.states.GLOBAL
         )
 
+    def test_active_many_matches_active(self):
+        names = [switch.name for switch in self.manager.switches]
+        input_sets = [
+            (self.jeff,),
+            (self.frank, self.jeff),
+            (self.bill, 4242, 0.8),
+            (self.timmy, 42),
+            (),
+        ]
+
+        for inputs in input_sets:
+            with self.inputs(self.manager, *inputs) as context:
+                expected = dict((name, context.active(name)) for name in names)
+                eq_(self.manager.active_many(names), expected)
+
+                expected = dict(
+                    (name, context.active(name, self.bill, exclusive=True))
+                    for name in names
+                )
+                eq_(self.manager.active_many(names, self.bill, exclusive=True), expected)
+
     def test_concent_with_different_arguments(self):
         # Test that a parent switch with a different argument type from the
         # child works.
@@ -448,3 +478,74 @@ class TestIntegrationWithRedis(TestIntegration):
             self.manager.active('new:switch')
         except pickle.PicklingError, e:
             self.fail('Encountered pickling error: "%s"' % e)
+
+
+class TestIntegrationCompiled(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=dict(), compiled=True)
+
+
+class TestIntegrationWithRequestCache(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=dict(), request_cache=True)
+
+
+class TestIntegrationAdaptive(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=dict(), adaptive=True)
+
+
+class TestIntegrationWithSwitchCache(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDict(), switch_cache=SwitchCache(maxsize=4))
+
+
+class TestIntegrationWithSnapshots(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDict(), snapshots=SnapshotStore())
+
+
+class TestIntegrationWithSchemaEncoding(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDict(encoding=SchemaEncoding))
+
+
+class TestIntegrationWithKeyIndex(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDict(), key_index=KeyIndex())
+
+
+class TestIntegrationWithDictStorage(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=DictStorage())
+
+
+class TestIntegrationWithMemoryDictStorage(TestIntegration):
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDictStorage())
+
+
+class TestIntegrationWithSQLiteStorage(TestIntegration):
+    @fixture
+    def manager(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return Manager(storage=SQLiteStorage(os.path.join(directory, 'gutter.db')))
+
+
+class TestIntegrationWithSnapshotPublisher(TestIntegration):
+    @fixture
+    def manager(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        publisher = SnapshotPublisher(os.path.join(directory, 'gutter.snapshot'))
+        return Manager(storage=MemoryDict(), snapshots=publisher)
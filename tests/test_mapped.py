@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from durabledict import MemoryDict
+from exam.decorators import after, fixture
+from exam.cases import Exam
+
+from gutter.client.arguments import Container as BaseArgument
+from gutter.client import arguments
+from gutter.client.encoding import SchemaEncoding
+from gutter.client.mapped import (
+    MappedSnapshot, MappedSnapshotStore, SnapshotPublisher, write_snapshot
+)
+from gutter.client.models import Switch, Condition, Manager
+from gutter.client.operators.comparable import Equals
+from gutter.client.snapshot import Snapshot, SnapshotRefresher
+
+from tests.helpers import CountingDict
+
+
+class IntegerArgument(BaseArgument):
+    COMPATIBLE_TYPE = int
+
+    value = arguments.Value(lambda self: self.input)
+
+
+def check_switch(path, name, value, results):
+    manager = Manager(storage=dict(), snapshots=MappedSnapshotStore(path))
+    results.put(manager.active(name, value))
+
+
+class MappedSnapshotTestCase(Exam, unittest2.TestCase):
+
+    @fixture
+    def directory(self):
+        return tempfile.mkdtemp()
+
+    @fixture
+    def path(self):
+        return os.path.join(self.directory, 'gutter.snapshot')
+
+    @after
+    def remove_directory(self):
+        shutil.rmtree(self.directory)
+
+    @fixture
+    def selective(self):
+        switch = Switch('selective', state=Switch.states.SELECTIVE)
+        switch.conditions.append(Condition(IntegerArgument, 'value', Equals(value=1)))
+        return switch
+
+    @fixture
+    def storage(self):
+        storage = MemoryDict()
+        storage['default.selective'] = self.selective
+        storage['default.global'] = Switch('global', state=Switch.states.GLOBAL)
+        return storage
+
+
+class TestMappedSnapshot(MappedSnapshotTestCase):
+
+    @fixture
+    def snapshot(self):
+        write_snapshot(self.path, self.storage.items(), self.storage.last_updated())
+        return MappedSnapshot(self.path)
+
+    def test_acts_like_a_read_only_mapping(self):
+        eq_(len(self.snapshot), 2)
+        eq_(sorted(self.snapshot), ['default.global', 'default.selective'])
+        ok_('default.global' in self.snapshot)
+        ok_('default.missing' not in self.snapshot)
+        eq_(self.snapshot.get('default.missing'), None)
+        assert_raises(KeyError, self.snapshot.__getitem__, 'default.missing')
+        eq_(dict(self.snapshot.items())['default.selective'], self.selective)
+
+    def test_records_storage_version(self):
+        eq_(self.snapshot.version, self.storage.last_updated())
+
+        write_snapshot(self.path, [])
+        eq_(MappedSnapshot(self.path).version, None)
+
+    def test_decodes_each_switch_once_when_first_read(self):
+        with mock.patch.object(SchemaEncoding, 'loads', wraps=SchemaEncoding.loads) as loads:
+            snapshot = self.snapshot
+            eq_(loads.call_count, 0)
+
+            ok_(snapshot['default.global'] is snapshot['default.global'])
+            eq_(loads.call_count, 1)
+
+    def test_conditions_stay_encoded_until_used(self):
+        switch = self.snapshot['default.selective']
+
+        ok_(switch.conditions_deferred)
+        eq_(switch.conditions, self.selective.conditions)
+
+    def test_finds_unicode_keys(self):
+        write_snapshot(self.path, [(u'caf\xe9', Switch('cafe')), ('a', Switch('a'))])
+        snapshot = MappedSnapshot(self.path)
+
+        eq_(snapshot[u'caf\xe9'].name, 'cafe')
+        ok_('b' not in snapshot)
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as other:
+            other.write('not a snapshot file')
+
+        assert_raises(ValueError, MappedSnapshot, self.path)
+
+    def test_writes_leave_only_the_snapshot_file(self):
+        self.snapshot
+        write_snapshot(self.path, self.storage.items())
+
+        eq_(os.listdir(self.directory), ['gutter.snapshot'])
+
+    def test_survives_being_replaced(self):
+        snapshot = self.snapshot
+        write_snapshot(self.path, [])
+
+        eq_(snapshot['default.global'].name, 'global')
+
+
+class TestMappedSnapshotStore(MappedSnapshotTestCase):
+
+    @fixture
+    def store(self):
+        return MappedSnapshotStore(self.path, check_interval=0)
+
+    def test_builds_snapshots_in_memory_until_published(self):
+        ok_(isinstance(self.store.get(self.storage), Snapshot))
+
+        SnapshotPublisher(self.path).refresh(self.storage)
+        ok_(isinstance(self.store.get(self.storage), MappedSnapshot))
+
+    def test_maps_each_published_file_once(self):
+        publisher = SnapshotPublisher(self.path)
+        publisher.refresh(self.storage)
+
+        first = self.store.get(self.storage)
+        ok_(self.store.get(self.storage) is first)
+
+        self.storage['default.new'] = Switch('new')
+        publisher.refresh(self.storage)
+
+        second = self.store.get(self.storage)
+        ok_(second is not first)
+        ok_('default.new' in second)
+        eq_(self.store.refreshes, 2)
+
+    def test_checks_for_new_files_every_check_interval(self):
+        SnapshotPublisher(self.path).refresh(self.storage)
+        store = MappedSnapshotStore(self.path, check_interval=60)
+        first = store.get(self.storage)
+
+        SnapshotPublisher(self.path).refresh(self.storage)
+        ok_(store.get(self.storage) is first)
+
+        store.checked_at -= 60
+        ok_(store.get(self.storage) is not first)
+
+    def test_manager_checks_switches_without_reading_storage(self):
+        storage = CountingDict(self.storage.items())
+        SnapshotPublisher(self.path).refresh(storage)
+        manager = Manager(storage=storage, snapshots=self.store)
+
+        ok_(manager.active('selective', 1) is True)
+        ok_(manager.active('selective', 2) is False)
+        ok_(manager.active('global') is True)
+        eq_(storage.reads, 0)
+
+    def test_switches_registered_since_publishing_are_not_autocreated(self):
+        SnapshotPublisher(self.path).refresh(self.storage)
+        manager = Manager(storage=self.storage, snapshots=self.store, autocreate=True)
+        ok_(manager.active('global') is True)
+
+        Manager(storage=self.storage).register(Switch('launch', state=Switch.states.GLOBAL))
+
+        ok_(manager.active('launch') is True)
+        eq_(self.storage['default.launch'].state, Switch.states.GLOBAL)
+
+    def test_other_processes_read_the_published_file(self):
+        SnapshotPublisher(self.path).refresh(self.storage)
+        results = multiprocessing.Queue()
+
+        for value in (1, 2):
+            process = multiprocessing.Process(
+                target=check_switch,
+                args=(self.path, 'selective', value, results)
+            )
+            process.start()
+            process.join(10)
+
+        eq_([results.get(timeout=10), results.get(timeout=10)], [True, False])
+
+
+class TestSnapshotPublisher(MappedSnapshotTestCase):
+
+    @fixture
+    def publisher(self):
+        return SnapshotPublisher(self.path)
+
+    def test_refresh_publishes_and_maps_the_storage(self):
+        snapshot = self.publisher.refresh(self.storage)
+
+        ok_(isinstance(snapshot, MappedSnapshot))
+        ok_(self.publisher.current is snapshot)
+        eq_(snapshot.version, self.storage.last_updated())
+        eq_(sorted(snapshot), sorted(self.storage.keys()))
+        ok_(self.publisher.refresh_seconds >= 0)
+
+    def test_refresher_publishes_when_storage_changes(self):
+        refresher = SnapshotRefresher(self.publisher, self.storage)
+
+        eq_(refresher.poll(), True)
+        eq_(refresher.poll(), False)
+
+        self.storage['default.new'] = Switch('new')
+        eq_(refresher.poll(), True)
+        ok_('default.new' in MappedSnapshot(self.path))
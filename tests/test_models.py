@@ -5,14 +5,20 @@ import unittest2
 from nose.tools import *
 from gutter.client.arguments import Container as BaseArgument
 from gutter.client import arguments
-from gutter.client.models import Switch, Manager, Condition
+from gutter.client.models import (
+    Switch, Manager, Condition, ConditionsList, ConditionStats, EvaluationContext
+)
 from durabledict import MemoryDict
 from durabledict.base import DurableDict
 from gutter.client import signals
+from gutter.client.index import KeyIndex
+from gutter.client.operators.comparable import Equals, MoreThan
 import mock
-from exam.decorators import fixture, before
+from exam.decorators import around, before, fixture
 from exam.cases import Exam
 
+from tests.helpers import CountingDict
+
 
 class ManagerMixin(Exam):
     @fixture
@@ -178,6 +184,44 @@ class TestSwitch(ManagerMixin, unittest2.TestCase):
         eq_(a, b)
 
 
+class TestStaticSwitchStates(Exam, unittest2.TestCase):
+    @around
+    def patch_signals(self):
+        with mock.patch('gutter.client.signals.switch_checked') as checked:
+            with mock.patch('gutter.client.signals.switch_active') as active:
+                self.checked = checked
+                self.active = active
+                yield
+
+    def check(self, state, compounded, *inputs):
+        switch = Switch('foo', state=state, compounded=compounded)
+        switch.enabled_for = mock.Mock(side_effect=AssertionError)
+        result = switch.enabled_for_all(*inputs)
+        return result, self.checked.call.call_count, self.active.call.call_args_list
+
+    def test_global_is_enabled_by_the_first_input(self):
+        eq_(
+            self.check(Switch.states.GLOBAL, False, 'a', 'b'),
+            (True, 1, [mock.call(mock.ANY, 'a')])
+        )
+
+    def test_compounded_global_is_enabled_for_every_input(self):
+        eq_(
+            self.check(Switch.states.GLOBAL, True, 'a', 'b'),
+            (True, 2, [mock.call(mock.ANY, 'a'), mock.call(mock.ANY, 'b')])
+        )
+
+    def test_disabled_checks_every_input(self):
+        eq_(self.check(Switch.states.DISABLED, False, 'a', 'b'), (False, 2, []))
+
+    def test_compounded_disabled_is_disabled_by_the_first_input(self):
+        eq_(self.check(Switch.states.DISABLED, True, 'a', 'b'), (False, 1, []))
+
+    def test_no_inputs_matches_any_and_all(self):
+        eq_(self.check(Switch.states.GLOBAL, False), (False, 0, []))
+        eq_(self.check(Switch.states.DISABLED, True), (True, 0, []))
+
+
 class TestSwitchChanges(ManagerMixin, unittest2.TestCase):
     @fixture
     def switch(self):
@@ -218,6 +262,121 @@ class TestSwitchChanges(ManagerMixin, unittest2.TestCase):
         )
 
 
+class TestSwitchConditionsIndex(ManagerMixin, unittest2.TestCase):
+    @fixture
+    def switch(self):
+        switch = Switch('foo', state=Switch.states.SELECTIVE)
+        switch.conditions.append(self.condition(True))
+        return switch
+
+    def condition(self, result):
+        mck = mock.MagicMock()
+        mck.call.return_value = result
+        mck.argument.COMPATIBLE_TYPE = str
+        return mck
+
+    def test_conditions_are_a_conditions_list(self):
+        ok_(isinstance(self.switch.conditions, ConditionsList))
+
+    def test_index_is_built_once(self):
+        index = self.switch.conditions.index
+        ok_(self.switch.enabled_for('input') is True)
+        ok_(self.switch.conditions.index is index)
+
+    def test_index_is_rebuilt_after_append_and_remove(self):
+        index = self.switch.conditions.index
+        condition = self.condition(False)
+
+        self.switch.conditions.append(condition)
+        ok_(self.switch.conditions.index is not index)
+        ok_(condition in self.switch.conditions.index[str])
+
+        index = self.switch.conditions.index
+        self.switch.conditions.remove(condition)
+        ok_(self.switch.conditions.index is not index)
+        ok_(condition not in self.switch.conditions.index[str])
+
+    def test_reassigned_conditions_are_indexed(self):
+        self.switch.conditions = [self.condition(False)]
+        ok_(isinstance(self.switch.conditions, ConditionsList))
+        ok_(self.switch.enabled_for('input') is False)
+
+    def test_index_lookups_do_not_add_types(self):
+        eq_(self.switch.conditions.index.get_by_input(42), [])
+        eq_(self.switch.conditions.index.keys(), [str])
+
+    def test_getstate_stores_plain_lists(self):
+        state = self.switch.__getstate__()
+        ok_(type(state['conditions']) is list)
+        ok_(type(state['_Switch__init_vars']['conditions']) is list)
+        ok_(state['_Switch__init_vars']['conditions'] is state['conditions'])
+
+    def test_setstate_restores_a_conditions_list(self):
+        switch = Switch.__new__(Switch)
+        switch.__setstate__(self.switch.__getstate__())
+        ok_(isinstance(switch.conditions, ConditionsList))
+        eq_(switch.changed, False)
+
+    def test_manager_update_invalidates_index(self):
+        self.manager.register(self.switch)
+        index = self.switch.conditions.index
+
+        self.manager.update(self.switch)
+        ok_(self.switch.conditions.index is not index)
+
+
+class TestSwitchDeferredConditions(ManagerMixin, unittest2.TestCase):
+    @fixture
+    def conditions(self):
+        return [Condition(CountingArgument, 'value', Equals(value=1))]
+
+    @fixture
+    def load(self):
+        return mock.Mock(return_value=self.conditions)
+
+    @fixture
+    def switch(self):
+        switch = Switch('foo', state=Switch.states.SELECTIVE)
+        switch.defer_conditions(self.load)
+        switch.reset()
+        return switch
+
+    def test_conditions_are_loaded_once_when_first_used(self):
+        ok_(self.switch.conditions_deferred)
+        eq_(self.load.called, False)
+
+        ok_(self.switch.enabled_for(1) is True)
+        ok_(isinstance(self.switch.conditions, ConditionsList))
+        eq_(self.switch.conditions, self.conditions)
+        eq_(self.switch.conditions_deferred, False)
+        self.load.assert_called_once_with()
+
+    def test_static_switches_never_load_conditions(self):
+        for state in (Switch.states.GLOBAL, Switch.states.DISABLED):
+            self.switch.state = state
+            self.switch.enabled_for_all(1, 2)
+            self.switch.enabled_for(1)
+
+        eq_(self.load.called, False)
+
+    def test_loading_conditions_is_not_a_change(self):
+        eq_(self.switch.changes, {})
+        self.switch.conditions
+        eq_(self.switch.changes, {})
+
+        self.switch.state = Switch.states.GLOBAL
+        eq_(self.switch.changes.keys(), ['state'])
+
+    def test_registering_does_not_load_conditions(self):
+        self.manager.register(self.switch)
+        eq_(self.load.called, False)
+
+    def test_getstate_keeps_conditions_deferred(self):
+        state = self.switch.__getstate__()
+        ok_('conditions' not in state)
+        ok_(state['_Switch__load_conditions'] is self.load)
+
+
 class TestCondition(unittest2.TestCase):
     def argument_dict(name):
         return dict(
@@ -305,6 +464,119 @@ class TestCondition(unittest2.TestCase):
             eq_(a, b)
 
 
+class CountingArgument(BaseArgument):
+    COMPATIBLE_TYPE = int
+    constructed = []
+    extracted = []
+
+    def __init__(self, inpt):
+        super(CountingArgument, self).__init__(inpt)
+        self.constructed.append(inpt)
+
+    def get_value(self):
+        self.extracted.append(self.input)
+        return self.input
+
+    value = arguments.Value(get_value)
+
+
+class TestEvaluationContext(Exam, unittest2.TestCase):
+    @fixture
+    def context(self):
+        return EvaluationContext()
+
+    @before
+    def reset_counts(self):
+        del CountingArgument.constructed[:]
+        del CountingArgument.extracted[:]
+
+    def test_argument_constructs_once_per_input(self):
+        first = self.context.argument(CountingArgument, 1)
+        ok_(self.context.argument(CountingArgument, 1) is first)
+        ok_(self.context.argument(CountingArgument, 2) is not first)
+        eq_(CountingArgument.constructed, [1, 2])
+
+    def test_variable_is_extracted_once_per_input(self):
+        eq_(self.context.variable(CountingArgument, 1, 'value'), 1)
+        eq_(self.context.variable(CountingArgument, 1, 'value'), 1)
+        eq_(CountingArgument.extracted, [1])
+        eq_(CountingArgument.constructed, [1])
+
+    def test_inputs_are_keyed_by_identity(self):
+        unhashable = [1]
+        first = self.context.argument(MOLArgument, unhashable)
+        ok_(self.context.argument(MOLArgument, unhashable) is first)
+        ok_(self.context.argument(MOLArgument, [1]) is not first)
+
+    def test_condition_call_uses_context(self):
+        condition = Condition(CountingArgument, 'value', Equals(value=1))
+        eq_(condition.call(1, self.context), True)
+        eq_(condition.call(1, self.context), True)
+        eq_(CountingArgument.constructed, [1])
+        eq_(CountingArgument.extracted, [1])
+
+
+class TestManagerEvaluationContext(Exam, unittest2.TestCase):
+    compiled = False
+
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDict(), compiled=self.compiled)
+
+    @before
+    def register_switches(self):
+        del CountingArgument.constructed[:]
+        del CountingArgument.extracted[:]
+
+        for name in ('parent', 'parent:child', 'parent:child:grandchild'):
+            switch = Switch(name, state=Switch.states.SELECTIVE)
+            switch.conditions.append(Condition(CountingArgument, 'value', MoreThan(lower_limit=0)))
+            switch.conditions.append(Condition(CountingArgument, 'value', Equals(value=5)))
+            self.manager.register(switch)
+
+    def test_arguments_are_shared_through_the_parent_chain(self):
+        eq_(self.manager.active('parent:child:grandchild', -1, 5), True)
+        eq_(sorted(CountingArgument.constructed), [-1, 5])
+        eq_(sorted(CountingArgument.extracted), [-1, 5])
+
+    def test_context_is_not_kept_between_calls(self):
+        # Two inputs, so the checks share a context; the first one decides
+        self.manager.active('parent', 5, 6)
+        ok_(self.manager.context is None)
+
+        self.manager.active('parent', 5, 6)
+        eq_(CountingArgument.constructed, [5, 5])
+
+    def test_one_switch_checked_against_one_input_needs_no_context(self):
+        if self.compiled:
+            self.skipTest('compiled switches always check with a context')
+
+        contexts = []
+        enabled_for = Switch.enabled_for
+
+        def record_context(switch, inpt):
+            contexts.append(self.manager.context)
+            return enabled_for(switch, inpt)
+
+        with mock.patch.object(Switch, 'enabled_for', record_context):
+            eq_(self.manager.active('parent', 5), True)
+            eq_(self.manager.active('parent:child', 5), True)
+            eq_(self.manager.active_many(['parent'], 5), {'parent': True})
+
+        eq_(contexts[0], None)
+        ok_(contexts[1] is not None)
+        ok_(contexts[2] is contexts[1])
+        eq_(contexts[3], None)
+
+    def test_context_is_cleared_when_active_raises(self):
+        assert_raises(ValueError, self.manager.active, 'junk')
+        ok_(self.manager.context is None)
+
+
+class TestCompiledManagerEvaluationContext(TestManagerEvaluationContext):
+    compiled = True
+
+
 class SwitchWithConditions(object):
     @fixture
     def switch(self):
@@ -664,6 +936,498 @@ class ActsLikeManager(object):
         signal.call.assert_called_once_with(switch)
 
 
+class ActiveManyTest(Exam, unittest2.TestCase):
+    @fixture
+    def manager(self):
+        return Manager(storage=CountingDict())
+
+    @before
+    def register_switches(self):
+        for name in ('movies', 'movies:jaws', 'movies:alien', 'books'):
+            switch = Switch(name, state=Switch.states.GLOBAL)
+            switch.enabled_for_all = mock.Mock(wraps=switch.enabled_for_all)
+            self.manager.register(switch)
+
+    def test_returns_dict_of_switch_names_to_active(self):
+        self.manager.storage['default.books'].state = Switch.states.DISABLED
+        eq_(
+            self.manager.active_many(['movies:jaws', 'books']),
+            {'movies:jaws': True, 'books': False}
+        )
+
+    def test_fetches_and_checks_each_switch_once(self):
+        names = ['movies:jaws', 'movies:alien', 'movies', 'books']
+        self.manager.active_many(names)
+
+        eq_(sorted(self.manager.storage.gets), sorted('default.' + n for n in names))
+        for name in names:
+            eq_(self.manager.storage['default.' + name].enabled_for_all.call_count, 1)
+
+    def test_disabled_ancestor_disables_concenting_children(self):
+        self.manager.storage['default.movies'].state = Switch.states.DISABLED
+        eq_(
+            self.manager.active_many(['movies:jaws', 'movies:alien']),
+            {'movies:jaws': False, 'movies:alien': False}
+        )
+
+    def test_uses_global_inputs_unless_exclusive(self):
+        switch = self.manager.storage['default.books']
+        self.manager.input('input 1')
+
+        self.manager.active_many(['books'], 'input 2')
+        switch.enabled_for_all.assert_called_with('input 1', 'input 2')
+
+        self.manager.active_many(['books'], 'input 2', exclusive=True)
+        switch.enabled_for_all.assert_called_with('input 2')
+
+    def test_raises_value_error_for_unknown_switch(self):
+        assert_raises(ValueError, self.manager.active_many, ['books', 'junk'])
+
+    def test_autocreates_unknown_switches(self):
+        self.manager.autocreate = True
+        eq_(self.manager.active_many(['junk']), {'junk': False})
+        ok_('junk' in self.manager)
+
+    def test_shares_one_evaluation_context(self):
+        contexts = set()
+
+        def record(*inputs):
+            contexts.add(self.manager.context)
+            return True
+
+        for name in ('movies', 'books'):
+            switch = self.manager.storage['default.' + name]
+            switch.state = Switch.states.SELECTIVE
+            switch.enabled_for_all.side_effect = record
+
+        self.manager.active_many(['movies', 'books'])
+        eq_(len(contexts), 1)
+        ok_(None not in contexts)
+        ok_(self.manager.context is None)
+
+
+class ConcentChainTest(Exam, unittest2.TestCase):
+    names = ('a', 'a:b', 'a:b:c', 'a:b:c:d')
+
+    @fixture
+    def manager(self):
+        return Manager(storage=CountingDict())
+
+    @before
+    def register_switches(self):
+        for name in self.names:
+            switch = Switch(name, state=Switch.states.GLOBAL)
+            switch.enabled_for_all = mock.Mock(wraps=switch.enabled_for_all)
+            self.manager.register(switch)
+
+        self.manager.input('input 1', 'input 2')
+
+    def switch(self, name):
+        return self.manager.storage['default.' + name]
+
+    def test_loads_each_ancestor_once(self):
+        ok_(self.manager.active('a:b:c:d') is True)
+        eq_(sorted(self.manager.storage.gets), ['default.' + n for n in self.names])
+
+    def test_checks_ancestors_against_the_original_inputs(self):
+        self.manager.active('a:b:c:d', 'input 3')
+
+        for name in self.names:
+            self.switch(name).enabled_for_all.assert_called_once_with(
+                'input 1', 'input 2', 'input 3'
+            )
+
+    def test_stops_at_the_first_disabled_ancestor(self):
+        self.switch('a:b').state = Switch.states.DISABLED
+        ok_(self.manager.active('a:b:c:d') is False)
+
+        eq_(self.switch('a:b:c').enabled_for_all.called, False)
+        eq_(self.switch('a:b:c:d').enabled_for_all.called, False)
+
+
+class EvaluationCacheTest(Exam, unittest2.TestCase):
+    @fixture
+    def manager(self):
+        return Manager(storage=MemoryDict())
+
+    @fixture
+    def switch(self):
+        switch = Switch('movies:jaws', state=Switch.states.GLOBAL)
+        switch.enabled_for_all = mock.Mock(wraps=switch.enabled_for_all)
+        return switch
+
+    @before
+    def register_switches(self):
+        self.manager.register(Switch('movies', state=Switch.states.GLOBAL))
+        self.manager.register(self.switch)
+
+    def test_results_are_not_cached_by_default(self):
+        self.manager.active('movies:jaws', 'input')
+        self.manager.active('movies:jaws', 'input')
+        eq_(self.switch.enabled_for_all.call_count, 2)
+
+    def test_caches_results_by_name_and_input_identity(self):
+        inpt = object()
+
+        with self.manager.evaluation_cache() as cache:
+            ok_(self.manager.active('movies:jaws', inpt) is True)
+            ok_(self.manager.active('movies:jaws', inpt) is True)
+            eq_(self.switch.enabled_for_all.call_count, 1)
+
+            self.manager.active('movies:jaws', object())
+            eq_(self.switch.enabled_for_all.call_count, 2)
+
+        eq_((cache.hits, cache.misses), (1, 2))
+        ok_(self.manager.cache is None)
+
+    def test_ancestors_checked_by_active_are_cached(self):
+        with self.manager.evaluation_cache() as cache:
+            self.manager.active('movies:jaws')
+            eq_(len(cache), 2)
+            self.manager.active('movies')
+
+        eq_((cache.hits, cache.misses), (1, 1))
+
+    def test_active_many_uses_cache(self):
+        with self.manager.evaluation_cache() as cache:
+            self.manager.active('movies:jaws')
+            eq_(
+                self.manager.active_many(['movies', 'movies:jaws']),
+                {'movies': True, 'movies:jaws': True}
+            )
+
+        eq_(self.switch.enabled_for_all.call_count, 1)
+        eq_((cache.hits, cache.misses), (2, 1))
+
+    def test_cache_is_cleared_when_switches_change(self):
+        with self.manager.evaluation_cache():
+            ok_(self.manager.active('movies:jaws') is True)
+
+            self.switch.state = Switch.states.DISABLED
+            self.switch.save()
+            ok_(self.manager.active('movies:jaws') is False)
+
+            self.manager.unregister('movies')
+            assert_raises(ValueError, self.manager.active, 'movies:jaws')
+
+    def test_request_cache_is_scoped_by_input_and_flush(self):
+        manager = Manager(storage=MemoryDict(), request_cache=True)
+        ok_(manager.cache is None)
+
+        manager.input('input')
+        first = manager.cache
+        ok_(first is not None)
+
+        manager.input('input')
+        ok_(manager.cache is not first)
+
+        manager.flush()
+        ok_(manager.cache is None)
+
+    def test_cache_is_not_shared_between_threads(self):
+        caches = []
+
+        with self.manager.evaluation_cache():
+            thread = threading.Thread(target=lambda: caches.append(self.manager.cache))
+            thread.start()
+            thread.join()
+
+        eq_(caches, [None])
+
+
+class ConditionStatsTest(Exam, unittest2.TestCase):
+    @fixture
+    def stats(self):
+        return ConditionStats()
+
+    @around
+    def every_condition_takes_a_second(self):
+        with mock.patch('gutter.client.models.time') as time:
+            time.time.side_effect = itertools.count().next
+            yield
+
+    @fixture
+    def conditions(self):
+        return set([
+            Condition(CountingArgument, 'value', Equals(value=1)),
+            Condition(CountingArgument, 'value', MoreThan(lower_limit=0)),
+        ])
+
+    def call_each(self, inputs):
+        context = EvaluationContext()
+
+        for condition in self.conditions:
+            for inpt in inputs:
+                self.stats.call(condition, inpt, context)
+
+    def by_operator(self, ranked):
+        return [type(condition.operator) for condition in ranked]
+
+    def test_call_returns_condition_result(self):
+        for condition in self.conditions:
+            eq_(self.stats.call(condition, 5, EvaluationContext()), condition.call(5))
+
+        eq_(self.stats.checks, 2)
+
+    def test_ranks_likely_true_conditions_first_when_not_compounded(self):
+        self.call_each(range(1, 11))
+        eq_(self.by_operator(self.stats.ranked(self.conditions, False)), [MoreThan, Equals])
+
+    def test_ranks_likely_false_conditions_first_when_compounded(self):
+        self.call_each(range(1, 11))
+        eq_(self.by_operator(self.stats.ranked(self.conditions, True)), [Equals, MoreThan])
+
+    def test_unchecked_conditions_are_ranked_first(self):
+        condition = Condition(CountingArgument, 'value', MoreThan(lower_limit=0))
+        self.stats.call(condition, 5, EvaluationContext())
+        self.conditions.add(condition)
+
+        ok_(self.stats.ranked(self.conditions, False)[-1] is condition)
+
+    def test_rankings_are_kept_until_rerank(self):
+        ranked = self.stats.ranked(self.conditions, False)
+        self.call_each(range(1, 11))
+        ok_(self.stats.ranked(self.conditions, False) is ranked)
+
+        self.stats.rerank()
+        ok_(self.stats.ranked(self.conditions, False) is not ranked)
+
+    def test_reranks_every_rerank_interval_checks(self):
+        self.stats.rerank_interval = 4
+        ranked = self.stats.ranked(self.conditions, False)
+
+        self.call_each([1])
+        ok_(self.stats.ranked(self.conditions, False) is ranked)
+
+        self.call_each([1])
+        ok_(self.stats.ranked(self.conditions, False) is not ranked)
+
+    def test_conditions_list_reranks_when_mutated(self):
+        conditions = ConditionsList(self.conditions)
+        ranked = conditions.stats.ranked(self.conditions, False)
+
+        conditions.append(Condition(CountingArgument, 'value', Equals(value=2)))
+        ok_(conditions.stats.ranked(self.conditions, False) is not ranked)
+
+
+class AdaptiveManagerTest(Exam, unittest2.TestCase):
+    @fixture
+    def manager(self):
+        return Manager(storage=dict(), adaptive=True)
+
+    def switch(self, compounded):
+        switch = Switch('switch', state=Switch.states.SELECTIVE, compounded=compounded)
+        switch.conditions = [
+            Condition(CountingArgument, 'value', Equals(value=1)),
+            Condition(CountingArgument, 'value', MoreThan(lower_limit=0), negative=True),
+            Condition(CountingArgument, 'value', MoreThan(lower_limit=5)),
+        ]
+        return switch
+
+    def test_adaptive_defaults_to_false(self):
+        eq_(Manager(storage=dict()).adaptive, False)
+
+    def test_namespaced_managers_inherit_adaptive(self):
+        ok_(self.manager.namespaced('ns').adaptive is True)
+
+    def test_results_match_unordered_checks(self):
+        plain = Manager(storage=dict())
+
+        for compounded in (True, False):
+            switch = self.switch(compounded)
+            switch.conditions.stats.rerank_interval = 3
+            self.manager.register(switch)
+            plain.register(self.switch(compounded))
+
+            for value in range(-3, 10) * 3:
+                eq_(
+                    self.manager.active('switch', value),
+                    plain.active('switch', value),
+                    (compounded, value)
+                )
+
+    def test_records_stats_only_when_adaptive(self):
+        switch = self.switch(False)
+        self.manager.register(switch)
+        self.manager.active('switch', 7)
+        ok_(switch.conditions.stats.checks > 0)
+
+        switch = self.switch(False)
+        Manager(storage=dict()).register(switch)
+        switch.manager.active('switch', 7)
+        eq_(switch.conditions.stats.checks, 0)
+
+
+class BatchDict(dict):
+    """
+    A storage with ``set_many`` and ``delete_many``, which can be made to fail
+    after writing some of a batch.
+    """
+
+    fail_after = None
+
+    def set_many(self, items):
+        for count, (key, value) in enumerate(sorted(items.items())):
+            if count == self.fail_after:
+                raise IOError('storage down')
+            self[key] = value
+
+    def delete_many(self, keys):
+        for key in keys:
+            del self[key]
+
+
+class FailingDict(dict):
+
+    fail_on = None
+
+    def __setitem__(self, key, value):
+        if key == self.fail_on:
+            raise IOError('storage down')
+        super(FailingDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if key == self.fail_on:
+            raise IOError('storage down')
+        super(FailingDict, self).__delitem__(key)
+
+
+class BulkManagerTest(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        return FailingDict()
+
+    @fixture
+    def manager(self):
+        return Manager(storage=self.storage)
+
+    @fixture
+    def switches(self):
+        return [Switch(name, state=Switch.states.GLOBAL) for name in ('a', 'b', 'c')]
+
+    @around
+    def connect_signals(self):
+        self.batches = []
+        self.registered = []
+        signals.switches_registered.connect(self.batches.append)
+        signals.switches_updated.connect(self.batches.append)
+        signals.switches_unregistered.connect(self.batches.append)
+        signals.switch_registered.connect(self.registered.append)
+        yield
+        for signal in (
+            signals.switches_registered,
+            signals.switches_updated,
+            signals.switches_unregistered,
+            signals.switch_registered
+        ):
+            signal.reset()
+
+    def test_register_many_registers_every_switch(self):
+        self.manager.register_many(self.switches)
+
+        eq_(sorted(self.manager.switches, key=lambda switch: switch.name), self.switches)
+        ok_(all(switch.manager is self.manager for switch in self.switches))
+        ok_(self.manager.active('b') is True)
+
+    def test_register_many_sends_one_batch_signal(self):
+        self.manager.register_many(self.switches)
+
+        eq_(self.batches, [self.switches])
+        eq_(self.registered, self.switches)
+
+    def test_register_many_rejects_blank_names_before_writing(self):
+        assert_raises(ValueError, self.manager.register_many, self.switches + [Switch('')])
+        eq_(self.storage, {})
+
+    def test_register_many_uses_storage_set_many(self):
+        manager = Manager(storage=BatchDict())
+
+        with mock.patch.object(BatchDict, '__setitem__') as setitem:
+            manager.register_many(self.switches)
+
+        eq_(setitem.call_count, 3)
+
+        with mock.patch.object(BatchDict, 'set_many') as set_many:
+            manager.register_many(self.switches)
+
+        set_many.assert_called_once_with(
+            dict(('default.' + switch.name, switch) for switch in self.switches)
+        )
+
+    def test_register_many_rolls_back_a_failed_batch(self):
+        existing = Switch('a', state=Switch.states.DISABLED)
+        self.manager.register(existing)
+        self.storage.fail_on = 'default.c'
+
+        assert_raises(IOError, self.manager.register_many, self.switches)
+
+        eq_(self.storage, {'default.a': existing})
+        eq_(self.batches, [])
+
+    def test_register_many_drops_caches_after_a_failed_batch(self):
+        storage = BatchDict()
+        storage.fail_after = 1
+        index = KeyIndex()
+        manager = Manager(storage=storage, key_index=index)
+        manager.switches
+
+        assert_raises(IOError, manager.register_many, self.switches)
+
+        eq_(manager.switches, [storage['default.a']])
+
+    def test_update_many_sends_updated_signal_and_resets_changes(self):
+        self.manager.register_many(self.switches)
+        for switch in self.switches:
+            switch.state = Switch.states.DISABLED
+
+        self.manager.update_many(self.switches)
+
+        eq_(self.batches, [self.switches, self.switches])
+        ok_(not any(switch.changed for switch in self.switches))
+        ok_(self.manager.active('a') is False)
+
+    def test_unregister_many_removes_switches_and_children(self):
+        self.manager.register_many(self.switches + [Switch('a:child')])
+        self.manager.unregister_many(['a', self.switches[1]])
+
+        eq_(self.manager.switches, [self.switches[2]])
+        eq_([switch.name for switch in self.batches[-1]], ['b', 'a:child', 'a'])
+
+    def test_unregister_many_signals_each_switch_before_deleting_it(self):
+        self.manager.register_many(self.switches)
+        stored = []
+
+        def check_stored(switch):
+            stored.append(self.manager.switch(switch.name) == switch)
+
+        signals.switch_unregistered.connect(check_stored)
+        self.addCleanup(signals.switch_unregistered.reset)
+
+        self.manager.unregister_many(['a', 'b'])
+
+        eq_(stored, [True, True])
+        eq_(self.manager.switches, [self.switches[2]])
+
+    def test_unregister_many_restores_a_failed_batch(self):
+        self.manager.register_many(self.switches)
+        self.storage.fail_on = 'default.a'
+
+        assert_raises(IOError, self.manager.unregister_many, ['a', 'b'])
+
+        eq_(sorted(self.manager.switches, key=lambda switch: switch.name), self.switches)
+        eq_(len(self.batches), 1)
+
+    def test_unregister_many_uses_storage_delete_many(self):
+        manager = Manager(storage=BatchDict())
+        manager.register_many(self.switches)
+
+        with mock.patch.object(BatchDict, 'delete_many') as delete_many:
+            manager.unregister_many(['a', 'c'])
+
+        delete_many.assert_called_once_with(['default.c', 'default.a'])
+
+
 class EmptyManagerInstanceTest(ActsLikeManager, unittest2.TestCase):
     def test_input_accepts_variable_input_args(self):
         eq_(self.manager.inputs, [])
@@ -699,7 +1463,7 @@ class NamespacedEmptyManagerInstanceTest(EmptyManagerInstanceTest):
 
 class ManagerWithInputTest(Exam, ActsLikeManager, unittest2.TestCase):
     def build_and_register_switch(self, name, enabled_for=False):
-        switch = Switch(name)
+        switch = Switch(name, state=Switch.states.SELECTIVE)
         switch.enabled_for = mock.Mock(return_value=enabled_for)
         self.manager.register(switch)
         return switch
@@ -1,10 +1,17 @@
+import pickle
 import unittest2
+from decimal import Decimal
+from random import Random
+
 from nose.tools import *  # noqa
+import mock
 
+from gutter.client.arguments.variables import Boolean, String, Value
 from gutter.client.operators import OperatorInitError
 from gutter.client.operators.comparable import *  # noqa
 from gutter.client.operators.identity import *  # noqa
 from gutter.client.operators.misc import *  # noqa
+from gutter.client.operators.network import *  # noqa
 from gutter.client.operators.string import *  # noqa
 
 from exam.decorators import fixture
@@ -109,6 +116,144 @@ class TestEqualsStripIgnoreCaseCondition(TestEqualsCondition):
         eq_(self.str, 'strip ignore case equal to "fred"')
 
 
+class TestInCondition(BaseOperator, unittest2.TestCase):
+
+    def make_operator(self):
+        return In(values=['Fred', 'Steve', 42])
+
+    def test_applies_to_if_argument_is_equal_to_any_value(self):
+        ok_(self.operator.applies_to('Fred'))
+        ok_(self.operator.applies_to('Steve'))
+        ok_(self.operator.applies_to(42))
+        ok_(self.operator.applies_to(42.0))
+        ok_(self.operator.applies_to('fred') is False)
+        ok_(self.operator.applies_to('') is False)
+        ok_(self.operator.applies_to(None) is False)
+
+    def test_applies_to_the_value_of_variables(self):
+        ok_(self.operator.applies_to(Value('Fred')))
+        ok_(self.operator.applies_to(Boolean(42, hash_value=1)))
+        ok_(self.operator.applies_to(Value('Jeff')) is False)
+
+    def test_decides_as_any_equals_condition_would(self):
+        values = range(0, 1000, 7)
+        equals = [Equals(value=value) for value in values]
+        operator = In(values)
+
+        for argument in range(-10, 1010):
+            eq_(
+                operator.applies_to(argument),
+                any(equal.applies_to(argument) for equal in equals)
+            )
+
+    def test_unhashable_arguments_are_in_no_set(self):
+        ok_(self.operator.applies_to(['Fred']) is False)
+
+    def test_values_are_a_frozenset(self):
+        eq_(self.operator.values, frozenset(['Fred', 'Steve', 42]))
+        eq_(In(values=iter('aab')).values, frozenset('ab'))
+
+    def test_a_single_string_is_one_value(self):
+        operator = type(self.operator)('Fred')
+
+        eq_(operator.values, frozenset(['Fred']))
+        eq_(operator.applies_to('F'), self.operator.applies_to('Jeff'))
+
+    def test_pickles_values_as_sorted_list(self):
+        eq_(self.operator.__getstate__(), dict(values=[42, 'Fred', 'Steve']))
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            operator = pickle.loads(pickle.dumps(self.operator, protocol))
+            eq_(operator, self.operator)
+            eq_(type(operator.values), frozenset)
+
+    def test_str_says_is_in_values(self):
+        eq_(self.str, 'in "42", "Fred", "Steve"')
+
+    def test_variables_is_sorted_list_of_values(self):
+        eq_(self.operator.variables, dict(values=[42, 'Fred', 'Steve']))
+
+    def test_arguments_is_values(self):
+        eq_(self.operator.arguments, ('values',))
+
+
+class TestNotInCondition(TestInCondition):
+
+    def make_operator(self):
+        return NotIn(values=['Fred', 'Steve', 42])
+
+    def test_applies_to_if_argument_is_equal_to_any_value(self):
+        ok_(self.operator.applies_to('Fred') is False)
+        ok_(self.operator.applies_to(42.0) is False)
+        ok_(self.operator.applies_to('fred'))
+        ok_(self.operator.applies_to(None))
+
+    def test_applies_to_the_value_of_variables(self):
+        ok_(self.operator.applies_to(Value('Fred')) is False)
+        ok_(self.operator.applies_to(Value('Jeff')))
+
+    def test_decides_as_any_equals_condition_would(self):
+        operator = NotIn(range(0, 1000, 7))
+
+        for argument in range(-10, 1010):
+            eq_(operator.applies_to(argument), argument % 7 != 0 or not 0 <= argument < 1000)
+
+    def test_unhashable_arguments_are_in_no_set(self):
+        ok_(self.operator.applies_to(['Fred']))
+
+    def test_str_says_is_in_values(self):
+        eq_(self.str, 'not in "42", "Fred", "Steve"')
+
+
+class TestInStripIgnoreCaseCondition(BaseOperator, unittest2.TestCase):
+
+    def make_operator(self):
+        return InStripIgnoreCase(values=['Fred ', 'STEVE'])
+
+    def test_applies_to_if_argument_is_equal_to_any_value(self):
+        ok_(self.operator.applies_to('fred'))
+        ok_(self.operator.applies_to(' Steve '))
+        ok_(self.operator.applies_to(String(' FRED')))
+        ok_(self.operator.applies_to('Jeff') is False)
+        ok_(self.operator.applies_to('') is False)
+
+    def test_decides_as_any_equals_strip_ignore_case_condition_would(self):
+        values = ['Fred ', 'STEVE', ' jeff']
+        operator = InStripIgnoreCase(values)
+
+        for argument in ['fred', 'Fred', ' STEVE', 'steven', 'JEFF ', 'je ff', 1, True]:
+            eq_(
+                operator.applies_to(argument),
+                any(EqualsStripIgnoreCase(value=value).applies_to(argument) for value in values)
+            )
+
+    def test_values_are_stripped_and_lower_cased(self):
+        eq_(self.operator.values, frozenset(['fred', 'steve']))
+
+    def test_a_single_string_is_one_value(self):
+        eq_(InStripIgnoreCase(' Fred').values, frozenset(['fred']))
+
+    def test_str_says_is_in_values(self):
+        eq_(self.str, 'strip ignore case in "fred", "steve"')
+
+    def test_variables_is_sorted_list_of_values(self):
+        eq_(self.operator.variables, dict(values=['fred', 'steve']))
+
+
+class TestNotInStripIgnoreCaseCondition(BaseOperator, unittest2.TestCase):
+
+    def make_operator(self):
+        return NotInStripIgnoreCase(values=['Fred ', 'STEVE'])
+
+    def test_applies_to_if_argument_is_not_equal_to_any_value(self):
+        ok_(self.operator.applies_to('fred') is False)
+        ok_(self.operator.applies_to(' Steve ') is False)
+        ok_(self.operator.applies_to('Jeff'))
+
+    def test_str_says_is_not_in_values(self):
+        eq_(self.str, 'strip ignore case not in "fred", "steve"')
+
+
 class TestBetweenCondition(BaseOperator, unittest2.TestCase):
 
     def make_operator(self, lower=1, higher=100):
@@ -334,3 +479,271 @@ class PercentRangeTest(PercentTest, unittest2.TestCase):
 
     def test_variables_is_lower_and_upper(self):
         eq_(self.operator.variables, dict(lower_limit=10, upper_limit=20))
+
+    def test_decides_exactly_as_decimal_arithmetic(self):
+        random = Random(0)
+        operators = [
+            self.range_of(10, 20.5),
+            self.range_of(0, 0.99),
+            self.range_of(-1, 1),
+            self.range_of(50, 100),
+            self.range_of('1e-5', '99.99999999'),
+            Percent(33.3),
+        ]
+        arguments = [
+            0, -1, 100, -100, 10 ** 30 - 1, 10 ** 30, True, False, -0.0, 1e-5,
+            1e30, -2.5, float('inf'), 'jeff', '12', ' 12.5 ', '-3.25', '1E+2',
+            'NaN', '.5', u'caf', '0.' + '1' * 40, '-1e-27', '0e99999', (1, 2),
+            Value(12345), Value(-7), Value('jeff'), Value(12.5), String('jeff'),
+            Boolean(True, hash_value=37), Boolean(False, hash_value=-3),
+        ]
+        arguments.extend(random.randint(-10 ** 6, 10 ** 6) for _ in range(500))
+        arguments.extend(
+            random.uniform(-1, 1) * 10 ** random.randint(-40, 40)
+            for _ in range(500)
+        )
+        arguments.extend(str(random.uniform(-1000, 1000)) for _ in range(500))
+
+        def outcome(applies_to, argument):
+            try:
+                return applies_to(argument)
+            except Exception as error:
+                return type(error)
+
+        for operator in operators:
+            for argument in arguments:
+                eq_(
+                    outcome(operator.applies_to, argument),
+                    outcome(operator._decimal_applies_to, argument),
+                    (operator, argument)
+                )
+
+    def test_checks_variables_by_their_hash_without_decimal(self):
+        with mock.patch.object(
+            self.operator,
+            '_decimal_applies_to',
+            side_effect=AssertionError
+        ):
+            ok_(self.operator.applies_to(Value(15)))
+            ok_(not self.operator.applies_to(Value(25)))
+            ok_(self.operator.applies_to(Value(115)))
+            ok_(self.operator.applies_to(Boolean(True, hash_value=12)))
+
+    def test_fixed_point_limits_are_not_variables(self):
+        self.operator.applies_to(15)
+
+        eq_(sorted(vars(self.operator)), ['lower_limit', 'upper_limit'])
+        eq_(self.operator, self.range_of(10, 20))
+
+    def test_changing_limits_recomputes_fixed_point_limits(self):
+        ok_(self.operator.applies_to(15))
+
+        self.operator.upper_limit = Decimal('15')
+        ok_(not self.operator.applies_to(15))
+
+    def test_can_be_pickled_with_any_protocol(self):
+        self.operator.applies_to(15)
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            operator = pickle.loads(pickle.dumps(self.operator, protocol))
+            eq_(operator, self.operator)
+            ok_(operator.applies_to(15))
+
+
+class StablePercentRangeTest(PercentTest, unittest2.TestCase):
+
+    def make_operator(self):
+        return self.range_of(10, 20)
+
+    def range_of(self, lower, upper, salt='switch'):
+        return StablePercentRange(lower_limit=lower, upper_limit=upper, salt=salt)
+
+    def test_can_apply_to_a_certain_percent_range(self):
+        self.assertAlmostEqual(self.successful_runs(1000), 100, delta=30)
+
+    def test_percentage_ranges_partition_arguments(self):
+        ranges = [self.range_of(lower, lower + 10) for lower in range(0, 100, 10)]
+
+        for argument in range(1000):
+            eq_(sum(r.applies_to(argument) for r in ranges), 1, argument)
+
+    def test_decides_the_same_for_equal_arguments(self):
+        for argument in range(1000):
+            eq_(self.operator.applies_to(argument), self.operator.applies_to(str(argument)))
+            eq_(self.operator.applies_to(argument), self.operator.applies_to(Value(argument)))
+
+    def test_decides_by_the_hash_value_of_booleans(self):
+        for argument in range(1000):
+            eq_(
+                self.operator.applies_to(Boolean(True, hash_value=argument)),
+                self.operator.applies_to(argument)
+            )
+
+    def test_salts_decide_independently(self):
+        other = self.range_of(10, 20, salt='other switch')
+        decisions = [(self.operator.applies_to(i), other.applies_to(i)) for i in range(1000)]
+
+        assert_not_equals(*zip(*decisions))
+
+    def test_limits_are_exact_to_a_hundredth_of_a_percent(self):
+        operator = self.range_of(0, 0.01)
+        in_range = [i for i in range(100000) if operator.applies_to(i)]
+
+        self.assertAlmostEqual(len(in_range), 10, delta=8)
+
+        for argument in in_range:
+            ok_(self.range_of(0, '0.01').applies_to(argument))
+            ok_(not self.range_of(0.01, 100).applies_to(argument))
+
+    def test_never_applies_to_arguments_without_a_stable_hash(self):
+        operator = self.range_of(0, 100)
+
+        ok_(operator.applies_to('anything'))
+        ok_(not operator.applies_to(object()))
+        ok_(not operator.applies_to(Value(object())))
+
+    def test_str_says_applies_to_percentage_range_of_values(self):
+        eq_(self.str, "in 10.0 - 20.0% of values by 'switch'")
+
+    def test_variables_is_lower_and_upper_and_salt(self):
+        eq_(self.operator.variables, dict(lower_limit=10, upper_limit=20, salt='switch'))
+
+    def test_changing_salt_recomputes_salt_hash(self):
+        decisions = map(self.operator.applies_to, range(100))
+
+        self.operator.salt = 'other switch'
+        assert_not_equals(map(self.operator.applies_to, range(100)), decisions)
+
+        self.operator.salt = 'switch'
+        eq_(map(self.operator.applies_to, range(100)), decisions)
+
+    def test_can_be_pickled_with_any_protocol(self):
+        decisions = map(self.operator.applies_to, range(100))
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            operator = pickle.loads(pickle.dumps(self.operator, protocol))
+            eq_(operator, self.operator)
+            eq_(map(operator.applies_to, range(100)), decisions)
+
+
+class StablePercentTest(PercentTest, unittest2.TestCase):
+
+    def make_operator(self):
+        return StablePercent(percentage=50, salt='switch')
+
+    def test_applies_to_percentage_passed_in(self):
+        self.assertAlmostEqual(self.successful_runs(1000), 500, delta=50)
+
+    def test_decides_as_a_range_from_zero(self):
+        operator = StablePercentRange(0, 50, salt='switch')
+
+        for argument in range(1000):
+            eq_(self.operator.applies_to(argument), operator.applies_to(argument))
+
+    def test_str_says_applies_to_percentage_of_values(self):
+        eq_(self.str, "in 50.0% of values by 'switch'")
+
+    def test_variables_is_percentage_and_salt(self):
+        eq_(self.operator.variables, dict(percentage=50, salt='switch'))
+
+
+class InNetworkTest(BaseOperator, unittest2.TestCase):
+
+    def make_operator(self):
+        return InNetwork(networks=['10.0.0.0/8', '192.168.1.7', '2001:db8::/32'])
+
+    def test_applies_to_addresses_in_any_network(self):
+        ok_(self.operator.applies_to('10.0.0.0'))
+        ok_(self.operator.applies_to('10.255.255.255'))
+        ok_(self.operator.applies_to('192.168.1.7'))
+        ok_(self.operator.applies_to(u'2001:db8:ffff::1'))
+        ok_(self.operator.applies_to('11.0.0.0') is False)
+        ok_(self.operator.applies_to('192.168.1.8') is False)
+        ok_(self.operator.applies_to('2001:db9::') is False)
+
+    def test_applies_to_the_value_of_variables(self):
+        ok_(self.operator.applies_to(String('10.1.2.3')))
+        ok_(self.operator.applies_to(Value('11.1.2.3')) is False)
+
+    def test_applies_to_ipv4_addresses_mapped_into_ipv6(self):
+        ok_(self.operator.applies_to('::ffff:10.1.2.3'))
+        ok_(self.operator.applies_to('::ffff:11.1.2.3') is False)
+        ok_(InNetwork(['::ffff:10.0.0.0/104']).applies_to('10.1.2.3'))
+
+    def test_anything_but_an_address_is_in_no_network(self):
+        for argument in ('', 'jeff', '10.0.0', '10.0.0.0/8', u'10.0.0.\xe9', None, 167772160, ['10.0.0.1']):
+            ok_(self.operator.applies_to(argument) is False, argument)
+
+    def test_decides_as_checking_each_network_would(self):
+        random = Random(0)
+        networks = [
+            '%d.%d.0.0/%d' % (random.randint(0, 255), random.randint(0, 255), random.randint(8, 24))
+            for _ in range(200)
+        ]
+        operator = InNetwork(networks)
+        parsed = map(parse_network, networks)
+
+        for _ in range(2000):
+            address = '.'.join(str(random.randint(0, 255)) for _ in range(4))
+            _, value = parse_address(address)
+
+            eq_(
+                operator.applies_to(address),
+                any(first <= value <= last for _, first, last in parsed),
+                address
+            )
+
+    def test_rejects_invalid_networks(self):
+        for network in ('jeff', '10.0.0.0/33', '10.0.0.0/-1', '2001:db8::/129', '::ffff:10.0.0.0/95', '10.0.0.0/x', None):
+            assert_raises(ValueError, InNetwork, [network])
+
+    def test_changing_networks_recompiles_ranges(self):
+        ok_(self.operator.applies_to('10.0.0.1'))
+
+        self.operator.networks = InNetwork(['11.0.0.0/8']).networks
+        ok_(self.operator.applies_to('10.0.0.1') is False)
+        ok_(self.operator.applies_to('11.0.0.1'))
+
+    def test_can_be_pickled_with_any_protocol(self):
+        self.operator.applies_to('10.0.0.1')
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            operator = pickle.loads(pickle.dumps(self.operator, protocol))
+            eq_(operator, self.operator)
+            ok_(operator.applies_to('10.0.0.1'))
+            eq_(vars(operator).keys(), ['networks'])
+
+    def test_pickles_networks_in_cidr_notation(self):
+        eq_(self.operator.__getstate__(), self.operator.variables)
+        ok_('10.0.0.0/8' in pickle.dumps(self.operator))
+
+    def test_loads_networks_pickled_as_ranges(self):
+        operator = InNetwork.__new__(InNetwork)
+        operator.__setstate__(dict(networks=self.operator.networks))
+
+        eq_(operator, self.operator)
+        ok_(operator.applies_to('10.0.0.1'))
+
+    def test_str_lists_normalized_networks(self):
+        eq_(self.str, 'in network 10.0.0.0/8, 192.168.1.7/32, 2001:db8::/32')
+
+    def test_variables_is_sorted_normalized_networks(self):
+        eq_(
+            InNetwork(['2001:DB8::1/32', '10.1.2.3/8', '10.0.0.0/8']).variables,
+            dict(networks=['10.0.0.0/8', '2001:db8::/32'])
+        )
+
+
+class NotInNetworkTest(BaseOperator, unittest2.TestCase):
+
+    def make_operator(self):
+        return NotInNetwork(networks=['10.0.0.0/8'])
+
+    def test_applies_to_anything_not_in_the_networks(self):
+        ok_(self.operator.applies_to('10.1.2.3') is False)
+        ok_(self.operator.applies_to('11.1.2.3'))
+        ok_(self.operator.applies_to('::1'))
+        ok_(self.operator.applies_to('jeff'))
+
+    def test_str_lists_normalized_networks(self):
+        eq_(self.str, 'not in network 10.0.0.0/8')
@@ -0,0 +1,296 @@
+import unittest2
+import warnings
+from random import Random
+
+from nose.tools import *  # noqa
+import mock
+
+from gutter.client import arguments, signals
+from gutter.client.compiler import compiled
+from gutter.client.models import Condition, Switch
+from gutter.client.operators.comparable import (
+    Between,
+    Equals,
+    In,
+    LessThan,
+    LessThanOrEqualTo,
+    MoreThan,
+    MoreThanOrEqualTo,
+)
+from gutter.client.operators.identity import Truthy
+from gutter.client.operators.string import EqualsStripIgnoreCase
+from gutter.client.optimizer import EqualsAny, InIntervals, optimize, union
+
+NAN = float('nan')
+INFINITY = float('inf')
+
+VALUES = [
+    0, 1, 2, 5, -3, 7, 1.0, 2.5, -0.0, 10 ** 20, True, False, None, NAN,
+    INFINITY, -INFINITY, 'a', u'a', 'b', ' A', '5', u'caf\xe9', 'caf\xc3\xa9',
+]
+
+LIMITS = [0, 1, 2, 5, -3, 7, 1.0, 2.5, 10 ** 20, True, NAN, INFINITY, -INFINITY, 'b']
+
+
+class Thing(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+class RawArguments(arguments.Container):
+    COMPATIBLE_TYPE = Thing
+
+    @property
+    def value(self):
+        return self.input.value
+
+
+class VariableArguments(arguments.Container):
+    COMPATIBLE_TYPE = Thing
+
+    value = arguments.Value('value')
+    string = arguments.String('value')
+    float = arguments.Float('value')
+    boolean = arguments.Boolean('value', hash_value='value')
+
+
+ATTRIBUTES = [
+    (RawArguments, 'value'),
+    (VariableArguments, 'value'),
+    (VariableArguments, 'string'),
+    (VariableArguments, 'float'),
+    (VariableArguments, 'boolean'),
+]
+
+
+def random_operator(random):
+    def limit():
+        return random.choice(LIMITS)
+
+    return random.choice([
+        lambda: Equals(value=random.choice(VALUES)),
+        lambda: Equals(value=random.choice(VALUES)),
+        lambda: Between(lower_limit=limit(), upper_limit=limit()),
+        lambda: LessThan(upper_limit=limit()),
+        lambda: LessThanOrEqualTo(upper_limit=limit()),
+        lambda: MoreThan(lower_limit=limit()),
+        lambda: MoreThanOrEqualTo(lower_limit=limit()),
+        lambda: Truthy(),
+        lambda: EqualsStripIgnoreCase(value='a'),
+        lambda: In(random.sample([0, 1, 5, 'a', None], 2)),
+    ])()
+
+
+def random_conditions(random):
+    attributes = random.sample(ATTRIBUTES, random.randint(1, 2))
+    conditions = []
+
+    for _ in range(random.randint(1, 12)):
+        argument, attribute = random.choice(attributes)
+        conditions.append(Condition(
+            argument,
+            attribute,
+            random_operator(random),
+            negative=random.random() < 0.3
+        ))
+
+    # Repeat some conditions, to be dropped as duplicates
+    conditions.extend(random.sample(conditions, random.randint(0, len(conditions) // 2)))
+    return conditions
+
+
+class TestOptimizerEquivalence(unittest2.TestCase):
+
+    def switches(self, conditions, compounded):
+        switches = []
+
+        for optimized in (False, True):
+            switch = Switch('switch', state=Switch.states.SELECTIVE, compounded=compounded)
+            switch.conditions = list(conditions)
+            switch.conditions.optimize = optimized
+            switches.append(switch)
+
+        return switches
+
+    def test_optimized_switches_decide_as_unoptimized_ones(self):
+        random = Random(0)
+        inputs = [Thing(value) for value in VALUES]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UnicodeWarning)
+
+            for _ in range(400):
+                conditions = random_conditions(random)
+                compounded = random.random() < 0.5
+                unoptimized, optimized = self.switches(conditions, compounded)
+
+                for inpt in inputs:
+                    expected = unoptimized.enabled_for(inpt)
+                    message = (conditions, compounded, inpt.value)
+
+                    eq_(optimized.enabled_for(inpt), expected, message)
+                    eq_(compiled(optimized)(inpt), bool(expected) if expected is not None else compounded, message)
+
+    def test_merges_conditions_and_drops_duplicates(self):
+        random = Random(1)
+        merged = 0
+
+        for _ in range(200):
+            conditions = random_conditions(random)
+            compounded = random.random() < 0.5
+            optimized = optimize(conditions, compounded)
+
+            ok_(len(optimized) <= len(conditions))
+            merged += len(conditions) - len(optimized)
+
+        ok_(merged)
+
+
+class TestOptimize(unittest2.TestCase):
+
+    def condition(self, operator, negative=False, attribute='value'):
+        return Condition(VariableArguments, attribute, operator, negative=negative)
+
+    def test_merges_equals_on_the_same_attribute_into_one_lookup(self):
+        conditions = [self.condition(Equals(value=value)) for value in range(100)]
+        conditions.append(self.condition(Equals(value=1), attribute='string'))
+
+        optimized = optimize(conditions, compounded=False)
+
+        eq_(len(optimized), 2)
+        eq_(type(optimized[0].operator), EqualsAny)
+        eq_(optimized[1], conditions[-1])
+
+    def test_merges_interval_comparisons_into_one_union(self):
+        conditions = [
+            self.condition(LessThan(upper_limit=0)),
+            self.condition(Between(lower_limit=10, upper_limit=20)),
+            self.condition(MoreThanOrEqualTo(lower_limit=15)),
+        ]
+
+        optimized, = optimize(conditions, compounded=False)
+
+        eq_(type(optimized.operator), InIntervals)
+        eq_(optimized.operator.union, [(-INFINITY, True, 0, False), (10, False, INFINITY, True)])
+
+    def test_only_merges_conditions_which_decide_together(self):
+        conditions = [
+            self.condition(Equals(value=1)),
+            self.condition(Equals(value=2)),
+            self.condition(Equals(value=3), negative=True),
+            self.condition(Equals(value=4), negative=True),
+        ]
+
+        eq_(
+            [(condition.negative, type(condition.operator)) for condition in optimize(conditions, False)],
+            [(True, Equals), (True, Equals), (False, EqualsAny)]
+        )
+        eq_(
+            [(condition.negative, type(condition.operator)) for condition in optimize(conditions, True)],
+            [(False, Equals), (False, Equals), (True, EqualsAny)]
+        )
+
+    def test_drops_duplicates_only_of_the_same_operator_type(self):
+        conditions = [
+            self.condition(LessThan(upper_limit=5)),
+            self.condition(LessThan(upper_limit=5)),
+            self.condition(LessThanOrEqualTo(upper_limit=5)),
+            self.condition(Equals(value=1)),
+            self.condition(Equals(value=1.0)),
+        ]
+
+        eq_(len(optimize(conditions, compounded=True)), 4)
+
+    def test_does_not_merge_equals_nan_or_unhashable_values(self):
+        conditions = [
+            self.condition(Equals(value=NAN)),
+            self.condition(Equals(value=[1])),
+            self.condition(Equals(value=1)),
+        ]
+
+        eq_(optimize(conditions, compounded=False), conditions)
+
+
+class TestUnion(unittest2.TestCase):
+
+    def test_merges_overlapping_and_touching_intervals(self):
+        eq_(
+            union([(0, True, 5, False), (5, True, 7, False), (6, False, 9, True)]),
+            [(0, True, 9, True)]
+        )
+
+    def test_keeps_a_gap_at_a_limit_neither_includes(self):
+        eq_(
+            union([(0, True, 5, False), (5, False, 7, False)]),
+            [(0, True, 5, False), (5, False, 7, False)]
+        )
+
+    def test_drops_empty_intervals(self):
+        eq_(union([(5, False, 5, True), (7, True, 3, True), (1, True, 1, True)]), [(1, True, 1, True)])
+
+
+class TestSwitchOptimization(unittest2.TestCase):
+
+    def test_is_off_by_default(self):
+        switch = Switch('switch', state=Switch.states.SELECTIVE)
+        conditions = [Condition(VariableArguments, 'value', Equals(value=value)) for value in range(10)]
+        switch.conditions = conditions
+
+        ok_(not switch.conditions.optimize)
+        eq_(switch.conditions.optimized(Thing, False), conditions)
+
+    def test_errors_send_condition_apply_error_by_default(self):
+        switch = Switch('switch', state=Switch.states.SELECTIVE)
+        switch.conditions = [Condition(VariableArguments, 'value', Equals(value=value)) for value in range(2)]
+        inpt = Thing(object())
+
+        with mock.patch.object(signals, 'condition_apply_error') as signal:
+            ok_(not switch.enabled_for(inpt))
+            ok_(not compiled(switch)(inpt))
+
+        eq_([call[0][:2] for call in signal.call.call_args_list], [
+            (condition, inpt) for condition in switch.conditions * 2
+        ])
+
+    def test_switch_conditions_are_left_as_they_are(self):
+        switch = Switch('switch', state=Switch.states.SELECTIVE)
+        conditions = [Condition(VariableArguments, 'value', Equals(value=value)) for value in range(10)]
+        switch.conditions = conditions
+        switch.conditions.optimize = True
+
+        ok_(switch.enabled_for(Thing(3)))
+        eq_(switch.conditions, conditions)
+        eq_(len(switch.conditions.optimized(Thing, False)), 1)
+
+    def test_mutating_conditions_optimizes_them_again(self):
+        switch = Switch('switch', state=Switch.states.SELECTIVE)
+        switch.conditions = [Condition(VariableArguments, 'value', Equals(value=value)) for value in range(10)]
+        switch.conditions.optimize = True
+
+        ok_(not switch.enabled_for(Thing(30)))
+
+        switch.conditions.append(Condition(VariableArguments, 'value', Equals(value=30)))
+        ok_(switch.enabled_for(Thing(30)))
+
+    def test_changing_optimize_takes_effect_on_the_next_check(self):
+        switch = Switch('switch', state=Switch.states.SELECTIVE)
+        conditions = [Condition(VariableArguments, 'value', Equals(value=value)) for value in range(10)]
+        switch.conditions = conditions
+
+        ok_(switch.enabled_for(Thing(3)))
+        ok_(compiled(switch)(Thing(3)))
+        eq_(switch.conditions.optimized(Thing, False), conditions)
+
+        switch.conditions.optimize = True
+        eq_(len(switch.conditions.optimized(Thing, False)), 1)
+
+        with mock.patch.object(signals, 'condition_apply_error') as signal:
+            ok_(not switch.enabled_for(Thing(object())))
+            ok_(not compiled(switch)(Thing(object())))
+
+        # Merged conditions don't send the signal
+        eq_(signal.call.call_count, 0)
+
+        switch.conditions.optimize = False
+        eq_(switch.conditions.optimized(Thing, False), conditions)
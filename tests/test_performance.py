@@ -0,0 +1,537 @@
+"""
+Benchmarks for the hot paths of checking switches.
+
+Tests timing them are ``PerformanceTest`` cases, tagged ``performance`` for the
+nose-performance plugin.  Timings vary from run to run and machine to machine,
+so ``setup.cfg`` leaves tagged tests out of the default run; run them with::
+
+    nosetests -a tags=performance tests/test_performance.py
+
+Tests counting the work done run with the rest of the suite.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+from nose.tools import *  # noqa
+from noseperf.testcases import PerformanceTest
+
+from exam.decorators import fixture
+
+from gutter.client import arguments
+from gutter.client import bucketing
+from gutter.client import signals
+from gutter.client.compiler import compiled
+from gutter.client.encoding import JsonPickleEncoding, SchemaEncoding
+from gutter.client.index import KeyIndex
+from gutter.client.mapped import MappedSnapshotStore, write_snapshot
+from gutter.client.models import Switch, Condition, Manager
+from gutter.client.operators.comparable import Between, Equals, In
+from gutter.client.operators.misc import PercentRange, StablePercent
+from gutter.client.operators.network import InNetwork
+from gutter.client.snapshot import SnapshotStore
+from gutter.client.storage import SQLiteStorage
+
+import mock
+import unittest2
+
+
+class User(object):
+    def __init__(self, name, age):
+        self.name = name
+        self.age = age
+
+
+class UserArguments(arguments.Container):
+    COMPATIBLE_TYPE = User
+
+    name = arguments.String(lambda self: self.input.name)
+    age = arguments.Value(lambda self: self.input.age)
+
+
+def best_of(function, number=2000, repeat=3):
+    return min(timeit.repeat(function, number=number, repeat=repeat))
+
+
+class TestCompiledSwitchPerformance(PerformanceTest):
+
+    @fixture
+    def switch(self):
+        switch = Switch('many conditions', state=Switch.states.SELECTIVE)
+
+        for age in range(100, 120):
+            switch.conditions.append(
+                Condition(UserArguments, 'age', Equals(value=age))
+            )
+
+        # Compare checking each condition, rather than the one they merge into
+        switch.conditions.optimize = False
+        return switch
+
+    @fixture
+    def user(self):
+        return User('jeff', 21)
+
+    def test_compiled_switch_is_faster_than_interpreted(self):
+        function = compiled(self.switch)
+
+        interpreted = best_of(lambda: self.switch.enabled_for_all(self.user, 42))
+        compiled_time = best_of(lambda: function(self.user, 42))
+
+        ok_(compiled_time * 2 < interpreted, (compiled_time, interpreted))
+
+    def test_compiled_manager_is_faster_than_interpreted(self):
+        managers = [Manager(storage=dict(), compiled=c) for c in (False, True)]
+
+        for manager in managers:
+            manager.register(self.switch)
+
+        interpreted, compiled_time = [
+            best_of(lambda: manager.active('many conditions', self.user))
+            for manager in managers
+        ]
+
+        ok_(compiled_time < interpreted, (compiled_time, interpreted))
+
+    def test_compiled_manager_is_faster_for_switches_decoded_on_every_read(self):
+        managers = [
+            Manager(storage=SQLiteStorage(':memory:', encoding=JsonPickleEncoding), compiled=c)
+            for c in (False, True)
+        ]
+
+        for manager in managers:
+            manager.register(self.switch)
+
+        # Checking several users, so the conditions outweigh decoding the switch
+        users = [User('user%d' % age, age) for age in range(20, 25)]
+
+        interpreted, compiled_time = [
+            best_of(lambda: manager.active('many conditions', *users), number=200)
+            for manager in managers
+        ]
+
+        ok_(compiled_time < interpreted, (compiled_time, interpreted))
+
+
+class ConcentChain(object):
+
+    inputs = (User('jeff', 21), User('frank', 10), 42)
+
+    def manager_with_depth(self, depth):
+        manager = Manager(storage=dict())
+        manager.input(*self.inputs)
+
+        for level in range(1, depth + 1):
+            name = ':'.join('level%d' % n for n in range(level))
+            manager.register(Switch(name, state=Switch.states.GLOBAL, compounded=True))
+
+        return manager, name
+
+    def checks_for_depth(self, depth):
+        manager, name = self.manager_with_depth(depth)
+        checked = []
+        signals.switch_checked.connect(checked.append)
+
+        try:
+            ok_(manager.active(name) is True)
+        finally:
+            signals.switch_checked.reset()
+
+        return len(checked)
+
+
+class TestConcentChainChecks(ConcentChain, unittest2.TestCase):
+
+    def test_input_checks_rise_linearly_with_depth(self):
+        for depth in (1, 4, 16, 64):
+            eq_(self.checks_for_depth(depth), depth * len(self.inputs))
+
+
+class TestConcentChainPerformance(ConcentChain, PerformanceTest):
+
+    def test_time_rises_linearly_with_depth(self):
+        timings = []
+
+        for depth in (8, 32):
+            manager, name = self.manager_with_depth(depth)
+            timings.append(best_of(lambda: manager.active(name), number=200))
+
+        # Four times the depth should cost roughly four times as much
+        ok_(timings[1] < timings[0] * 8, timings)
+
+
+class TestStaticSwitchCalls(unittest2.TestCase):
+
+    def calls_during(self, function, *args):
+        calls = []
+
+        def profile(frame, event, arg):
+            if event == 'call':
+                calls.append(frame.f_code.co_name)
+            elif event == 'c_call':
+                calls.append(arg.__name__)
+
+        sys.setprofile(profile)
+        try:
+            function(*args)
+        finally:
+            sys.setprofile(None)
+
+        return [call for call in calls if call != 'setprofile']
+
+    def calls_for_inputs(self, state, count):
+        manager = Manager(storage=dict())
+        manager.register(Switch('static', state=state, compounded=True))
+        manager.input(*[User('user %d' % n, n) for n in range(count)])
+
+        return self.calls_during(manager.active, 'static')
+
+    def test_static_switches_do_no_per_input_work_without_receivers(self):
+        for state in (Switch.states.GLOBAL, Switch.states.DISABLED):
+            one, many = [self.calls_for_inputs(state, count) for count in (1, 50)]
+
+            eq_(one, many)
+
+            for allocating in ('<genexpr>', '<lambda>', 'partial', 'ifilter', 'enabled_for'):
+                ok_(allocating not in many, (allocating, many))
+
+    def test_signal_receivers_are_still_called_for_each_input(self):
+        checked = []
+        signals.switch_checked.connect(checked.append)
+
+        try:
+            self.calls_for_inputs(Switch.states.GLOBAL, 50)
+        finally:
+            signals.switch_checked.reset()
+
+        eq_(len(checked), 50)
+
+
+class SchemaEncodingSwitch(object):
+
+    @fixture
+    def switch(self):
+        switch = Switch('encoded', state=Switch.states.SELECTIVE)
+
+        for age in range(10):
+            switch.conditions.append(
+                Condition(UserArguments, 'age', Equals(value=age))
+            )
+
+        switch.conditions.append(
+            Condition(UserArguments, 'name', PercentRange(0, 50))
+        )
+
+        return switch
+
+
+class TestSchemaEncodingSize(SchemaEncodingSwitch, unittest2.TestCase):
+
+    def test_schema_payloads_are_smaller(self):
+        jsonpickled, schema = [
+            len(encoding.encode(self.switch))
+            for encoding in (JsonPickleEncoding, SchemaEncoding)
+        ]
+
+        ok_(schema * 2 < jsonpickled, (schema, jsonpickled))
+
+
+class TestSchemaEncodingPerformance(SchemaEncodingSwitch, PerformanceTest):
+
+    def compare(self, function):
+        with mock.patch.object(JsonPickleEncoding, 'decode_cache', None):
+            return [
+                best_of(lambda: function(encoding), number=100)
+                for encoding in (JsonPickleEncoding, SchemaEncoding)
+            ]
+
+    def test_schema_encoding_is_faster(self):
+        jsonpickled, schema = self.compare(lambda encoding: encoding.encode(self.switch))
+        ok_(schema < jsonpickled, (schema, jsonpickled))
+
+    def test_schema_decoding_is_faster(self):
+        payloads = dict(
+            (encoding, encoding.encode(self.switch))
+            for encoding in (JsonPickleEncoding, SchemaEncoding)
+        )
+
+        jsonpickled, schema = self.compare(
+            lambda encoding: encoding.decode(payloads[encoding])
+        )
+        ok_(schema < jsonpickled, (schema, jsonpickled))
+
+    def test_deferred_conditions_make_static_switches_faster_to_decode(self):
+        self.switch.state = Switch.states.GLOBAL
+        header, conditions = SchemaEncoding.dump_switch(self.switch)
+        payloads = [
+            '~1 %s' % json.dumps(header + [conditions]),
+            SchemaEncoding.encode(self.switch),
+        ]
+
+        def decode_and_check(payload):
+            return SchemaEncoding.loads(payload).enabled_for_all(42)
+
+        eager, deferred = [
+            best_of(lambda: decode_and_check(payload), number=100)
+            for payload in payloads
+        ]
+
+        ok_(deferred * 2 < eager, (deferred, eager))
+
+
+class TestKeyIndexPerformance(PerformanceTest):
+
+    @fixture
+    def storage(self):
+        # About 30k keys, across 10 namespaces of 100 trees of 30 switches
+        return dict.fromkeys(
+            'ns%d.tree%d:%d' % (namespace, tree, switch)
+            for namespace in range(10)
+            for tree in range(100)
+            for switch in range(30)
+        )
+
+    def test_finding_children_does_not_scan_storage(self):
+        scanning, indexed = [
+            Manager(storage=self.storage, namespace='ns5', key_index=index)
+            for index in (None, KeyIndex())
+        ]
+
+        eq_(indexed.get_children('tree50'), sorted(scanning.get_children('tree50')))
+
+        scanning_time, indexed_time = [
+            best_of(lambda: manager.get_children('tree50'), number=20)
+            for manager in (scanning, indexed)
+        ]
+
+        ok_(indexed_time * 20 < scanning_time, (indexed_time, scanning_time))
+
+
+class TestBulkRegisterPerformance(PerformanceTest):
+
+    def manager(self):
+        return Manager(storage=SQLiteStorage(':memory:'), key_index=KeyIndex())
+
+    def switches(self, count):
+        return [Switch('switch%d' % number) for number in range(count)]
+
+    def test_register_many_is_faster_than_register_in_a_loop(self):
+        manager = self.manager()
+        switches = self.switches(10000)
+        start = time.time()
+        manager.register_many(switches)
+        bulk_time = time.time() - start
+
+        eq_(len(manager.switches), 10000)
+
+        # Each register is a transaction of its own, where register_many
+        # writes every switch in one
+        manager = self.manager()
+        start = time.time()
+        for switch in switches:
+            manager.register(switch)
+        loop_time = time.time() - start
+
+        ok_(bulk_time < loop_time, (bulk_time, loop_time))
+
+
+class TestMappedSnapshotPerformance(PerformanceTest):
+
+    @fixture
+    def storage(self):
+        storage = {}
+
+        for number in range(10000):
+            switch = Switch('switch%d' % number, state=Switch.states.SELECTIVE)
+            switch.conditions.append(Condition(UserArguments, 'age', Equals(value=number)))
+            storage['default.' + switch.name] = switch
+
+        return storage
+
+    def test_mapping_a_published_snapshot_is_faster_than_building_one(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'gutter.snapshot')
+        write_snapshot(path, self.storage.items())
+
+        def first_check(snapshots):
+            manager = Manager(storage=self.storage, snapshots=snapshots)
+            return manager.active('switch21', User('jeff', 21))
+
+        ok_(first_check(MappedSnapshotStore(path)) is True)
+
+        building_time, mapping_time = [
+            best_of(lambda: first_check(store_class()), number=1)
+            for store_class in (SnapshotStore, lambda: MappedSnapshotStore(path))
+        ]
+
+        ok_(mapping_time * 20 < building_time, (mapping_time, building_time))
+
+
+class TestPercentRangePerformance(PerformanceTest):
+
+    @fixture
+    def operator(self):
+        return PercentRange(10, 20.5)
+
+    def test_fixed_point_is_faster_than_decimal(self):
+        for argument in (12345, 'jeff', 12.5):
+            eq_(
+                self.operator.applies_to(argument),
+                self.operator._decimal_applies_to(argument)
+            )
+
+            fixed_point_time, decimal_time = [
+                best_of(lambda: applies_to(argument), number=500)
+                for applies_to in (self.operator.applies_to, self.operator._decimal_applies_to)
+            ]
+
+            ok_(fixed_point_time * 3 < decimal_time, (argument, fixed_point_time, decimal_time))
+
+    def test_fixed_point_is_faster_for_variables_through_a_condition(self):
+        condition = Condition(UserArguments, 'age', self.operator)
+        user = User('jeff', 12345)
+        applies = condition.call(user)
+
+        fixed_point_time = best_of(lambda: condition.call(user), number=500)
+
+        with mock.patch.object(self.operator, 'applies_to', self.operator._decimal_applies_to):
+            eq_(condition.call(user), applies)
+            decimal_time = best_of(lambda: condition.call(user), number=500)
+
+        ok_(fixed_point_time * 2 < decimal_time, (fixed_point_time, decimal_time))
+
+
+class StablePercentRollouts(object):
+
+    @fixture
+    def manager(self):
+        manager = Manager(storage=dict())
+
+        for number in range(50):
+            switch = Switch('rollout %d' % number, state=Switch.states.SELECTIVE)
+            switch.conditions.append(Condition(
+                UserArguments,
+                'name',
+                StablePercent(50, salt=switch.name)
+            ))
+            manager.register(switch)
+
+        return manager
+
+    names = ['rollout %d' % number for number in range(50)]
+
+
+class TestStablePercentHashing(StablePercentRollouts, unittest2.TestCase):
+
+    def test_switches_checked_together_hash_each_input_once(self):
+        user = User('jeff' * 64, 21)
+
+        with mock.patch.object(bucketing, 'canonical', wraps=bucketing.canonical) as canonical:
+            self.manager.active_many(self.names, user)
+
+        # Once for the name, and once for each salt
+        eq_(canonical.call_count, 1 + len(self.names))
+
+
+class TestStablePercentPerformance(StablePercentRollouts, PerformanceTest):
+
+    def test_checking_switches_together_is_faster(self):
+        names = self.names
+        user = User('jeff' * 64, 21)
+
+        together = best_of(lambda: self.manager.active_many(names, user), number=200)
+        apart = best_of(
+            lambda: [self.manager.active(name, user) for name in names],
+            number=200
+        )
+
+        ok_(together < apart, (together, apart))
+
+
+class TestInPerformance(PerformanceTest):
+
+    @fixture
+    def names(self):
+        return ['user %d' % number for number in range(500)]
+
+    def switch_with(self, conditions):
+        switch = Switch('allow list', state=Switch.states.SELECTIVE)
+        switch.conditions.extend(conditions)
+        return switch
+
+    def test_one_in_condition_is_faster_than_many_equals(self):
+        equals = self.switch_with(
+            Condition(UserArguments, 'name', Equals(value=name))
+            for name in self.names
+        )
+        membership = self.switch_with([Condition(UserArguments, 'name', In(self.names))])
+
+        # Otherwise the optimizer merges the Equals conditions itself
+        equals.conditions.optimize = False
+        user = User('user 499', 21)
+
+        ok_(equals.enabled_for_all(user))
+        ok_(membership.enabled_for_all(user))
+
+        equals_time, membership_time = [
+            best_of(lambda: switch.enabled_for_all(user), number=100)
+            for switch in (equals, membership)
+        ]
+
+        ok_(membership_time * 20 < equals_time, (membership_time, equals_time))
+
+
+class TestOptimizerPerformance(PerformanceTest):
+
+    def switch(self, optimize):
+        switch = Switch('hand built', state=Switch.states.SELECTIVE)
+
+        for age in range(200, 400):
+            switch.conditions.append(Condition(UserArguments, 'age', Equals(value=age)))
+
+        for age in range(0, 100, 10):
+            switch.conditions.append(
+                Condition(UserArguments, 'age', Between(lower_limit=age, upper_limit=age + 5))
+            )
+
+        switch.conditions.optimize = optimize
+        return switch
+
+    def test_optimized_switch_is_faster(self):
+        user = User('jeff', 97)
+        unoptimized, optimized = map(self.switch, (False, True))
+
+        eq_(unoptimized.enabled_for_all(user), optimized.enabled_for_all(user))
+
+        unoptimized_time, optimized_time = [
+            best_of(lambda: switch.enabled_for_all(user), number=100)
+            for switch in (unoptimized, optimized)
+        ]
+
+        ok_(optimized_time * 10 < unoptimized_time, (optimized_time, unoptimized_time))
+
+
+class TestInNetworkPerformance(PerformanceTest):
+
+    def test_checking_an_address_does_not_slow_down_with_more_networks(self):
+        few, many = [
+            InNetwork(['10.%d.%d.0/24' % divmod(number * 2, 256) for number in range(count)])
+            for count in (10, 10000)
+        ]
+
+        ok_(many.applies_to('10.39.14.1'))
+        ok_(few.applies_to('10.0.8.1'))
+        eq_(len(many.ranges[4][0]), 10000)
+
+        few_time, many_time = [
+            best_of(lambda: operator.applies_to('10.39.14.1'), number=2000)
+            for operator in (few, many)
+        ]
+
+        ok_(many_time < few_time * 2, (few_time, many_time))
@@ -10,6 +10,7 @@ from gutter.client.operators import (
     comparable,
     identity,
     misc,
+    network,
 )
 from gutter.client.arguments.base import Container
 from gutter.client import registry
@@ -24,7 +25,7 @@ def all_operators_in(module):
 
 
 ALL_OPERATORS = itertools.chain(
-    *map(all_operators_in, (comparable, identity, misc))
+    *map(all_operators_in, (comparable, identity, misc, network))
 )
 
 
@@ -57,6 +58,14 @@ class TestOperatorRegistry(Exam, unittest2.TestCase):
         registry.operators.register(TestOperator)
         self.assertEqual(registry.operators['test_name'], TestOperator)
 
+    def test_key_for_returns_the_key_an_operator_is_registered_under(self):
+        for module in (comparable, identity, misc, network):
+            for operator in all_operators_in(module):
+                self.assertEqual(registry.operators.key_for(operator), operator.name)
+
+    def test_key_for_returns_none_for_unregistered_operators(self):
+        self.assertEqual(registry.operators.key_for(Base), None)
+
     def test_raises_exception_if_object_is_not_an_operator(self):
         self.assertRaises(
             ValueError,
@@ -86,3 +95,16 @@ class TestArgumentRegistry(Exam, unittest2.TestCase):
             'junk',
             'thing'
         )
+
+    def test_key_for_returns_the_latest_key_an_argument_is_registered_under(self):
+        registry.arguments.register('test', TestArgument)
+        registry.arguments.register('renamed', TestArgument)
+        self.assertEqual(registry.arguments.key_for(TestArgument), 'renamed')
+
+    def test_key_for_returns_none_once_key_is_replaced(self):
+        class OtherArgument(Container):
+            pass
+
+        registry.arguments.register('test', TestArgument)
+        registry.arguments.register('test', OtherArgument)
+        self.assertEqual(registry.arguments.key_for(TestArgument), None)
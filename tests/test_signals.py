@@ -8,6 +8,9 @@ from exam.decorators import fixture
 
 class ActsLikeSignal(object):
 
+    def tearDown(self):
+        self.signal.reset()
+
     @fixture
     def callback(self):
         return mock.Mock(name="callback")
@@ -31,6 +34,42 @@ class ActsLikeSignal(object):
         self.signal_with_callback.call(1, 2.0, kw='args')
         self.callback.assert_called_once_with(1, 2.0, kw='args')
 
+    def test_has_receivers_once_a_callback_is_connected(self):
+        eq_(self.signal.has_receivers, False)
+        self.signal.connect(self.callback)
+        eq_(self.signal.has_receivers, True)
+
+    def test_reset_disconnects_all_callbacks(self):
+        self.signal_with_callback.reset()
+        self.signal.call()
+        eq_(self.signal.has_receivers, False)
+        eq_(self.callback.called, False)
+
+    def test_callback_for_switch_name_only_called_for_that_switch(self):
+        foo, bar = mock.Mock(), mock.Mock()
+        foo.name, bar.name = 'foo', 'bar'
+
+        self.signal.connect(self.callback, switch_name='foo')
+        ok_(self.signal.has_receivers)
+
+        self.signal.call(bar, 1)
+        self.signal.call()
+        eq_(self.callback.called, False)
+
+        self.signal.call(foo, 1)
+        self.callback.assert_called_once_with(foo, 1)
+
+    def test_unfiltered_callbacks_are_called_before_filtered_ones(self):
+        calls = []
+        switch = mock.Mock()
+        switch.name = 'foo'
+
+        self.signal.connect(lambda s: calls.append('filtered'), switch_name='foo')
+        self.signal.connect(lambda s: calls.append('unfiltered'))
+        self.signal.call(switch)
+
+        eq_(calls, ['unfiltered', 'filtered'])
+
 
 class TestSwitchRegisteredCallback(ActsLikeSignal, unittest2.TestCase):
 
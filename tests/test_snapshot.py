@@ -0,0 +1,345 @@
+import operator
+import os
+import threading
+import time
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from durabledict import MemoryDict
+from exam.decorators import after, fixture
+from exam.cases import Exam
+
+from gutter.client.arguments import Container as BaseArgument
+from gutter.client import arguments
+from gutter.client.models import Switch, Condition, Manager
+from gutter.client.operators.comparable import Equals
+from gutter.client.snapshot import (
+    Snapshot, SnapshotRefresher, SnapshotStore, storage_version
+)
+
+from tests.helpers import CountingDict
+
+
+class IntegerArgument(BaseArgument):
+    COMPATIBLE_TYPE = int
+
+    value = arguments.Value(lambda self: self.input)
+
+
+class TestSnapshot(Exam, unittest2.TestCase):
+
+    @fixture
+    def switch(self):
+        switch = Switch('foo', state=Switch.states.SELECTIVE)
+        switch.conditions.append(Condition(IntegerArgument, 'value', Equals(value=1)))
+        return switch
+
+    @fixture
+    def storage(self):
+        return {'foo': self.switch}
+
+    @fixture
+    def snapshot(self):
+        return Snapshot.from_storage(self.storage)
+
+    def test_acts_like_a_read_only_mapping(self):
+        eq_(len(self.snapshot), 1)
+        eq_(list(self.snapshot), ['foo'])
+        ok_('foo' in self.snapshot)
+        eq_(self.snapshot.get('bar'), None)
+        assert_raises(TypeError, operator.setitem, self.snapshot, 'bar', self.switch)
+
+    def test_holds_indexed_copies_of_switches(self):
+        copied = self.snapshot['foo']
+
+        ok_(copied is not self.switch)
+        eq_(copied, self.switch)
+        eq_(copied.conditions, self.switch.conditions)
+
+        self.switch.state = Switch.states.GLOBAL
+        eq_(copied.state, Switch.states.SELECTIVE)
+
+    def test_records_storage_version_and_build_time(self):
+        storage = MemoryDict()
+        storage['foo'] = self.switch
+        snapshot = Snapshot.from_storage(storage)
+
+        eq_(snapshot.version, storage.last_updated())
+        ok_(snapshot.build_seconds >= 0)
+        ok_(snapshot.age >= 0)
+
+    def test_version_is_none_for_storage_without_one(self):
+        eq_(self.snapshot.version, None)
+        eq_(storage_version(self.storage), None)
+
+
+class TestSnapshotStore(Exam, unittest2.TestCase):
+
+    @fixture
+    def store(self):
+        return SnapshotStore()
+
+    @fixture
+    def storage(self):
+        return {'foo': Switch('foo')}
+
+    def test_has_no_snapshot_until_first_used(self):
+        eq_(self.store.current, None)
+        eq_(self.store.age, None)
+        eq_(self.store.refreshes, 0)
+
+    def test_get_builds_the_first_snapshot_only(self):
+        snapshot = self.store.get(self.storage)
+
+        ok_(self.store.get(self.storage) is snapshot)
+        ok_(self.store.current is snapshot)
+        eq_(self.store.refreshes, 1)
+
+    def test_get_does_not_rebuild_an_empty_snapshot(self):
+        snapshot = self.store.get({})
+
+        ok_(self.store.get({}) is snapshot)
+        eq_(self.store.refreshes, 1)
+
+    def test_get_rebuilds_a_stale_snapshot_without_a_refresher(self):
+        first = self.store.get(self.storage)
+        self.store.invalidate()
+
+        ok_(self.store.stale)
+        ok_(self.store.get(self.storage) is not first)
+        ok_(not self.store.stale)
+        eq_(self.store.refreshes, 2)
+
+    def test_get_leaves_a_stale_snapshot_to_the_refresher(self):
+        first = self.store.get(self.storage)
+        self.store.refresher = mock.Mock()
+        self.store.invalidate()
+
+        ok_(self.store.get(self.storage) is first)
+        self.store.refresher.wake.assert_called_once_with()
+
+    def test_refresh_swaps_in_a_new_snapshot(self):
+        first = self.store.get(self.storage)
+        self.storage['bar'] = Switch('bar')
+        second = self.store.refresh(self.storage)
+
+        ok_(second is not first)
+        ok_(self.store.current is second)
+        ok_('bar' not in first)
+        ok_('bar' in second)
+        eq_(self.store.refreshes, 2)
+        eq_(self.store.refresh_seconds, second.build_seconds)
+
+
+class TestManagerWithSnapshots(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        return CountingDict()
+
+    @fixture
+    def manager(self):
+        return Manager(storage=self.storage, snapshots=SnapshotStore())
+
+    def test_snapshots_default_to_none(self):
+        ok_(Manager(storage=dict()).snapshots is None)
+
+    def test_namespaced_managers_share_snapshots(self):
+        ok_(self.manager.namespaced('ns').snapshots is self.manager.snapshots)
+
+    def test_active_does_not_read_storage(self):
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+        self.storage.reads = 0
+
+        ok_(self.manager.active('foo') is True)
+        ok_(self.manager.active_many(['foo']) == {'foo': True})
+        eq_(self.storage.reads, 0)
+
+    def test_changes_by_others_are_seen_after_refresh(self):
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+        ok_(self.manager.active('foo') is True)
+
+        Manager(storage=self.storage).update(Switch('foo', state=Switch.states.DISABLED))
+        ok_(self.manager.active('foo') is True)
+
+        self.manager.refresh()
+        ok_(self.manager.active('foo') is False)
+
+    def test_changes_by_the_manager_are_seen_immediately(self):
+        self.manager.register(Switch('foo', state=Switch.states.GLOBAL))
+        ok_(self.manager.active('foo') is True)
+
+        self.manager.update(Switch('foo', state=Switch.states.DISABLED))
+        ok_(self.manager.active('foo') is False)
+
+        self.manager.unregister('foo')
+        assert_raises(ValueError, self.manager.active, 'foo')
+
+    def test_changes_by_the_manager_only_mark_the_snapshot_stale(self):
+        for number in range(10):
+            self.manager.register(Switch('switch%d' % number, state=Switch.states.GLOBAL))
+
+        eq_(self.manager.snapshots.refreshes, 0)
+        ok_(self.manager.snapshots.stale)
+
+        ok_(self.manager.active('switch9') is True)
+        ok_(self.manager.active('switch0') is True)
+        eq_(self.manager.snapshots.refreshes, 1)
+        ok_(not self.manager.snapshots.stale)
+
+    def test_switches_registered_by_others_since_the_snapshot_are_not_autocreated(self):
+        self.manager.autocreate = True
+        self.manager.register(Switch('other', state=Switch.states.GLOBAL))
+        ok_(self.manager.active('other') is True)
+
+        Manager(storage=self.storage).register(Switch('launch', state=Switch.states.GLOBAL))
+
+        ok_(self.manager.active('launch') is True)
+        eq_(self.storage['default.launch'].state, Switch.states.GLOBAL)
+
+    def test_switches_missing_from_snapshot_and_storage_are_autocreated(self):
+        self.manager.autocreate = True
+
+        ok_(self.manager.active('missing') is False)
+        eq_(self.storage['default.missing'].state, Switch.states.DISABLED)
+
+    def test_empty_snapshots_are_not_rebuilt(self):
+        self.manager.autocreate = False
+
+        assert_raises(ValueError, self.manager.active, 'missing')
+        assert_raises(ValueError, self.manager.active, 'missing')
+        eq_(len(self.manager.snapshots.current), 0)
+        eq_(self.manager.snapshots.refreshes, 1)
+
+    def test_snapshot_is_pinned_for_the_whole_check(self):
+        self.manager.register(Switch('parent', state=Switch.states.GLOBAL))
+        self.manager.register(Switch('parent:child', state=Switch.states.GLOBAL))
+        pinned = []
+
+        original = Manager.switch
+
+        def switch(manager, name):
+            pinned.append(manager.snapshot)
+            if name == 'parent:child':
+                manager.refresh()
+            return original(manager, name)
+
+        with mock.patch.object(Manager, 'switch', switch):
+            self.manager.active('parent:child')
+
+        eq_(len(pinned), 2)
+        ok_(pinned[0] is pinned[1])
+        ok_(pinned[0] is not self.manager.snapshots.current)
+
+
+class TestSnapshotRefresher(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        storage = MemoryDict()
+        storage['foo'] = Switch('foo')
+        return storage
+
+    @fixture
+    def store(self):
+        return SnapshotStore()
+
+    @fixture
+    def refresher(self):
+        return SnapshotRefresher(self.store, self.storage, interval=0.01)
+
+    @after
+    def stop_refresher(self):
+        self.refresher.stop()
+
+    def test_poll_refreshes_only_when_storage_version_changes(self):
+        eq_(self.refresher.poll(), True)
+        eq_(self.refresher.poll(), False)
+        eq_(self.store.refreshes, 1)
+
+        self.storage['bar'] = Switch('bar')
+        eq_(self.refresher.poll(), True)
+        ok_('bar' in self.store.current)
+
+        eq_((self.refresher.polls, self.refresher.refreshes), (3, 2))
+        ok_(self.refresher.refresh_seconds >= 0)
+        ok_(self.refresher.last_success is not None)
+
+    def test_poll_refreshes_stale_store(self):
+        eq_(self.refresher.poll(), True)
+
+        self.store.invalidate()
+        eq_(self.refresher.poll(), True)
+        eq_(self.refresher.poll(), False)
+
+    def test_thread_refreshes_promptly_when_store_is_invalidated(self):
+        refresher = SnapshotRefresher(self.store, self.storage, interval=60)
+        self.store.get(self.storage)
+        refresher.start()
+        self.addCleanup(refresher.stop, 5)
+
+        self.storage['bar'] = Switch('bar')
+        self.store.invalidate()
+
+        deadline = time.time() + 5
+        while 'bar' not in self.store.current and time.time() < deadline:
+            time.sleep(0.01)
+
+        ok_('bar' in self.store.current)
+
+    def test_poll_always_refreshes_storage_without_version(self):
+        refresher = SnapshotRefresher(self.store, {'foo': Switch('foo')})
+
+        eq_(refresher.poll(), True)
+        eq_(refresher.poll(), True)
+        eq_(self.store.refreshes, 2)
+
+    def test_poll_counts_errors(self):
+        error = ValueError('storage down')
+
+        with mock.patch.object(self.store, 'refresh', side_effect=error):
+            eq_(self.refresher.poll(), None)
+
+        eq_(self.refresher.errors, 1)
+        ok_(self.refresher.last_error is error)
+        eq_(self.refresher.last_success, None)
+
+    def test_thread_polls_until_stopped(self):
+        polled = threading.Event()
+
+        with mock.patch.object(self.refresher, 'poll', side_effect=polled.set):
+            self.refresher.start()
+            ok_(self.refresher.running)
+            ok_(self.store.refresher is self.refresher)
+            ok_(polled.wait(5))
+
+            self.refresher.stop(timeout=5)
+
+        ok_(not self.refresher.running)
+        eq_(self.store.refresher, None)
+
+    def test_restarts_in_forked_process_when_store_is_used(self):
+        self.refresher.start()
+        parent_pid = os.getpid()
+
+        # A forked child would not have the parent's thread, so stop it here.
+        # Cleanups run last first: this sets its event, then waits for it.
+        parent_thread = self.refresher._SnapshotRefresher__thread
+        self.addCleanup(parent_thread.join, 5)
+        self.addCleanup(self.refresher._SnapshotRefresher__stopped.set)
+
+        with mock.patch('gutter.client.snapshot.os.getpid', return_value=parent_pid + 1):
+            ok_(not self.refresher.running)
+
+            with mock.patch.object(self.store, 'after_fork') as after_fork:
+                self.store.get(self.storage)
+
+            after_fork.assert_called_once_with()
+            ok_(self.refresher.running)
+
+            # The restarted thread is only running in the "child" process
+            child_thread = self.refresher._SnapshotRefresher__thread
+            self.refresher.stop(timeout=5)
+            ok_(not child_thread.is_alive())
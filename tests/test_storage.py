@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest2
+
+from nose.tools import *  # noqa
+import mock
+
+from exam.decorators import after, fixture
+from exam.cases import Exam
+
+from gutter.client.models import Switch, Manager
+from gutter.client.snapshot import storage_version
+from gutter.client.storage import DictStorage, MemoryDictStorage, SQLiteStorage
+
+
+class ActsLikeExtendedStorage(object):
+
+    @fixture
+    def storage(self):
+        storage = self.new_storage()
+        storage.set_many({'a': 1, 'a:b': 2, 'ab': 3, 'b': 4})
+        return storage
+
+    def test_get_many_leaves_out_missing_keys(self):
+        eq_(self.storage.get_many(['a', 'b', 'c']), {'a': 1, 'b': 4})
+
+    def test_set_many_writes_every_item(self):
+        self.storage.set_many({'a': 5, 'c': 6})
+        eq_(self.storage.get_many(['a', 'c']), {'a': 5, 'c': 6})
+
+    def test_delete_many_ignores_missing_keys(self):
+        self.storage.delete_many(['a', 'c'])
+        ok_('a' not in self.storage)
+        eq_(len(self.storage), 3)
+
+    def test_scan_prefix_returns_sorted_keys(self):
+        eq_(self.storage.scan_prefix('a'), ['a', 'a:b', 'ab'])
+        eq_(self.storage.scan_prefix('a:'), ['a:b'])
+        eq_(self.storage.scan_prefix('c'), [])
+
+    def test_scan_prefix_sees_every_change(self):
+        self.storage.scan_prefix('')
+
+        self.storage['a:c'] = 5
+        del self.storage['ab']
+        self.storage.delete_many(['b'])
+        eq_(self.storage.scan_prefix(''), ['a', 'a:b', 'a:c'])
+
+        self.storage.pop('a')
+        eq_(self.storage.scan_prefix('a'), ['a:b', 'a:c'])
+
+    def test_version_increases_on_every_change(self):
+        versions = [self.storage.version()]
+
+        self.storage['c'] = 5
+        versions.append(self.storage.version())
+        self.storage.delete_many(['c'])
+        versions.append(self.storage.version())
+        self.storage.pop('a')
+        versions.append(self.storage.version())
+
+        eq_(versions, sorted(set(versions)))
+        eq_(storage_version(self.storage), versions[-1])
+
+
+class KeepsScanIndexUpToDate(object):
+
+    def test_own_writes_do_not_rescan_keys(self):
+        self.storage.scan_prefix('')
+
+        with mock.patch.object(self.storage, 'keys', wraps=self.storage.keys) as keys:
+            self.storage['c'] = 5
+            del self.storage['ab']
+            self.storage.set_many({'d': 6})
+            self.storage.delete_many(['b'])
+            eq_(self.storage.scan_prefix(''), ['a', 'a:b', 'c', 'd'])
+
+        eq_(keys.call_count, 0)
+
+
+class RollsBackFailedBatches(object):
+
+    def failing(self, method, failing_key):
+        original = getattr(type(self.storage), method)
+
+        def call(storage, key, *args):
+            if key == failing_key:
+                raise ValueError(key)
+
+            return original(storage, key, *args)
+
+        return mock.patch.object(type(self.storage), method, autospec=True, side_effect=call)
+
+    def test_failed_set_many_is_rolled_back(self):
+        self.storage.scan_prefix('')
+        items = collections.OrderedDict([('a', 5), ('c', 6), ('d', 7)])
+
+        with self.failing(self.set_method, 'd'):
+            assert_raises(ValueError, self.storage.set_many, items)
+
+        eq_(self.storage.get_many(['a', 'c', 'd']), {'a': 1})
+        eq_(self.storage.scan_prefix(''), ['a', 'a:b', 'ab', 'b'])
+
+    def test_failed_delete_many_is_rolled_back(self):
+        self.storage.scan_prefix('')
+
+        with self.failing(self.delete_method, 'b'):
+            assert_raises(ValueError, self.storage.delete_many, ['a', 'ab', 'b'])
+
+        eq_(self.storage.get_many(['a', 'ab', 'b']), {'a': 1, 'ab': 3, 'b': 4})
+        eq_(self.storage.scan_prefix(''), ['a', 'a:b', 'ab', 'b'])
+
+
+class TestDictStorage(
+    RollsBackFailedBatches,
+    KeepsScanIndexUpToDate,
+    ActsLikeExtendedStorage,
+    Exam,
+    unittest2.TestCase
+):
+
+    set_method = '__setitem__'
+    delete_method = '__delitem__'
+
+    def new_storage(self):
+        return DictStorage()
+
+    def test_other_dict_changes_increase_version(self):
+        for change in (
+            lambda: self.storage.update(c=5),
+            lambda: self.storage.setdefault('d', 6),
+            self.storage.popitem,
+            self.storage.clear,
+        ):
+            version = self.storage.version()
+            change()
+            ok_(self.storage.version() > version)
+
+        eq_(self.storage.scan_prefix(''), [])
+
+
+class TestMemoryDictStorage(
+    RollsBackFailedBatches,
+    KeepsScanIndexUpToDate,
+    ActsLikeExtendedStorage,
+    Exam,
+    unittest2.TestCase
+):
+
+    set_method = 'persist'
+    delete_method = 'depersist'
+
+    def new_storage(self):
+        return MemoryDictStorage()
+
+    def test_batches_reload_the_dict_once(self):
+        storage = self.storage
+
+        with mock.patch.object(
+            MemoryDictStorage,
+            'durables',
+            autospec=True,
+            side_effect=MemoryDictStorage.durables
+        ) as durables:
+            storage.set_many(dict.fromkeys('cdef'))
+            storage.delete_many('cdef')
+
+        eq_(durables.call_count, 2)
+
+
+def write_switch(path, name):
+    Manager(storage=SQLiteStorage(path)).register(Switch(name))
+
+
+class TestSQLiteStorage(ActsLikeExtendedStorage, Exam, unittest2.TestCase):
+
+    @fixture
+    def directory(self):
+        return tempfile.mkdtemp()
+
+    @fixture
+    def path(self):
+        return os.path.join(self.directory, 'gutter.db')
+
+    @after
+    def remove_directory(self):
+        shutil.rmtree(self.directory)
+
+    def new_storage(self):
+        return SQLiteStorage(self.path)
+
+    def test_acts_like_a_mapping(self):
+        eq_(sorted(self.storage), ['a', 'a:b', 'ab', 'b'])
+        eq_(self.storage['a:b'], 2)
+        eq_(self.storage.get('c', 5), 5)
+        assert_raises(KeyError, self.storage.__getitem__, 'c')
+        assert_raises(KeyError, self.storage.__delitem__, 'c')
+        eq_(dict(self.storage.items()), {'a': 1, 'a:b': 2, 'ab': 3, 'b': 4})
+
+    def test_runs_in_wal_mode(self):
+        mode, = self.storage.connection.execute('PRAGMA journal_mode').fetchone()
+        eq_(mode, 'wal')
+
+    def test_bumps_version_once_per_batch(self):
+        version = self.storage.version()
+        self.storage.set_many({'c': 5, 'd': 6})
+        self.storage.delete_many(['c', 'd'])
+        eq_(self.storage.version(), version + 2)
+
+    def test_changed_since_reports_writes_and_deletes(self):
+        version = self.storage.version()
+        self.storage['c'] = 5
+        del self.storage['a']
+
+        eq_(self.storage.changed_since(version), {'a': None, 'c': 5})
+        eq_(self.storage.changed_since(self.storage.version()), {})
+
+    def test_handles_unicode_keys(self):
+        self.storage[u'caf\xe9'] = 5
+        eq_(self.storage.get_many([u'caf\xe9']), {u'caf\xe9': 5})
+        eq_(self.storage.get_many(['caf\xc3\xa9']), {'caf\xc3\xa9': 5})
+        eq_(self.storage['caf\xc3\xa9'], 5)
+
+    def test_reads_non_ascii_keys_back_as_utf8_str(self):
+        version = self.storage.version()
+        self.storage.set_many({'caf\xc3\xa9': 5, 'caf\xc3\xa9:th\xc3\xa9': 6})
+
+        for keys in (
+            self.storage.scan_prefix('caf\xc3\xa9'),
+            self.storage.keys(),
+            [key for key, _ in self.storage.iteritems()],
+            self.storage.changed_since(version).keys(),
+        ):
+            ok_('caf\xc3\xa9' in keys, keys)
+            ok_(all(type(key) is str for key in keys), keys)
+
+    def test_manager_unregisters_and_finds_non_ascii_children(self):
+        manager = Manager(storage=self.storage)
+        manager.register(Switch('caf\xc3\xa9'))
+        manager.register(Switch('caf\xc3\xa9:th\xc3\xa9'))
+
+        eq_(manager.get_children('caf\xc3\xa9'), ['caf\xc3\xa9:th\xc3\xa9'])
+        eq_(type(manager.get_children('caf\xc3\xa9')[0]), str)
+
+        manager.unregister('caf\xc3\xa9')
+        eq_(manager.get_children('caf\xc3\xa9'), [])
+        ok_('default.caf\xc3\xa9:th\xc3\xa9' not in self.storage)
+
+    def test_round_trips_switches_with_non_ascii_names_and_own_attributes(self):
+        switch = Switch('caf\xc3\xa9', state=Switch.states.GLOBAL)
+        switch.owner = 'team-x'
+        self.storage['s'] = switch
+
+        decoded = self.storage['s']
+        eq_(decoded.name, 'caf\xc3\xa9')
+        eq_(decoded.owner, 'team-x')
+
+    def test_failed_batches_are_rolled_back(self):
+        version = self.storage.version()
+
+        assert_raises(Exception, self.storage.set_many, {'c': 5, None: 6})
+
+        ok_('c' not in self.storage)
+        eq_(self.storage.version(), version)
+
+    def test_writes_by_other_processes_are_seen(self):
+        version = self.storage.version()
+
+        process = multiprocessing.Process(target=write_switch, args=(self.path, 'c'))
+        process.start()
+        process.join(10)
+
+        eq_(process.exitcode, 0)
+        ok_(self.storage.version() > version)
+        eq_(self.storage.changed_since(version).keys(), ['default.c'])
+
+    def test_switches_and_children_are_found_with_indexed_queries(self):
+        plan = self.storage.connection.execute(
+            'EXPLAIN QUERY PLAN SELECT key FROM gutter_switches '
+            "WHERE key >= 'a' AND key < 'b' ORDER BY key"
+        ).fetchall()
+        ok_(any('USING' in row[-1] for row in plan), plan)
+
+
+class TestManagerWithExtendedStorage(Exam, unittest2.TestCase):
+
+    @fixture
+    def storage(self):
+        return DictStorage()
+
+    @fixture
+    def manager(self):
+        manager = Manager(storage=self.storage)
+        manager.register_many([
+            Switch('a', state=Switch.states.GLOBAL),
+            Switch('a:b', state=Switch.states.GLOBAL),
+            Switch('a:b:c', state=Switch.states.DISABLED),
+            Switch('d', state=Switch.states.GLOBAL),
+        ])
+        return manager
+
+    def test_switches_and_children_are_found_with_scan_prefix(self):
+        self.manager.switches
+
+        with mock.patch.object(DictStorage, 'keys') as keys:
+            eq_([switch.name for switch in self.manager.switches], ['a', 'a:b', 'a:b:c', 'd'])
+            eq_(self.manager.get_children('a'), ['a:b', 'a:b:c'])
+
+        eq_(keys.call_count, 0)
+
+    def test_active_many_fetches_switches_and_ancestors_at_once(self):
+        self.manager
+
+        with mock.patch.object(DictStorage, 'get_many', wraps=self.storage.get_many) as get_many:
+            with mock.patch.object(DictStorage, '__getitem__') as getitem:
+                results = self.manager.active_many(['a:b:c', 'd'])
+
+        eq_(results, {'a:b:c': False, 'd': True})
+        get_many.assert_called_once_with(
+            set(['default.a', 'default.a:b', 'default.a:b:c', 'default.d'])
+        )
+        eq_(getitem.call_count, 0)
+        eq_(self.manager.prefetched, None)
+
+    def test_active_reads_missing_switches_from_storage(self):
+        self.manager.autocreate = True
+        ok_(self.manager.active('e:f') is False)
+        ok_('e:f' in self.manager)
+
+    def test_unregister_deletes_switch_and_children_at_once(self):
+        with mock.patch.object(DictStorage, 'delete_many') as delete_many:
+            self.manager.unregister('a')
+
+        delete_many.assert_called_once_with(
+            ['default.a:b:c', 'default.a:b', 'default.a']
+        )